@@ -8,14 +8,19 @@ import requests
 import json
 import time
 import logging
-from typing import List, Dict, Any, Optional
-import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 from config import Config
+from single_flight import SingleFlight
+from auth_coordinator import AuthRefreshCoordinator
+from layout_spec import layout_skeleton
 
 # 尝试导入认证管理器
 try:
-    from auth_manager import get_fresh_auth_info
+    from auth_manager import auth_manager
     AUTO_AUTH_AVAILABLE = True
 except ImportError:
     AUTO_AUTH_AVAILABLE = False
@@ -24,51 +29,137 @@ except ImportError:
 logger = logging.getLogger(__name__)
 
 
+class TokenBucket:
+    """令牌桶限流器 - 控制对外部API的请求速率"""
+    
+    def __init__(self, rate: float, capacity: int):
+        """
+        初始化限流器
+        
+        Args:
+            rate: 每秒补充的令牌数，<=0 表示不限速
+            capacity: 令牌桶容量（允许的突发请求数）
+        """
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """获取一个令牌，令牌不足时阻塞等待"""
+        if self.rate <= 0:
+            return
+        
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                
+                wait_time = (1 - self.tokens) / self.rate
+            
+            time.sleep(wait_time)
+
+
+# 全局限流器实例（所有客户端共享同一上游配额）
+api_rate_limiter = TokenBucket(Config.API_RATE_LIMIT, Config.API_RATE_BURST)
+
+# 全局同步请求合并器（进程内所有数据管理器共享）
+sync_flight = SingleFlight()
+
+# 全局认证刷新协调器（进程内所有API会话共享同一份认证Cookie）
+auth_coordinator = AuthRefreshCoordinator(Config.API_COOKIES, Config.AUTH_REFRESH_WAIT_TIMEOUT)
+
+
+def load_fresh_auth(cookies: Dict[str, str]) -> Optional[Dict[str, str]]:
+    """
+    401时获取新的认证信息：使用缓存中比当前更新的令牌
+    
+    缓存中没有更新的令牌时，通知后台令牌刷新器重新登录并立即返回，不在请求路径上等待登录
+    
+    Args:
+        cookies: 当前使用的认证Cookie
+        
+    Returns:
+        新的认证信息，没有时返回None
+    """
+    if not AUTO_AUTH_AVAILABLE:
+        logger.warning("自动认证不可用，使用配置文件中的认证信息")
+        return None
+    
+    fresh_auth = auth_manager.get_auth_info()
+    if fresh_auth and fresh_auth.get('_ams_token') not in (None, cookies.get('_ams_token')):
+        # 更新配置（可选，用于调试）
+        Config.update_cookies(fresh_auth)
+        logger.info("已切换到缓存中的最新认证信息")
+        return fresh_auth
+    
+    logger.warning("缓存中没有可用的新令牌，已请求后台重新登录")
+    auth_manager.request_refresh(cookies.get('_ams_token'))
+    return None
+
+# 构建布局时从数据库读取的字段（不读取内容指纹、更新时间等内部字段）
+ROOM_LAYOUT_PROJECTION = {'room_number': 1, 'building': 1, 'unit': 1, 'floor': 1}
+STUDENT_LAYOUT_PROJECTION = {
+    '_id': 0, 'student_id': 1, 'name': 1, 'room_number': 1, 'building': 1, 'unit': 1, 'mobile': 1, 'is_main': 1,
+    'certificate_num': 1, 'emergency_contact': 1, 'emergency_mobile': 1,
+    'sign_status': 1, 'occupancy_flag': 1, 'tag': 1
+}
+
+
 class RoomsAPIClient:
     """房间数据API客户端"""
     
     def __init__(self):
         """初始化API客户端"""
         self.session = requests.Session()
-        self.auth_refreshed = False
+        self.auth_generation = -1  # 会话已应用的认证Cookie代数
+        self.last_fetch_complete = False  # 最近一次获取是否拿到了全部页面
         self.setup_session()
     
     def setup_session(self):
         """配置会话"""
         self.session.headers.update(Config.API_HEADERS)
-        self.session.cookies.update(Config.API_COOKIES)
+        self.sync_auth()
+        
+        # 连接池大小与并发数一致，避免并发分页时连接被丢弃
+        pool_size = max(1, Config.API_CONCURRENCY)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
     
-    def refresh_auth_if_needed(self):
-        """如果需要，刷新认证信息"""
-        if not AUTO_AUTH_AVAILABLE:
-            logger.warning("自动认证不可用，使用配置文件中的认证信息")
-            return False
+    def sync_auth(self) -> int:
+        """
+        会话的认证Cookie代数落后时应用最新Cookie
         
-        if self.auth_refreshed:
-            logger.info("认证信息已在本次会话中刷新过")
-            return True
+        Returns:
+            本次请求使用的代数
+        """
+        generation, cookies = auth_coordinator.current()
+        if generation != self.auth_generation:
+            self.session.cookies.update(cookies)
+            self.auth_generation = generation
+        return generation
+    
+    def refresh_auth_if_needed(self, seen_generation: int) -> bool:
+        """
+        认证失败时刷新认证信息（进程内并发的401只刷新一次，其余线程等待后使用新Cookie重试）
         
-        try:
-            logger.info("尝试获取最新认证信息...")
-            fresh_auth = get_fresh_auth_info()
+        Args:
+            seen_generation: 失败请求使用的认证Cookie代数
             
-            if fresh_auth:
-                # 更新会话cookies
-                self.session.cookies.update(fresh_auth)
-                
-                # 更新配置（可选，用于调试）
-                Config.update_cookies(fresh_auth)
-                
-                self.auth_refreshed = True
-                logger.info("认证信息刷新成功")
-                return True
-            else:
-                logger.error("无法获取最新认证信息")
-                return False
-                
-        except Exception as e:
-            logger.error(f"刷新认证信息时发生错误: {str(e)}")
+        Returns:
+            是否已有可用于重试的新Cookie
+        """
+        if auth_coordinator.refresh(seen_generation, load_fresh_auth) is None:
             return False
+        self.sync_auth()
+        return True
     
     def make_request(self, page_number: int = 1, page_size: int = None) -> Optional[Dict[str, Any]]:
         """
@@ -87,6 +178,10 @@ class RoomsAPIClient:
             try:
                 logger.info(f"正在请求第 {page_number} 页数据（尝试 {attempt + 1}/{Config.API_MAX_RETRIES}）")
                 
+                # 限流：取得令牌后再发送请求
+                api_rate_limiter.acquire()
+                
+                generation = self.sync_auth()
                 response = self.session.post(
                     Config.API_BASE_URL,
                     json=payload,
@@ -96,7 +191,7 @@ class RoomsAPIClient:
                 # 检查是否是认证失败
                 if response.status_code == 401:
                     logger.warning("认证失败，尝试刷新认证信息...")
-                    if self.refresh_auth_if_needed():
+                    if self.refresh_auth_if_needed(generation):
                         logger.info("认证信息已刷新，重新尝试请求...")
                         continue
                     else:
@@ -113,10 +208,10 @@ class RoomsAPIClient:
             except requests.exceptions.RequestException as e:
                 logger.warning(f"第 {page_number} 页请求失败 (尝试 {attempt + 1}/{Config.API_MAX_RETRIES}): {str(e)}")
                 
-                # 如果是401错误且还没有刷新过认证信息，尝试刷新
-                if "401" in str(e) and not self.auth_refreshed:
+                # 如果是401错误，尝试刷新认证信息
+                if "401" in str(e):
                     logger.warning("检测到401错误，尝试刷新认证信息...")
-                    if self.refresh_auth_if_needed():
+                    if self.refresh_auth_if_needed(self.auth_generation):
                         logger.info("认证信息已刷新，重新尝试请求...")
                         continue
                 
@@ -132,100 +227,155 @@ class RoomsAPIClient:
                 
         return None
     
+    def probe_auth(self) -> Dict[str, Any]:
+        """
+        轻量认证探测：只请求一条记录（pageSize=1），不重试、不触发认证刷新
+        
+        Returns:
+            探测结果，valid 为 True/False 表示认证有效/失效，None 表示无法判断（网络错误等）
+        """
+        result = {'valid': None, 'status_code': None, 'total': None, 'message': '', 'checked_at': time.time(), 'token': None}
+        
+        try:
+            api_rate_limiter.acquire()
+            self.sync_auth()
+            result['token'] = self.session.cookies.get('_ams_token')
+            response = self.session.post(
+                Config.API_BASE_URL,
+                json=Config.get_api_payload(1, 1),
+                timeout=Config.AUTH_PROBE_TIMEOUT
+            )
+            result['status_code'] = response.status_code
+            
+            if response.status_code in (401, 403):
+                result['valid'] = False
+                result['message'] = f"认证失效，状态码: {response.status_code}"
+                return result
+            
+            response.raise_for_status()
+            data = response.json()
+            
+            if data.get('success', False):
+                result['valid'] = True
+                result['total'] = data.get('data', {}).get('total', 0)
+            else:
+                # 接口可达但返回业务错误（通常为登录失效）
+                result['valid'] = False
+                result['message'] = data.get('message', '未知错误')
+                
+        except (requests.exceptions.RequestException, json.JSONDecodeError, ValueError) as e:
+            result['message'] = f"认证探测失败: {str(e)}"
+            logger.warning(result['message'])
+        
+        return result
+    
+    def fetch_page(self, page_number: int) -> Tuple[Optional[List[Dict[str, Any]]], Dict[str, Any]]:
+        """
+        获取单页房间数据
+        
+        Args:
+            page_number: 页码
+            
+        Returns:
+            (记录列表, 分页信息)，请求失败或API返回错误时记录列表为None
+        """
+        response_data = self.make_request(page_number, Config.API_PAGE_SIZE)
+        
+        if not response_data:
+            logger.error(f"第 {page_number} 页请求失败")
+            return None, {}
+        
+        # 检查响应状态
+        if not response_data.get('success', False):
+            logger.error(f"API返回错误: {response_data.get('message', '未知错误')}")
+            return None, {}
+        
+        data = response_data.get('data', {})
+        page_info = {
+            'total': data.get('total', 0),
+            'pages': data.get('pages', 1)
+        }
+        return data.get('records', []), page_info
+    
     def fetch_all_rooms_data(self) -> List[Dict[str, Any]]:
         """
         获取所有房间数据
         
+        先请求第一页获取总页数，其余页面通过有界线程池并发获取，
+        最后按页码顺序重组，保证结果与逐页获取一致
+        
         Returns:
             所有房间数据的列表
         """
-        all_data = []
-        current_page = 1
-        total_pages = None
-        
         logger.info("开始获取房间入住数据...")
+        self.last_fetch_complete = False
         
-        while True:
-            # 发送请求
-            response_data = self.make_request(current_page, Config.API_PAGE_SIZE)
-            
-            if not response_data:
-                logger.error(f"第 {current_page} 页请求失败，停止获取")
-                break
+        first_records, page_info = self.fetch_page(1)
+        
+        if not first_records:
+            if first_records is not None:
+                logger.info("第 1 页没有数据，获取结束")
+            else:
+                logger.error("第 1 页请求失败，停止获取")
+            return []
+        
+        total_pages = page_info.get('pages', 1)
+        logger.info(f"总记录数: {page_info.get('total', 0)}, 总页数: {total_pages}")
+        
+        pages = {1: first_records}
+        
+        # 并发获取剩余页面
+        if total_pages > 1:
+            max_workers = max(1, min(Config.API_CONCURRENCY, total_pages - 1))
+            logger.info(f"并发获取剩余 {total_pages - 1} 页，并发数: {max_workers}")
+            
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='rooms-page') as executor:
+                futures = {
+                    executor.submit(self.fetch_page, page_number): page_number
+                    for page_number in range(2, total_pages + 1)
+                }
+                for future in as_completed(futures):
+                    page_number = futures[future]
+                    try:
+                        records, _ = future.result()
+                    except Exception as e:
+                        logger.error(f"第 {page_number} 页获取异常: {str(e)}")
+                        records = None
+                    pages[page_number] = records
+        
+        # 按页码顺序重组，遇到失败或空页时停止（与逐页获取的行为一致）
+        all_data = []
+        for page_number in range(1, total_pages + 1):
+            records = pages.get(page_number)
             
-            # 检查响应状态
-            if not response_data.get('success', False):
-                logger.error(f"API返回错误: {response_data.get('message', '未知错误')}")
+            if records is None:
+                logger.error(f"第 {page_number} 页请求失败，停止获取")
                 break
             
-            # 获取数据
-            data = response_data.get('data', {})
-            records = data.get('records', [])
-            
             if not records:
-                logger.info(f"第 {current_page} 页没有数据，获取结束")
+                logger.info(f"第 {page_number} 页没有数据，获取结束")
                 break
             
-            # 第一次请求时获取总页数
-            if total_pages is None:
-                total_records = data.get('total', 0)
-                total_pages = data.get('pages', 1)
-                logger.info(f"总记录数: {total_records}, 总页数: {total_pages}")
-            
-            # 添加当前页数据
             all_data.extend(records)
-            logger.info(f"第 {current_page} 页获取到 {len(records)} 条记录，累计 {len(all_data)} 条")
-            
-            # 检查是否已到最后一页
-            if current_page >= total_pages:
-                logger.info("已获取所有数据")
-                break
-            
-            # 准备下一页
-            current_page += 1
-            
-            # 添加请求间隔，避免过于频繁
-            time.sleep(0.5)
+            logger.info(f"第 {page_number} 页获取到 {len(records)} 条记录，累计 {len(all_data)} 条")
+        else:
+            self.last_fetch_complete = True
+            logger.info("已获取所有数据")
         
         logger.info(f"获取完成！总共获取 {len(all_data)} 条记录")
         return all_data
     
     def parse_room_info(self, house_name: str) -> Dict[str, Any]:
         """
-        解析房间信息
+        解析房间信息（布局定义之外楼栋的房间同样解析并保存到数据库，只是不出现在布局中）
         
         Args:
             house_name: 房间名称，如 "之寓·未来-A4栋-1单元-107"
             
         Returns:
-            解析后的房间信息
+            解析后的房间信息，无法解析时返回None
         """
-        # 使用正则表达式解析房间信息
-        pattern = r'之寓·未来-A(\d+)栋-(\d+)单元-(\d+)'
-        match = re.match(pattern, house_name)
-        
-        if match:
-            building = int(match.group(1))  # 栋号
-            unit = int(match.group(2))      # 单元号  
-            room_num = match.group(3)       # 房间号
-            
-            # 从房间号解析楼层和房间
-            if len(room_num) >= 3:
-                floor = int(room_num[:-2]) if room_num[:-2] else 1
-                room_in_floor = int(room_num[-2:])
-            else:
-                floor = 1
-                room_in_floor = int(room_num)
-            
-            return {
-                'building': building,
-                'unit': unit,
-                'floor': floor,
-                'room_number': room_num,
-                'room_in_floor': room_in_floor
-            }
-        
-        return None
+        return layout_skeleton.parse_house_name(house_name)
     
     def process_room_data(self, raw_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
@@ -326,10 +476,15 @@ class RoomsDataManager:
         """
         生成完整的房间布局数据
         优先从API获取最新数据，同步到数据库后返回带标签的数据
+        并发调用会合并为一次同步，所有调用方共享同一结果
         
         Returns:
             完整的房间布局数据
         """
+        return sync_flight.do('complete_layout', self._generate_complete_layout)
+    
+    def _generate_complete_layout(self) -> Dict[str, Any]:
+        """执行一次完整同步并生成布局数据"""
         try:
             logger.info("开始生成完整布局数据...")
             
@@ -348,8 +503,9 @@ class RoomsDataManager:
                 # 转换数据格式以适配数据库
                 rooms_for_db = self._convert_rooms_for_database(occupied_rooms_api)
                 
-                # 保存到数据库（智能保留标签）
-                if self.db_manager.save_rooms_data(rooms_for_db):
+                # 保存到数据库（智能保留标签，只写入变化的记录）
+                # 上游数据不完整时不处理退房，避免误将房间置空
+                if self.db_manager.save_rooms_data(rooms_for_db, remove_missing=self.api_client.last_fetch_complete):
                     logger.info("房间数据已智能同步到数据库，标签信息已保留")
                     
                     # 从数据库获取带标签的完整数据
@@ -360,77 +516,97 @@ class RoomsDataManager:
             else:
                 logger.warning("数据库不可用，使用API原始数据（无标签信息）")
             
-            # 创建已入住房间的映射
-            occupied_rooms_map = {}
-            for room in occupied_rooms:
-                room_key = f"{room['floor']}-{room['room_number']}"
-                occupied_rooms_map[room_key] = room
-            
-            # 生成完整房间布局
-            all_rooms = []
-            building_config = Config.BUILDING_CONFIG
-            
-            # 1楼: 10间房 (01-06, 07-10)
-            floor = 1
-            floor1_rooms = [f"1{i:02d}" for i in range(1, 7)] + [f"1{i:02d}" for i in range(7, 11)]
+            complete_data = self.build_layout(occupied_rooms)
             
-            for i, room_number in enumerate(floor1_rooms, 1):
-                room_key = f"{floor}-{room_number}"
-                
-                if room_key in occupied_rooms_map:
-                    # 使用实际数据
-                    all_rooms.append(occupied_rooms_map[room_key])
-                else:
-                    # 创建空房间
-                    all_rooms.append(self.create_empty_room(floor, room_number, i))
-            
-            # 2-20楼: 每层12间房
-            for floor in range(2, 21):
-                for room_in_floor in range(1, 13):
-                    room_number = f"{floor}{room_in_floor:02d}"
-                    room_key = f"{floor}-{room_number}"
-                    
-                    if room_key in occupied_rooms_map:
-                        # 使用实际数据
-                        all_rooms.append(occupied_rooms_map[room_key])
-                    else:
-                        # 创建空房间
-                        all_rooms.append(self.create_empty_room(floor, room_number, room_in_floor))
-            
-            # 按楼层和房间号排序
-            all_rooms.sort(key=lambda x: (x['floor'], x['room_in_floor']))
-            
-            # 计算统计信息
-            occupied_count = sum(1 for room in all_rooms if room.get('tenants'))
-            
-            # 生成完整数据结构
-            complete_data = {
-                'total_rooms': len(all_rooms),
-                'occupied_count': occupied_count,
-                'vacant_count': len(all_rooms) - occupied_count,
-                'rooms': all_rooms,
-                'timestamp': datetime.now().isoformat(),
-                'layout_info': {
-                    'building': building_config['building'],
-                    'floors': building_config['total_floors'],
-                    'floor_1_rooms': building_config['floor_1_rooms'],
-                    'regular_floor_rooms': building_config['regular_floor_rooms'],
-                    'total_designed_rooms': building_config['total_rooms']
-                }
-            }
-            
-            # 如果使用数据库，添加标签统计
+            # 如果使用数据库，添加标签统计和本次同步的变更统计，并保存为布局快照
             if self.use_database and self.db_manager:
                 tag_stats = self.db_manager.get_tag_statistics()
                 complete_data['tag_statistics'] = tag_stats
+                complete_data['sync_changes'] = self._summarize_sync_changes()
+                self._materialize_layout(complete_data)
             
-            logger.info(f"完整布局生成成功，共 {len(all_rooms)} 个房间，{occupied_count} 个已入住")
+            logger.info(f"完整布局生成成功，共 {complete_data['total_rooms']} 个房间，{complete_data['occupied_count']} 个已入住")
             return complete_data
             
         except Exception as e:
             logger.error(f"生成完整布局失败: {str(e)}")
             raise
     
+    def build_layout(self, occupied_rooms: List[Dict]) -> Dict[str, Any]:
+        """
+        将已入住房间合并到完整楼栋布局中
+        
+        Args:
+            occupied_rooms: 已入住房间列表
+            
+        Returns:
+            完整的房间布局数据（不含标签统计）
+        """
+        # 将已入住房间覆盖到预先生成的骨架上（空房间共享，无需排序）
+        all_rooms, occupied_count = layout_skeleton.build_rooms(occupied_rooms)
+        
+        # 生成完整数据结构
+        complete_data = {
+            'total_rooms': len(all_rooms),
+            'occupied_count': occupied_count,
+            'vacant_count': len(all_rooms) - occupied_count,
+            'rooms': all_rooms,
+            'timestamp': datetime.now().isoformat(),
+            'layout_info': layout_skeleton.layout_info()
+        }
+        
+        return complete_data
+    
+    def rebuild_layout_from_database(self) -> Optional[Dict[str, Any]]:
+        """
+        不请求上游，直接用数据库中的数据重新生成布局快照（如标签变更后）
+        
+        Returns:
+            完整的房间布局数据，数据库不可用时返回None
+        """
+        if not (self.use_database and self.db_manager):
+            return None
+        
+        complete_data = self.build_layout(self._get_rooms_with_tags())
+        complete_data['tag_statistics'] = self.db_manager.get_tag_statistics()
+        self._materialize_layout(complete_data)
+        
+        logger.info(f"已从数据库重建布局，版本 {complete_data.get('version')}")
+        return complete_data
+    
+    def _materialize_layout(self, complete_data: Dict[str, Any]):
+        """将完整布局保存为物化快照，并记录快照版本号"""
+        version = self.db_manager.save_layout_snapshot(complete_data)
+        if version is not None:
+            complete_data['version'] = version
+    
+    def get_latest_layout(self) -> Optional[Dict[str, Any]]:
+        """从物化快照读取最新的完整布局（单次索引查询）"""
+        if not (self.use_database and self.db_manager):
+            return None
+        
+        snapshot = self.db_manager.get_latest_layout_snapshot()
+        if not snapshot:
+            return None
+        
+        layout = snapshot['layout']
+        layout['version'] = snapshot['version']
+        return layout
+    
+    def _summarize_sync_changes(self) -> Dict[str, Dict[str, int]]:
+        """汇总最近一次增量同步的变更数量"""
+        summary = {}
+        for kind, changes in self.db_manager.last_sync_stats.items():
+            if not isinstance(changes, dict):
+                continue
+            summary[kind] = {
+                'added': len(changes.get('added', [])),
+                'changed': len(changes.get('changed', [])),
+                'unchanged': changes.get('unchanged', 0),
+                'removed': len(changes.get('removed', []))
+            }
+        return summary
+    
     def _convert_rooms_for_database(self, occupied_rooms: List[Dict]) -> List[Dict]:
         """转换房间数据格式以适配数据库"""
         rooms_for_db = []
@@ -457,6 +633,7 @@ class RoomsDataManager:
             room_data = {
                 'room_number': room.get('room_number'),
                 'building': room.get('building'),
+                'unit': room.get('unit'),
                 'floor': room.get('floor'),
                 'room_type': '标准间',  # 可以根据需要调整
                 'capacity': len(tenants_for_db) if tenants_for_db else 2,  # 默认容量
@@ -469,10 +646,8 @@ class RoomsDataManager:
         return rooms_for_db
     
     def get_rooms_with_tags(self) -> Optional[Dict]:
-        """获取带标签的房间数据 - 优先从数据库读取"""
-        if self.use_database and self.db_manager:
-            return self.db_manager.get_rooms_with_tags_from_db()
-        return None
+        """获取带标签的房间数据 - 读取数据库中的物化布局快照"""
+        return self.get_latest_layout()
     
     def get_room_detail_from_db(self, house_id: str) -> Optional[Dict]:
         """从数据库获取房间详情"""
@@ -483,14 +658,21 @@ class RoomsDataManager:
     def _get_rooms_with_tags(self) -> List[Dict]:
         """从数据库获取带标签的房间数据"""
         try:
-            # 获取房间数据
-            rooms_data = self.db_manager.get_rooms_data({'occupied': True})
+            from database_manager import room_doc_key
+            
+            # 获取房间数据（只读取布局需要的字段）
+            rooms_data = self.db_manager.get_rooms_data({'occupied': True}, ROOM_LAYOUT_PROJECTION)
+            
+            # 一次查询获取所有房间的学生数据（带标签），按 栋号+单元+房间号 分组
+            students_by_room = self.db_manager.get_students_grouped_by_room({
+                'room_number': {'$in': [room['room_number'] for room in rooms_data]}
+            }, STUDENT_LAYOUT_PROJECTION)
             
             # 转换回原格式并添加标签信息
             rooms_with_tags = []
             for room in rooms_data:
                 # 获取房间的学生数据（带标签）
-                students = self.db_manager.get_students_data({'room_number': room['room_number']})
+                students = students_by_room.get(room_doc_key(room), [])
                 
                 # 转换租户数据格式
                 tenants = []
@@ -501,6 +683,7 @@ class RoomsDataManager:
                     tenant = {
                         'id': student.get('student_id'),
                         'guests_id': student.get('student_id'),
+                        'student_id': student.get('student_id'),
                         'tenant_name': student.get('name', ''),
                         'mobile': student.get('mobile', ''),
                         'is_main': student.get('is_main', 0),
@@ -519,14 +702,17 @@ class RoomsDataManager:
                     else:
                         co_tenants.append(tenant)
                 
-                # 构建房间数据
+                # 构建房间数据（名称、单元、房间序号以布局定义为准）
+                building, unit, room_number = room_doc_key(room)
+                position = layout_skeleton.find(building, room_number, unit)
+                slot = layout_skeleton.slots[position] if position is not None else None
                 room_data = {
                     'house_id': room.get('_id') or f"db_{room['room_number']}",
-                    'house_name': f"之寓·未来-A{room['building']}栋-1单元-{room['room_number']}",
-                    'building': room['building'],
-                    'unit': 1,
+                    'house_name': slot.house_name if slot else layout_skeleton.house_name(building, unit, room_number),
+                    'building': building,
+                    'unit': unit,
                     'floor': room['floor'],
-                    'room_in_floor': int(room['room_number'][-2:]) if len(room['room_number']) >= 2 else 1,
+                    'room_in_floor': slot.room_in_floor if slot else (int(room['room_number'][-2:]) if len(room['room_number']) >= 2 else 1),
                     'room_number': room['room_number'],
                     'tenants': tenants,
                     'main_tenant': main_tenant,
@@ -565,21 +751,3 @@ class RoomsDataManager:
         if self.use_database and self.db_manager:
             return self.db_manager.get_tag_statistics()
         return {}
-    
-    def create_empty_room(self, floor: int, room_number: str, room_in_floor: int) -> Dict[str, Any]:
-        """创建空房间数据"""
-        building_config = Config.BUILDING_CONFIG
-        
-        return {
-            'house_id': f"empty_{floor}_{room_in_floor}",
-            'house_name': f"之寓·未来-A{building_config['building'][1]}栋-{building_config['unit']}单元-{room_number}",
-            'building': int(building_config['building'][1]),
-            'unit': building_config['unit'],
-            'floor': floor,
-            'room_in_floor': room_in_floor,
-            'room_number': str(room_number),
-            'tenants': [],
-            'main_tenant': None,
-            'co_tenants': [],
-            'is_vacant': True
-        } 
\ No newline at end of file
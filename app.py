@@ -4,51 +4,307 @@
 房间分配可视化网页应用 - 动态数据版本
 """
 
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, g, render_template, jsonify, request, stream_with_context
+import hashlib
 import logging
-import json
-from datetime import datetime
-from bson import ObjectId
+from datetime import datetime, timezone
 from config import Config
-from api_client import RoomsDataManager
-from auth_manager import get_fresh_auth_info, update_auth_info
+from api_client import RoomsDataManager, auth_coordinator, sync_flight
+from layout_cache import LayoutSnapshotCache
+from layout_spec import layout_skeleton
+from sync_scheduler import SyncScheduler
+from response_cache import (convert_objectid, fields_key, negotiate_encoding, parse_fields, project,
+                            project_rooms, snapshot_body, snapshot_etag)
+from response_metrics import ResponseMetrics
+from change_events import ChangeEventBroker, diff_layouts
+from search_index import SearchIndexBuilder
+from auth_probe import AuthProbe
+from health_monitor import HealthMonitor
+from auth_manager import auth_manager, get_fresh_auth_info, update_auth_info
+from token_refresher import TokenRefresher
 import threading
 import time
+import atexit
+import os
+import queue
+
+# 尝试导入自动登录（需要 selenium 和 Chrome 驱动）
+try:
+    from auto_auth import browser_pool, get_fresh_auth_info as auto_login, login_stats
+    AUTO_LOGIN_AVAILABLE = True
+except ImportError:
+    auto_login = None
+    AUTO_LOGIN_AVAILABLE = False
+    logging.warning("自动登录不可用，令牌过期后需要手动更新认证信息")
 
 app = Flask(__name__)
 app.config['DEBUG'] = Config.DEBUG
 
-# 自定义JSON编码器处理MongoDB ObjectId
-class JSONEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, ObjectId):
-            return str(o)
-        return json.JSONEncoder.default(self, o)
-
-# MongoDB ObjectId序列化函数
-def convert_objectid(obj):
-    """递归转换ObjectId为字符串"""
-    if isinstance(obj, ObjectId):
-        return str(obj)
-    elif isinstance(obj, dict):
-        return {key: convert_objectid(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_objectid(item) for item in obj]
-    else:
-        return obj
+# 进程启动时间
+started_at = time.time()
 
 # 配置日志
 logging.basicConfig(level=getattr(logging, Config.LOG_LEVEL))
 logger = logging.getLogger(__name__)
 
+# 缓存文件中的令牌比配置中的默认值更新，启动时优先使用
+if auth_manager.get_auth_info():
+    Config.update_cookies(auth_manager.get_auth_info())
+    auth_coordinator.publish(auth_manager.get_auth_info())
+
 # 初始化数据管理器
 data_manager = RoomsDataManager()
 
+# 按接口统计响应大小与耗时
+response_metrics = ResponseMetrics()
+
+@app.before_request
+def start_request_timer():
+    """记录请求开始时间"""
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_response_metrics(response):
+    """记录API接口的响应大小与处理耗时"""
+    started = g.get('request_started')
+    if started is not None and request.endpoint and request.path.startswith('/api/') and not response.is_streamed:
+        response_metrics.record(
+            request.endpoint,
+            time.perf_counter() - started,
+            response.status_code,
+            response.calculate_content_length() or 0,
+            raw_bytes=g.get('raw_size'),
+            encoding=response.content_encoding
+        )
+    return response
+
+def load_complete_layout():
+    """
+    布局快照加载器（每次调用时使用当前的数据管理器）
+    
+    优先读取数据库中的物化布局快照；没有快照，或快照已过期且没有后台调度器负责刷新时，
+    执行一次完整同步
+    """
+    data = data_manager.get_latest_layout()
+    if data:
+        if sync_scheduler.is_alive():
+            return data
+        
+        try:
+            age = (datetime.now() - datetime.fromisoformat(data.get('timestamp', ''))).total_seconds()
+        except (TypeError, ValueError):
+            age = None
+        if age is not None and age < Config.LAYOUT_CACHE_TTL:
+            return data
+    
+    return data_manager.generate_complete_layout()
+
+def sync_layout_snapshot():
+    """执行一次完整同步（获取 → 处理 → 保存）并更新布局快照"""
+    data = data_manager.generate_complete_layout()
+    return layout_cache.put(data) if data else None
+
+def rebuild_layout_snapshot():
+    """标签变更后从数据库重建布局快照（不请求上游）"""
+    try:
+        data = data_manager.rebuild_layout_from_database()
+        if data:
+            layout_cache.put(data)
+            return
+    except Exception as e:
+        logger.error(f"重建布局快照失败: {str(e)}")
+    
+    layout_cache.invalidate()
+
+# 布局快照缓存
+layout_cache = LayoutSnapshotCache(load_complete_layout, Config.LAYOUT_CACHE_TTL)
+
+# 变更事件推送
+change_events = ChangeEventBroker(Config.EVENTS_HISTORY_SIZE, Config.EVENTS_QUEUE_SIZE, Config.EVENTS_MAX_SUBSCRIBERS)
+
+def publish_layout_changes(previous, snapshot):
+    """布局快照更新后，推送发生变化的房间（同步和标签变更都会产生新快照）"""
+    if previous is None or previous.version == snapshot.version:
+        return
+    
+    # 直接对比紧凑记录，只还原发生变化的房间
+    changes = diff_layouts({'rooms': previous.layout.records}, {'rooms': snapshot.layout.records})
+    data = snapshot.data
+    change_events.publish('rooms', {
+        'version': snapshot.version,
+        'previous_version': previous.version,
+        'rooms': snapshot.layout.to_dicts(changes['rooms']),
+        'removed': changes['removed'],
+        'total_rooms': data.get('total_rooms', 0),
+        'occupied_count': data.get('occupied_count', 0),
+        'vacant_count': data.get('vacant_count', 0),
+        'tag_statistics': data.get('tag_statistics', {}),
+        'timestamp': data.get('timestamp', '')
+    }, snapshot.version)
+    
+    if changes['rooms'] or changes['removed']:
+        logger.info(f"推送布局变更: 版本 {snapshot.version}，变更房间 {len(changes['rooms'])} 间")
+
+layout_cache.add_listener(publish_layout_changes)
+
+# 搜索索引在快照更新后由后台线程构建，不占用请求线程
+search_indexes = SearchIndexBuilder()
+
+def rebuild_search_index(previous, snapshot):
+    """布局快照更新后，在后台为新快照构建搜索索引"""
+    search_indexes.submit(snapshot)
+
+layout_cache.add_listener(rebuild_search_index)
+
+def run_scheduled_sync():
+    """后台同步任务：获取 → 处理 → 保存，并更新布局快照"""
+    snapshot = sync_layout_snapshot()
+    if not snapshot:
+        raise RuntimeError('同步未返回布局数据')
+    return snapshot.layout.tenant_count
+
+# 后台同步调度器
+sync_scheduler = SyncScheduler(
+    run_scheduled_sync,
+    interval=Config.SYNC_INTERVAL,
+    jitter=Config.SYNC_JITTER,
+    max_runtime=Config.SYNC_MAX_RUNTIME
+)
+
+def start_background_services():
+    """启动后台服务"""
+    if Config.SYNC_SCHEDULER_ENABLED:
+        # 由调度器负责刷新快照，读取路径不再触发同步
+        layout_cache.auto_revalidate = False
+        sync_scheduler.start()
+    health_monitor.start()
+    token_refresher.start()
+
+def stop_background_services():
+    """停止后台服务"""
+    sync_scheduler.stop()
+    health_monitor.stop()
+    token_refresher.stop()
+    if AUTO_LOGIN_AVAILABLE:
+        browser_pool.close()
+    change_events.close()
+    layout_cache.auto_revalidate = True
+
+atexit.register(stop_background_services)
+
+def add_snapshot_validators(response, snapshot, key, encoding=None):
+    """为响应添加基于快照版本的缓存验证器（ETag / Last-Modified）"""
+    response.set_etag(snapshot_etag(snapshot, key, encoding))
+    response.last_modified = datetime.fromtimestamp(int(snapshot.created_at), tz=timezone.utc)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Age'] = str(int(snapshot.age()))
+    return response
+
+def not_modified_response(snapshot, key, encoding=None):
+    """
+    客户端持有的验证器仍然有效时返回304响应，否则返回None
+    
+    只比较内存中的快照版本，不访问数据库或上游
+    """
+    if request.if_none_match:
+        if not request.if_none_match.contains(snapshot_etag(snapshot, key, encoding)):
+            return None
+    elif request.if_modified_since:
+        if int(snapshot.created_at) > request.if_modified_since.timestamp():
+            return None
+    else:
+        return None
+    
+    return add_snapshot_validators(Response(status=304), snapshot, key, encoding)
+
+def cached_snapshot_response(snapshot, key, build_payload):
+    """
+    返回按快照版本缓存的预序列化JSON响应，支持条件请求和压缩协商
+    
+    每个快照版本只序列化一次，每种压缩编码只压缩一次；条件请求在构建响应内容之前检查，
+    验证器有效时不执行 build_payload（不访问数据库、不还原房间数据）
+    """
+    encoding = negotiate_encoding(request.accept_encodings)
+    
+    # 响应过小时不压缩，实际编码要到构建内容后才知道，两种ETag都接受
+    for candidate in ((encoding, None) if encoding else (None,)):
+        not_modified = not_modified_response(snapshot, key, candidate)
+        if not_modified:
+            not_modified.vary.add('Accept-Encoding')
+            return not_modified
+    
+    body, encoding = snapshot_body(snapshot, key, build_payload, encoding)
+    
+    response = Response(body, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.content_encoding = encoding
+        g.raw_size = len(snapshot_body(snapshot, key, build_payload, None)[0])
+    return add_snapshot_validators(response, snapshot, key, encoding)
+
+def snapshot_response(response_data, snapshot):
+    """生成JSON响应，并标注所用快照的年龄"""
+    age = snapshot.age()
+    response_data['snapshot_age'] = round(age, 1)
+    response = jsonify(response_data)
+    response.headers['Age'] = str(int(age))
+    return response
+
 # 全局变量用于跟踪认证状态
 auto_auth_lock = threading.Lock()
 last_auth_check = 0
 auth_check_interval = 3600  # 1小时检查一次认证状态（降低频率）
 
+# 轻量认证探测（pageSize=1 单次请求，结果在缓存窗口内复用）
+auth_probe = AuthProbe(lambda: data_manager.api_client.probe_auth(), Config.AUTH_PROBE_TTL)
+
+# 后台令牌刷新：临近过期或验证失效时重新登录，请求路径不等待登录
+token_refresher = TokenRefresher(
+    auth_manager,
+    login=auto_login,
+    validate=auth_probe.check,
+    max_age_hours=Config.AUTH_MAX_AGE_HOURS,
+    refresh_ahead_hours=Config.AUTH_REFRESH_AHEAD_HOURS,
+    check_interval=Config.AUTH_REFRESH_CHECK_INTERVAL
+)
+
+def apply_refreshed_auth(auth_info):
+    """发布新令牌，各会话在下次请求前按代数重新应用Cookie，无需重建数据管理器"""
+    Config.update_cookies(auth_info)
+    auth_coordinator.publish(auth_info)
+    auth_probe.invalidate()
+
+token_refresher.add_listener(apply_refreshed_auth)
+
+def check_mongo():
+    """健康检查：数据库连接"""
+    if not (data_manager.use_database and data_manager.db_manager):
+        return 'disabled'
+    if not data_manager.db_manager.ping():
+        raise RuntimeError('MongoDB不可用')
+    return 'ok'
+
+def check_snapshot():
+    """健康检查：报告当前布局快照的版本和年龄（只读取现有快照，不触发加载或同步）"""
+    snapshot = layout_cache.peek()
+    if not snapshot:
+        raise RuntimeError('布局快照尚未加载')
+    age = snapshot.age()
+    if age > Config.READY_MAX_SNAPSHOT_AGE:
+        raise RuntimeError(f'布局快照已 {int(age)} 秒未更新（版本 {snapshot.version}）')
+    return {'version': snapshot.version, 'age': round(age, 1)}
+
+def check_upstream_auth():
+    """健康检查：上游认证状态（使用缓存的轻量探测）"""
+    return AuthProbe.auth_status(auth_probe.check())
+
+# 健康状态在后台刷新，/readyz 只读取缓存结果
+health_monitor = HealthMonitor({
+    'mongo': check_mongo,
+    'snapshot': check_snapshot,
+    'auth': check_upstream_auth
+}, Config.HEALTH_CHECK_INTERVAL)
+
 def check_and_refresh_auth():
     """检查并刷新认证信息"""
     global last_auth_check
@@ -70,9 +326,7 @@ def check_and_refresh_auth():
                 logger.info("获取到新的认证信息，正在更新...")
                 if update_auth_info(fresh_auth):
                     logger.info("认证信息更新成功")
-                    # 重新初始化数据管理器
-                    global data_manager
-                    data_manager = RoomsDataManager()
+                    apply_refreshed_auth(fresh_auth)
                     last_auth_check = current_time
                     return True
                 else:
@@ -87,38 +341,44 @@ def check_and_refresh_auth():
             logger.error(f"认证检查失败: {str(e)}")
             return False
 
+def refresh_auth_in_background(failed_token=None):
+    """
+    请求后台令牌刷新器重新登录（立即返回，刷新器只运行一个）
+    
+    Args:
+        failed_token: 已失效的令牌，刷新器处理时令牌已被替换则不再登录
+    """
+    token_refresher.start()
+    auth_manager.request_refresh(failed_token)
+
 def auth_check_on_page_access():
-    """仅在页面访问时进行认证检查"""
+    """
+    仅在页面访问时进行认证检查
+    
+    使用缓存的轻量认证探测，不生成布局、不写数据库；认证失效时在后台刷新，不阻塞页面渲染
+    """
     try:
-        logger.info("页面访问时进行认证检查...")
+        result = auth_probe.check()
         
-        # 尝试获取数据来验证认证有效性
-        test_data = data_manager.generate_complete_layout()
+        if result.get('valid') is False:
+            logger.warning(f"认证探测发现认证失效（{result.get('message')}），后台刷新认证...")
+            refresh_auth_in_background(result.get('token'))
+            return False
         
-        if test_data and test_data.get('rooms'):
-            occupied_rooms = [r for r in test_data.get('rooms', []) if r.get('tenants')]
-            
-            # 如果入住房间数量正常，认证有效
-            if len(occupied_rooms) > 100:
-                logger.info(f"认证检查通过，当前 {len(occupied_rooms)} 个房间已入住")
-                return True
-            else:
-                logger.warning(f"认证检查发现异常，只有 {len(occupied_rooms)} 个房间已入住，尝试刷新认证...")
-                return check_and_refresh_auth()
-        else:
-            logger.warning("认证检查失败，无法获取数据，尝试刷新认证...")
-            return check_and_refresh_auth()
+        if result.get('valid') is None:
+            logger.warning(f"认证状态未知: {result.get('message')}")
+        return True
             
     except Exception as e:
         logger.error(f"认证检查失败: {str(e)}")
-        return check_and_refresh_auth()
+        return False
 
 def organize_rooms_by_floor(rooms):
-    """按楼层组织房间数据"""
+    """按楼层组织房间数据（多楼栋或多单元时按 "<栋号>-<单元>-<楼层>" 分组，同号楼层不合并）"""
     floors = {}
     
     for room in rooms:
-        floor = room['floor']
+        floor = layout_skeleton.floor_key(room)
         if floor not in floors:
             floors[floor] = []
         floors[floor].append(room)
@@ -136,82 +396,153 @@ def index():
     auth_check_on_page_access()
     return render_template('index.html')
 
+def projected_key(key, fields):
+    """带字段投影的响应缓存键"""
+    return f"{key};fields={fields_key(fields)}" if fields else key
+
+def build_rooms_payload(snapshot, fields=None):
+    """构建 /api/rooms 响应内容"""
+    data = snapshot.data
+    
+    # 按楼层组织数据
+    floors_data = organize_rooms_by_floor(project_rooms(snapshot.rooms(), fields))
+    
+    return {
+        'total_rooms': data.get('total_rooms', 0),
+        'floors': floors_data,
+        'timestamp': data.get('timestamp', ''),
+        # 房间已按布局顺序排列（楼栋、单元、楼层依次递增），楼层保持该顺序
+        'floor_numbers': list(floors_data),
+        'layout_info': data.get('layout_info', {}),
+        'occupied_count': snapshot.layout.occupied_count,
+        'version': snapshot.version
+    }
+
 @app.route('/api/rooms')
 def get_rooms_data():
-    """获取房间数据API - 动态从外部API获取"""
+    """获取房间数据API - 读取布局快照"""
     try:
         logger.info("开始获取房间数据...")
         
-        # 移除自动认证检查，直接获取数据
-        # 如果认证过期，API客户端会自动处理401错误
+        # 从布局快照获取数据
+        snapshot = layout_cache.get()
         
-        # 从外部API获取实时数据
-        data = data_manager.generate_complete_layout()
-        
-        if not data:
+        if not snapshot:
             logger.error("无法获取房间数据")
             return jsonify({'error': '无法获取房间数据'}), 500
         
-        # 按楼层组织数据
-        rooms = data.get('rooms', [])
-        floors_data = organize_rooms_by_floor(rooms)
-        
-        # 统计入住情况
-        occupied_rooms = [r for r in rooms if r.get('tenants')]
-        
-        logger.info(f"成功获取房间数据，共 {len(rooms)} 个房间，{len(occupied_rooms)} 个已入住")
-        
-        response_data = {
-            'total_rooms': data.get('total_rooms', 0),
-            'floors': floors_data,
-            'timestamp': data.get('timestamp', ''),
-            'floor_numbers': sorted(floors_data.keys()),
-            'layout_info': data.get('layout_info', {}),
-            'occupied_count': len(occupied_rooms)
-        }
-        
-        # 转换ObjectId
-        response_data = convert_objectid(response_data)
-        
-        return jsonify(response_data)
+        # 同一快照版本、同一字段投影的响应只序列化一次
+        fields = parse_fields(request.args.get('fields'))
+        return cached_snapshot_response(snapshot, projected_key('rooms', fields),
+                                        lambda s: build_rooms_payload(s, fields))
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"获取房间数据失败: {str(e)}")
         return jsonify({'error': f'获取房间数据失败: {str(e)}'}), 500
 
 @app.route('/api/room/<house_id>')
 def get_room_detail(house_id):
-    """获取房间详细信息 - 优先从数据库读取"""
+    """
+    获取房间详细信息 - 通过布局快照的房间索引查找
+    
+    house_id 可以是 house_id（包括空房间合成ID）、"<栋号>-<单元>-<房间号>" 或房间号；
+    房间号在多个楼栋/单元中重复时返回409，需改用前两种ID
+    """
     try:
         logger.info(f"获取房间详情: {house_id}")
         
-        # 优先尝试从数据库获取房间详情
-        room_detail = data_manager.get_room_detail_from_db(house_id)
+        etag_key = f"room-{house_id}"
+        # 房间详情随快照版本变化（同步或标签变更都会产生新版本），验证器仍有效时直接返回304（只读取现有快照，不触发加载）
+        current = layout_cache.peek()
+        if current:
+            not_modified = not_modified_response(current, etag_key)
+            if not_modified:
+                return not_modified
+        
+        snapshot = layout_cache.get()
+        if snapshot:
+            room = snapshot.layout.find(house_id)
+            if not room:
+                if snapshot.layout.is_ambiguous(house_id):
+                    return jsonify({'error': f'房间号 {house_id} 在多个楼栋中存在，请使用 house_id 或 "<栋号>-<单元>-<房间号>"'}), 409
+                return jsonify({'error': '房间不存在'}), 404
+            
+            room = convert_objectid(room.to_dict())
+            return add_snapshot_validators(snapshot_response(room, snapshot), snapshot, etag_key)
         
+        # 布局快照不可用时从数据库读取
+        logger.warning(f"布局快照不可用，尝试从数据库获取房间 {house_id} 详情...")
+        room_detail = data_manager.get_room_detail_from_db(house_id)
         if room_detail:
-            logger.info(f"从数据库获取房间 {house_id} 详情成功")
-            room_detail = convert_objectid(room_detail)
-            return jsonify(room_detail)
+            return jsonify(convert_objectid(room_detail))
         
-        # 如果数据库中没有，再从API获取
-        logger.warning(f"数据库中未找到房间 {house_id}，尝试从API获取...")
-        data = data_manager.generate_complete_layout()
-        
-        if not data:
-            return jsonify({'error': '无法获取房间数据'}), 500
-        
-        rooms = data.get('rooms', [])
-        for room in rooms:
-            if str(room['house_id']) == str(house_id):
-                room = convert_objectid(room)
-                return jsonify(room)
-        
-        return jsonify({'error': '房间不存在'}), 404
+        return jsonify({'error': '无法获取房间数据'}), 500
         
     except Exception as e:
         logger.error(f"获取房间详情失败: {str(e)}")
         return jsonify({'error': f'获取房间详情失败: {str(e)}'}), 500
 
+@app.route('/api/rooms/batch')
+def get_rooms_batch():
+    """
+    批量获取房间详情，支持 fields 字段投影
+    
+    ids 为逗号分隔的房间ID，每个ID依次按 house_id（包括空房间合成ID）、"<栋号>-<单元>-<房间号>"、房间号查找，
+    即与某个 house_id 相同的值不会再当作房间号。结果按请求的ID返回，找不到的ID列在 missing 中；
+    房间号在多个楼栋/单元中重复时不会任选其一，该ID列在 ambiguous 中
+    """
+    try:
+        ids = list(dict.fromkeys(room_id.strip() for room_id in request.args.get('ids', '').split(',') if room_id.strip()))
+        if not ids:
+            return jsonify({'success': False, 'error': '缺少房间ID参数 ids'}), 400
+        if len(ids) > Config.ROOMS_BATCH_MAX_IDS:
+            return jsonify({'success': False, 'error': f'单次最多获取 {Config.ROOMS_BATCH_MAX_IDS} 个房间'}), 400
+        
+        fields = parse_fields(request.args.get('fields'))
+        
+        ids_digest = hashlib.sha1(','.join(ids).encode('utf-8')).hexdigest()[:16]
+        etag_key = projected_key(f"rooms-batch-{ids_digest}", fields)
+        # 先用现有快照检查验证器，需要返回内容时才读取（可能触发加载）
+        current = layout_cache.peek()
+        if current:
+            not_modified = not_modified_response(current, etag_key)
+            if not_modified:
+                return not_modified
+        
+        snapshot = layout_cache.get()
+        if not snapshot:
+            return jsonify({'success': False, 'error': '无法获取房间数据'}), 500
+        
+        rooms = {}
+        missing = []
+        ambiguous = []
+        for room_id in ids:
+            room = snapshot.layout.find(room_id)
+            if room:
+                rooms[room_id] = project(room.to_dict(), fields)
+            elif snapshot.layout.is_ambiguous(room_id):
+                ambiguous.append(room_id)
+            else:
+                missing.append(room_id)
+        
+        logger.info(f"批量获取房间详情: 请求 {len(ids)} 个，找到 {len(rooms)} 个")
+        response = snapshot_response({
+            'success': True,
+            'rooms': convert_objectid(rooms),
+            'missing': missing,
+            'ambiguous': ambiguous,
+            'version': snapshot.version
+        }, snapshot)
+        return add_snapshot_validators(response, snapshot, etag_key)
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"批量获取房间详情失败: {str(e)}")
+        return jsonify({'success': False, 'error': f'批量获取房间详情失败: {str(e)}'}), 500
+
 @app.route('/api/room/<house_id>', methods=['PUT'])
 def update_room(house_id):
     """更新房间信息 - 注意：当前版本不支持更新外部API数据"""
@@ -236,36 +567,35 @@ def update_room(house_id):
 
 @app.route('/api/search')
 def search_rooms():
-    """搜索房间"""
+    """搜索房间（房间号、租户姓名、拼音/首字母、手机号，房间号和手机号支持任意位置子串），结果按匹配程度排序并分页"""
     try:
         query = request.args.get('q', '').strip()
         if not query:
             return jsonify({'rooms': []})
         
+        page = max(1, request.args.get('page', 1, type=int))
+        page_size = min(max(1, request.args.get('page_size', 20, type=int)), 100)
+        
         logger.info(f"搜索房间: {query}")
         
         # 获取完整数据
-        data = data_manager.generate_complete_layout()
+        snapshot = layout_cache.get()
         
-        if not data:
+        if not snapshot:
             return jsonify({'error': '无法获取房间数据'}), 500
         
-        rooms = data.get('rooms', [])
-        results = []
+        # 使用后台已构建好的索引（新快照的索引构建完成前沿用上一版本），结果与索引所属快照保持一致
+        snapshot, index = search_indexes.get(snapshot)
+        result = index.search(query, page, page_size)
         
-        query_lower = query.lower()
-        
-        for room in rooms:
-            # 搜索房间号、租户姓名、手机号
-            if (query_lower in room['room_number'].lower() or
-                query_lower in room['house_name'].lower() or
-                any(query_lower in tenant['tenant_name'].lower() or 
-                    query_lower in tenant['mobile'] for tenant in room['tenants'])):
-                results.append(room)
-        
-        logger.info(f"搜索完成，找到 {len(results)} 个结果")
-        results = convert_objectid(results)
-        return jsonify({'rooms': results})
+        logger.info(f"搜索完成，第 {page} 页 {len(result['rooms'])} 个结果")
+        return snapshot_response({
+            'rooms': convert_objectid(snapshot.layout.to_dicts(result['rooms'])),
+            'scores': result['scores'],
+            'page': page,
+            'page_size': page_size,
+            'has_more': result['has_more']
+        }, snapshot)
         
     except Exception as e:
         logger.error(f"搜索房间失败: {str(e)}")
@@ -287,26 +617,22 @@ def refresh_data():
         if not auth_success:
             logger.warning("认证更新失败，但继续尝试获取数据...")
         
-        # 重新初始化数据管理器以清除可能的缓存
-        global data_manager
-        data_manager = RoomsDataManager()
+        # 获取新数据并更新布局快照
+        snapshot = sync_layout_snapshot()
         
-        # 获取新数据
-        data = data_manager.generate_complete_layout()
-        
-        if not data:
+        if not snapshot:
             return jsonify({'error': '刷新数据失败'}), 500
         
-        # 统计入住情况
-        occupied_rooms = [r for r in data.get('rooms', []) if r.get('tenants')]
+        data = snapshot.data
+        occupied_count = snapshot.layout.occupied_count
         
-        logger.info(f"数据刷新成功，{len(occupied_rooms)} 个房间已入住")
+        logger.info(f"数据刷新成功，{occupied_count} 个房间已入住")
         return jsonify({
             'success': True,
-            'message': f'数据刷新成功，{len(occupied_rooms)} 个房间已入住',
+            'message': f'数据刷新成功，{occupied_count} 个房间已入住',
             'timestamp': data.get('timestamp', ''),
             'total_rooms': data.get('total_rooms', 0),
-            'occupied_count': len(occupied_rooms),
+            'occupied_count': occupied_count,
             'auth_updated': auth_success
         })
         
@@ -314,30 +640,87 @@ def refresh_data():
         logger.error(f"刷新数据失败: {str(e)}")
         return jsonify({'error': f'刷新数据失败: {str(e)}'}), 500
 
+@app.route('/healthz')
+def healthz():
+    """存活检查：进程能响应请求即为存活，不做任何I/O"""
+    return jsonify({'status': 'ok', 'uptime': round(time.time() - started_at, 1)})
+
+@app.route('/readyz')
+def readyz():
+    """
+    就绪检查：读取后台刷新的数据库、认证状态和当前快照年龄，不做任何I/O、不触发同步
+    
+    数据库不可用或尚无布局快照时返回503；快照过旧或上游认证失效时仍可提供数据，标记为降级
+    """
+    # 以WSGI方式部署时不会执行 start_background_services，首次调用时启动后台检查并在后台加载首个快照
+    health_monitor.start()
+    layout_cache.warm_up()
+    
+    mongo = health_monitor.get('mongo')
+    auth = health_monitor.get('auth')
+    snapshot = layout_cache.peek()
+    
+    failures = []
+    if mongo is None:
+        failures.append('健康检查尚未完成')
+    elif not mongo['ok']:
+        failures.append(f"数据库不可用: {mongo['error']}")
+    if snapshot is None:
+        failures.append('布局快照尚未加载')
+    
+    warnings = []
+    snapshot_age = round(snapshot.age(), 1) if snapshot else None
+    if snapshot_age is not None and snapshot_age > Config.READY_MAX_SNAPSHOT_AGE:
+        warnings.append(f'布局快照已 {int(snapshot_age)} 秒未更新')
+    auth_status = auth['value'] if auth and auth['ok'] else 'unknown'
+    if auth_status == 'invalid':
+        warnings.append('上游认证失效')
+    
+    if failures:
+        status = 'not_ready'
+    elif warnings:
+        status = 'degraded'
+    else:
+        status = 'ready'
+    
+    return jsonify({
+        'status': status,
+        'failures': failures,
+        'warnings': warnings,
+        'mongo': mongo['value'] if mongo and mongo['ok'] else 'unavailable',
+        'snapshot_version': snapshot.version if snapshot else None,
+        'snapshot_age': snapshot_age,
+        'auth_status': auth_status,
+        'checked_at': health_monitor.state()['last_run_at']
+    }), 503 if failures else 200
+
 @app.route('/api/status')
 def get_api_status():
-    """获取API状态"""
+    """获取API状态（只读取缓存状态，不触发同步或上游请求）"""
     try:
-        # 移除自动认证检查，直接获取数据
+        snapshot = layout_cache.peek()
         
-        # 简单的健康检查
-        data = data_manager.generate_complete_layout()
-        
-        if data:
-            occupied_rooms = [r for r in data.get('rooms', []) if r.get('tenants')]
-            return jsonify({
+        if snapshot:
+            data = snapshot.data
+            return snapshot_response({
                 'status': 'healthy',
                 'timestamp': datetime.now().isoformat(),
                 'total_rooms': data.get('total_rooms', 0),
-                'occupied_count': len(occupied_rooms),
+                'occupied_count': snapshot.layout.occupied_count,
                 'last_update': data.get('timestamp', ''),
-                'auth_status': 'valid'
-            })
+                'auth_status': AuthProbe.auth_status(auth_probe.last_result()),
+                'auth_probe': auth_probe.stats(),
+                'token_refresher': token_refresher.stats(),
+                'auth_refresh': auth_coordinator.stats(),
+                'auto_login': login_stats() if AUTO_LOGIN_AVAILABLE else None,
+                'health': health_monitor.state(),
+                'cache': layout_cache.stats()
+            }, snapshot)
         else:
             return jsonify({
                 'status': 'error',
-                'message': '无法获取数据',
-                'auth_status': 'invalid'
+                'message': '布局快照尚未加载',
+                'auth_status': AuthProbe.auth_status(auth_probe.last_result())
             }), 500
             
     except Exception as e:
@@ -348,6 +731,17 @@ def get_api_status():
             'auth_status': 'unknown'
         }), 500
 
+def build_rooms_details_payload(snapshot):
+    """构建 /api/rooms/details 响应内容"""
+    # 直接返回房间数据，因为generate_complete_layout已经包含了所有详细信息
+    return {
+        'success': True,
+        'rooms': snapshot.rooms(),
+        'total_count': snapshot.layout.total_rooms,
+        'timestamp': snapshot.data.get('timestamp'),
+        'version': snapshot.version
+    }
+
 @app.route('/api/rooms/details')
 def get_all_rooms_details():
     """获取所有房间的详细信息（包括租户详细信息）"""
@@ -355,23 +749,14 @@ def get_all_rooms_details():
         logger.info("Fetching all rooms details...")
         
         # 获取完整的房间布局数据（包含详细信息）
-        complete_data = data_manager.generate_complete_layout()
-        if not complete_data:
+        snapshot = layout_cache.get()
+        if not snapshot:
             return jsonify({
                 'success': False,
                 'error': 'Failed to fetch rooms data'
             }), 500
         
-        # 直接返回房间数据，因为generate_complete_layout已经包含了所有详细信息
-        rooms_list = complete_data.get('rooms', [])
-        
-        logger.info(f"Successfully fetched details for {len(rooms_list)} rooms")
-        return jsonify({
-            'success': True,
-            'rooms': rooms_list,
-            'total_count': len(rooms_list),
-            'timestamp': complete_data.get('timestamp')
-        })
+        return cached_snapshot_response(snapshot, 'rooms_details', build_rooms_details_payload)
         
     except Exception as e:
         logger.error(f"Error in get_all_rooms_details: {e}")
@@ -400,9 +785,7 @@ def update_auth():
             
             # 更新认证信息
             if update_auth_info(auth_data):
-                # 重新初始化数据管理器
-                global data_manager
-                data_manager = RoomsDataManager()
+                apply_refreshed_auth(auth_data)
                 
                 logger.info("认证信息更新成功")
                 return jsonify({
@@ -435,14 +818,14 @@ def refresh_auth():
         
         if auth_success:
             # 测试新认证信息
-            test_data = data_manager.generate_complete_layout()
-            occupied_rooms = [r for r in test_data.get('rooms', []) if r.get('tenants')] if test_data else []
+            snapshot = sync_layout_snapshot()
+            occupied_count = snapshot.layout.occupied_count if snapshot else 0
             
             return jsonify({
                 'success': True,
-                'message': f'认证信息刷新成功，获取到 {len(occupied_rooms)} 个已入住房间',
+                'message': f'认证信息刷新成功，获取到 {occupied_count} 个已入住房间',
                 'timestamp': datetime.now().isoformat(),
-                'occupied_count': len(occupied_rooms)
+                'occupied_count': occupied_count
             })
         else:
             return jsonify({
@@ -459,22 +842,39 @@ def refresh_auth():
 
 # ==================== 标签管理API ====================
 
+def build_tags_payload(snapshot):
+    """构建 /api/tags 响应内容"""
+    tag_stats = snapshot.data.get('tag_statistics')
+    if tag_stats is None:
+        tag_stats = data_manager.get_tag_statistics()
+    
+    return {
+        'success': True,
+        'tags': data_manager.get_available_tags(),
+        'statistics': tag_stats,
+        # 从配置中获取标签颜色
+        'colors': Config.STUDENT_TAGS.get('tag_colors', {}),
+        'version': snapshot.version
+    }
+
 @app.route('/api/tags')
 def get_available_tags():
     """获取可用的标签列表"""
     try:
-        tags = data_manager.get_available_tags()
-        tag_stats = data_manager.get_tag_statistics()
+        snapshot = layout_cache.get()
         
-        # 从配置中获取标签颜色
-        tag_colors = Config.STUDENT_TAGS.get('tag_colors', {})
+        if not snapshot:
+            tags = data_manager.get_available_tags()
+            tag_stats = data_manager.get_tag_statistics()
+            return jsonify({
+                'success': True,
+                'tags': tags,
+                'statistics': tag_stats,
+                'colors': Config.STUDENT_TAGS.get('tag_colors', {})
+            })
         
-        return jsonify({
-            'success': True,
-            'tags': tags,
-            'statistics': tag_stats,
-            'colors': tag_colors
-        })
+        # 标签统计随布局快照一起生成，每个快照版本只查询一次标签列表
+        return cached_snapshot_response(snapshot, 'tags', build_tags_payload)
         
     except Exception as e:
         logger.error(f"获取标签列表失败: {str(e)}")
@@ -526,6 +926,8 @@ def update_student_tag(student_id):
         
         if success:
             logger.info(f"学生 {student_id} 标签更新为: {tag}")
+            # 标签已变更，重建布局快照
+            rebuild_layout_snapshot()
             return jsonify({
                 'success': True,
                 'message': f'标签更新成功: {tag}',
@@ -624,6 +1026,9 @@ def batch_update_student_tags():
         
         logger.info(f"批量更新完成: {success_count} 成功, {len(failed_updates)} 失败")
         
+        if success_count:
+            rebuild_layout_snapshot()
+        
         return jsonify({
             'success': True,
             'message': f'批量更新完成: {success_count} 成功, {len(failed_updates)} 失败',
@@ -645,19 +1050,34 @@ def sync_data():
     try:
         logger.info("开始同步数据...")
         
-        # 从外部API获取完整数据并存入数据库
-        data = data_manager.generate_complete_layout()
+        # 后台调度器运行时只触发一次同步，不阻塞请求
+        if sync_scheduler.is_alive():
+            sync_scheduler.trigger()
+            snapshot = layout_cache.get()
+            logger.info("已通知后台调度器执行同步")
+            return jsonify({
+                'success': True,
+                'message': '已触发后台同步',
+                'scheduled': True,
+                'synced_rooms': snapshot.layout.total_rooms if snapshot else 0,
+                'timestamp': snapshot.data.get('timestamp', '') if snapshot else datetime.now().isoformat()
+            })
+        
+        # 从外部API获取完整数据并存入数据库，同时更新布局快照
+        snapshot = sync_layout_snapshot()
+        data = snapshot.data if snapshot else None
         
         if not data:
             logger.error("数据同步失败，无法获取外部API数据")
             return jsonify({'error': '数据同步失败', 'success': False}), 500
         
-        logger.info(f"数据同步成功，共同步 {len(data.get('rooms', []))} 个房间")
+        logger.info(f"数据同步成功，共同步 {snapshot.layout.total_rooms} 个房间")
         
         response_data = {
             'success': True,
             'message': '数据同步成功',
-            'synced_rooms': len(data.get('rooms', [])),
+            'synced_rooms': snapshot.layout.total_rooms,
+            'changes': data.get('sync_changes', {}),
             'timestamp': data.get('timestamp', datetime.now().isoformat())
         }
         
@@ -667,63 +1087,357 @@ def sync_data():
         logger.error(f"数据同步失败: {str(e)}")
         return jsonify({'error': f'数据同步失败: {str(e)}', 'success': False}), 500
 
+def build_rooms_with_tags_payload(snapshot, fields=None):
+    """构建 /api/rooms/with-tags 响应内容"""
+    data = snapshot.data
+    
+    # 按楼层组织数据
+    floors_data = organize_rooms_by_floor(project_rooms(snapshot.rooms(), fields))
+    
+    return {
+        'success': True,
+        'total_rooms': data.get('total_rooms', 0),
+        'occupied_count': data.get('occupied_count', 0),
+        'vacant_count': data.get('vacant_count', 0),
+        'floors': floors_data,
+        'timestamp': data.get('timestamp', ''),
+        # 房间已按布局顺序排列（楼栋、单元、楼层依次递增），楼层保持该顺序
+        'floor_numbers': list(floors_data),
+        'layout_info': data.get('layout_info', {}),
+        'tag_statistics': data.get('tag_statistics', {}),
+        'version': snapshot.version
+    }
+
 @app.route('/api/rooms/with-tags')
 def get_rooms_with_tags():
-    """获取带标签信息的房间数据 - 优先从数据库读取"""
+    """获取带标签信息的房间数据 - 读取物化布局快照"""
     try:
         logger.info("获取带标签的房间数据...")
         
-        # 优先从数据库获取数据
-        data = data_manager.get_rooms_with_tags()
+        # 布局快照由数据库中的物化快照加载（单次索引查询），无快照时才会同步
+        snapshot = layout_cache.get()
         
-        if not data or not data.get('rooms'):
-            logger.warning("数据库中无数据，尝试从API获取并同步...")
-            # 如果数据库中没有数据，则从API获取并同步
-            data = data_manager.generate_complete_layout()
-            
-            if not data:
-                return jsonify({
-                    'success': False,
-                    'error': '无法获取房间数据'
-                }), 500
+        if not snapshot:
+            return jsonify({
+                'success': False,
+                'error': '无法获取房间数据'
+            }), 500
         
-        # 按楼层组织数据
-        rooms = data.get('rooms', [])
-        floors_data = organize_rooms_by_floor(rooms)
+        fields = parse_fields(request.args.get('fields'))
+        return cached_snapshot_response(snapshot, projected_key('rooms_with_tags', fields),
+                                        lambda s: build_rooms_with_tags_payload(s, fields))
         
-        # 统计标签信息
-        tag_stats = data.get('tag_statistics', {})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"获取带标签房间数据失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'获取数据失败: {str(e)}'
+        }), 500
+
+def build_floor_payload(snapshot, floor, fields=None, building=None, unit=None):
+    """构建 /api/floors/<floor> 响应内容"""
+    layout = snapshot.layout
+    # 记录已按布局顺序排列（楼栋、单元、房间序号），不同楼栋的同号房间不会交错
+    rooms = layout.to_dicts(layout.floor_records(floor, building, unit))
+    occupied_count = layout.floor_occupied_count(floor, building, unit)
+    
+    return {
+        'success': True,
+        'floor': floor,
+        'building': building,
+        'unit': unit,
+        'rooms': project_rooms(rooms, fields),
+        'total_rooms': len(rooms),
+        'occupied_count': occupied_count,
+        'vacant_count': len(rooms) - occupied_count,
+        'timestamp': snapshot.data.get('timestamp', ''),
+        'version': snapshot.version
+    }
+
+@app.route('/api/floors/<int:floor>')
+def get_floor_rooms(floor):
+    """
+    获取单个楼层的房间数据，支持 fields 字段投影
+    
+    多楼栋时可用查询参数 building（栋号数字）、unit 限定楼栋和单元，未指定时返回所有楼栋的该层房间
+    """
+    try:
+        snapshot = layout_cache.get()
+        if not snapshot:
+            return jsonify({'success': False, 'error': '无法获取房间数据'}), 500
+        
+        building = request.args.get('building', type=int)
+        unit = request.args.get('unit', type=int)
+        if not snapshot.layout.floor_keys(floor, building, unit):
+            return jsonify({'success': False, 'error': f'楼层 {floor} 不存在'}), 404
+        
+        fields = parse_fields(request.args.get('fields'))
+        key = f'floor-{floor}-{building}-{unit}' if building is not None or unit is not None else f'floor-{floor}'
+        return cached_snapshot_response(snapshot, projected_key(key, fields),
+                                        lambda s: build_floor_payload(s, floor, fields, building, unit))
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"获取楼层 {floor} 房间数据失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'获取楼层数据失败: {str(e)}'
+        }), 500
+
+def full_reload_payload(snapshot, since, reason):
+    """构建要求客户端全量刷新的增量响应"""
+    return {
+        'success': True,
+        'since': since,
+        'version': snapshot.version,
+        'full_reload_required': True,
+        'reason': reason
+    }
+
+def build_room_changes_payload(snapshot, since):
+    """
+    构建 /api/rooms/changes 响应内容：合并变更日志中 since 之后各版本受影响的房间
+    
+    房间数据取自当前快照，删除的房间只返回房间键（单楼栋单元时即房间号，见 layout_skeleton.room_key）
+    """
+    entries = data_manager.db_manager.get_layout_changes(since, snapshot.version)
+    if entries is None:
+        raise RuntimeError('读取布局变更日志失败')
+    
+    # 日志必须从 since 开始逐版本连续，否则中间有版本已被裁剪或未记录
+    expected_previous = since
+    for entry in entries:
+        if entry['previous_version'] != expected_previous:
+            return full_reload_payload(snapshot, since, f"变更日志不完整（版本 {entry['version']}），需要全量刷新")
+        expected_previous = entry['version']
+    if expected_previous != snapshot.version:
+        return full_reload_payload(snapshot, since, '变更日志已裁剪，需要全量刷新')
+    
+    room_keys = set()
+    student_ids = set()
+    for entry in entries:
+        room_keys.update(entry.get('rooms', []))
+        student_ids.update(entry.get('students', []))
+    
+    room_key = layout_skeleton.room_key
+    records = [room for room in snapshot.layout.records if room_key(room) in room_keys]
+    rooms = snapshot.layout.to_dicts(records)
+    current_keys = {room_key(room) for room in rooms}
+    
+    data = snapshot.data
+    return {
+        'success': True,
+        'since': since,
+        'version': snapshot.version,
+        'full_reload_required': False,
+        'rooms': rooms,
+        'removed': sorted(room_keys - current_keys),
+        'students': sorted(student_ids),
+        'total_rooms': data.get('total_rooms', 0),
+        'occupied_count': data.get('occupied_count', 0),
+        'vacant_count': data.get('vacant_count', 0),
+        'tag_statistics': data.get('tag_statistics', {}),
+        'timestamp': data.get('timestamp', '')
+    }
+
+@app.route('/api/rooms/changes')
+def get_room_changes():
+    """
+    获取指定版本之后发生变化的房间
+    
+    查询参数 since 为客户端持有的快照版本；变更日志无法覆盖时返回 full_reload_required
+    """
+    try:
+        since = request.args.get('since', type=int)
+        if since is None:
+            return jsonify({'success': False, 'error': '缺少或无效的参数 since'}), 400
         
-        logger.info(f"成功获取带标签的房间数据，共 {len(rooms)} 个房间")
+        snapshot = layout_cache.get()
+        if not snapshot:
+            return jsonify({'success': False, 'error': '无法获取房间数据'}), 500
         
-        response_data = {
-            'success': True,
-            'total_rooms': data.get('total_rooms', 0),
-            'occupied_count': data.get('occupied_count', 0),
-            'vacant_count': data.get('vacant_count', 0),
-            'floors': floors_data,
-            'timestamp': data.get('timestamp', ''),
-            'floor_numbers': sorted(floors_data.keys()),
-            'layout_info': data.get('layout_info', {}),
-            'tag_statistics': tag_stats
-        }
+        if since == snapshot.version:
+            return cached_snapshot_response(snapshot, f'changes-{since}', lambda s: {
+                'success': True,
+                'since': since,
+                'version': s.version,
+                'full_reload_required': False,
+                'rooms': [],
+                'removed': [],
+                'students': []
+            })
         
-        # 转换ObjectId
-        response_data = convert_objectid(response_data)
+        # 快照版本不来自数据库、版本号超前或早于日志保留范围时，无法增量更新
+        if not (data_manager.use_database and data_manager.db_manager) or 'version' not in snapshot.data:
+            return jsonify(full_reload_payload(snapshot, since, '变更日志不可用，需要全量刷新'))
+        if since > snapshot.version:
+            return jsonify(full_reload_payload(snapshot, since, f'版本 {since} 不存在，需要全量刷新'))
+        if since < snapshot.version - Config.LAYOUT_CHANGE_LOG_RETENTION:
+            return jsonify(full_reload_payload(snapshot, since, '变更日志已裁剪，需要全量刷新'))
         
-        return jsonify(response_data)
+        # 同一版本下相同 since 的结果只计算一次，轮询客户端不会重复查询数据库
+        return cached_snapshot_response(snapshot, f'changes-{since}',
+                                        lambda s: build_room_changes_payload(s, since))
         
     except Exception as e:
-        logger.error(f"获取带标签房间数据失败: {str(e)}")
+        logger.error(f"获取房间变更失败: {str(e)}")
         return jsonify({
             'success': False,
-            'error': f'获取数据失败: {str(e)}'
+            'error': f'获取房间变更失败: {str(e)}'
         }), 500
 
+@app.route('/api/layout/snapshots')
+def list_layout_snapshots():
+    """列出保留的布局快照版本"""
+    try:
+        snapshots = []
+        if data_manager.use_database and data_manager.db_manager:
+            for doc in data_manager.db_manager.list_layout_snapshots():
+                layout = doc.get('layout', {})
+                snapshots.append({
+                    'version': doc['version'],
+                    'created_at': doc['created_at'].isoformat() if doc.get('created_at') else None,
+                    'total_rooms': layout.get('total_rooms', 0),
+                    'occupied_count': layout.get('occupied_count', 0)
+                })
+        
+        return jsonify({
+            'success': True,
+            'current_version': layout_cache.stats()['version'],
+            'snapshots': snapshots
+        })
+        
+    except Exception as e:
+        logger.error(f"列出布局快照失败: {str(e)}")
+        return jsonify({'success': False, 'error': f'列出布局快照失败: {str(e)}'}), 500
+
+@app.route('/api/layout/snapshots/<int:version>')
+def get_layout_snapshot(version):
+    """获取指定版本的布局快照"""
+    try:
+        doc = data_manager.db_manager.get_layout_snapshot(version) if data_manager.use_database else None
+        if not doc:
+            return jsonify({'success': False, 'error': f'布局快照 {version} 不存在'}), 404
+        
+        return jsonify(convert_objectid({
+            'success': True,
+            'version': doc['version'],
+            'created_at': doc['created_at'].isoformat() if doc.get('created_at') else None,
+            'layout': doc['layout']
+        }))
+        
+    except Exception as e:
+        logger.error(f"获取布局快照失败: {str(e)}")
+        return jsonify({'success': False, 'error': f'获取布局快照失败: {str(e)}'}), 500
+
+@app.route('/api/layout/snapshots/<int:version>/restore', methods=['POST'])
+def restore_layout_snapshot(version):
+    """回滚到指定版本的布局快照（以新版本号重新发布）"""
+    try:
+        doc = data_manager.db_manager.get_layout_snapshot(version) if data_manager.use_database else None
+        if not doc:
+            return jsonify({'success': False, 'error': f'布局快照 {version} 不存在'}), 404
+        
+        layout = doc['layout']
+        layout['timestamp'] = datetime.now().isoformat()
+        new_version = data_manager.db_manager.save_layout_snapshot(layout)
+        if new_version is None:
+            return jsonify({'success': False, 'error': '布局快照保存失败'}), 500
+        
+        layout['version'] = new_version
+        layout_cache.put(layout)
+        logger.info(f"布局快照已回滚到版本 {version}，新版本 {new_version}")
+        
+        return jsonify({
+            'success': True,
+            'message': f'已回滚到版本 {version}',
+            'restored_from': version,
+            'version': new_version
+        })
+        
+    except Exception as e:
+        logger.error(f"回滚布局快照失败: {str(e)}")
+        return jsonify({'success': False, 'error': f'回滚失败: {str(e)}'}), 500
+
+@app.route('/api/sync/status')
+def get_sync_status():
+    """获取后台同步状态"""
+    return jsonify({
+        'success': True,
+        'scheduler': sync_scheduler.status()
+    })
+
+@app.route('/api/events')
+def stream_events():
+    """
+    变更事件流（Server-Sent Events）
+    
+    布局快照每次更新推送一个 rooms 事件（事件ID为快照版本），只包含发生变化的房间；
+    客户端断线重连时按 Last-Event-ID 补发，补发记录不完整时推送 reset 事件要求全量刷新
+    
+    每个连接在整个连接期间占用一个服务线程，连接数达到 EVENTS_MAX_SUBSCRIBERS 时返回503，
+    前端随后改为轮询 /api/rooms/changes?since=<版本>，并在重连时通过 last_event_id 参数带上已持有的版本
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    
+    subscriber = change_events.subscribe(last_event_id)
+    if subscriber is None:
+        response = jsonify({'error': '事件流连接数已达上限，请稍后重试'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '60'
+        return response
+    
+    heartbeat = Config.EVENTS_HEARTBEAT
+    
+    def generate():
+        try:
+            # 断线后客户端等待5秒重连
+            yield b'retry: 5000\n\n'
+            while True:
+                try:
+                    message = subscriber.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield b': ping\n\n'
+                    continue
+                if message is None:
+                    break
+                yield message
+        finally:
+            change_events.unsubscribe(subscriber)
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # 禁止反向代理缓冲事件流
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/cache/stats')
+def get_cache_stats():
+    """获取布局快照缓存统计及各接口响应大小与耗时"""
+    return jsonify({
+        'success': True,
+        'layout_cache': layout_cache.stats(),
+        'sync_flight': sync_flight.stats(),
+        'events': change_events.stats(),
+        'search_index': search_indexes.stats(),
+        'responses': response_metrics.report()
+    })
+
 if __name__ == '__main__':
     # 启动应用
     logger.info("启动房间管理系统...")
     logger.info(f"调试模式: {Config.DEBUG}")
     logger.info(f"监听地址: {Config.HOST}:{Config.PORT}")
     
+    # 调试模式下重载器会启动两个进程，只在实际服务进程中启动后台服务
+    if not Config.DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_services()
+    
     app.run(host=Config.HOST, port=Config.PORT, debug=Config.DEBUG) 
\ No newline at end of file
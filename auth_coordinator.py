@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+认证刷新协调模块 - 进程内所有API会话共享同一份认证Cookie
+
+- 并发的401只由第一个线程执行刷新，其余线程等待后使用新Cookie重试
+- 每次更新Cookie递增代数，会话发现代数落后时重新应用Cookie，无需重建数据管理器
+"""
+
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class AuthRefreshCoordinator:
+    """认证刷新协调器"""
+
+    def __init__(self, cookies: Dict[str, str], wait_timeout: float = 30):
+        """
+        初始化协调器
+
+        Args:
+            cookies: 初始认证Cookie
+            wait_timeout: 等待其他线程刷新完成的最长时间（秒）
+        """
+        self.cookies = dict(cookies)
+        self.generation = 0
+        self.wait_timeout = wait_timeout
+        self.refreshing = False
+        self.condition = threading.Condition()
+
+        # 统计
+        self.refreshes = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    def current(self) -> Tuple[int, Dict[str, str]]:
+        """
+        获取当前认证Cookie
+
+        Returns:
+            (代数, Cookie副本)
+        """
+        with self.condition:
+            return self.generation, dict(self.cookies)
+
+    def publish(self, auth_info: Dict[str, str]) -> int:
+        """
+        发布新的认证Cookie（令牌未变化时不递增代数）
+
+        Args:
+            auth_info: 认证信息
+
+        Returns:
+            发布后的代数
+        """
+        with self.condition:
+            return self._publish_locked(auth_info)
+
+    def _publish_locked(self, auth_info: Dict[str, str]) -> int:
+        """发布新的认证Cookie（调用方持有锁）"""
+        if all(self.cookies.get(name) == value for name, value in auth_info.items()):
+            return self.generation
+        self.cookies.update(auth_info)
+        self.generation += 1
+        self.condition.notify_all()
+        logger.info(f"认证Cookie已更新，代数 {self.generation}")
+        return self.generation
+
+    def refresh(self, seen_generation: int,
+                refresh_fn: Callable[[Dict[str, str]], Optional[Dict[str, str]]]) -> Optional[int]:
+        """
+        会话遇到401时调用：Cookie已被更新则直接返回，否则由第一个调用方执行刷新，其余调用方等待结果
+
+        Args:
+            seen_generation: 会话发出请求时使用的代数
+            refresh_fn: 刷新函数，参数为当前Cookie，返回新的认证信息，无法刷新时返回None
+
+        Returns:
+            可用于重试的代数，刷新失败时返回None
+        """
+        with self.condition:
+            if self.generation > seen_generation:
+                # 会话使用的是旧Cookie，直接使用新Cookie重试
+                return self.generation
+
+            if self.refreshing:
+                self.coalesced += 1
+                self.condition.wait_for(lambda: not self.refreshing, self.wait_timeout)
+                return self.generation if self.generation > seen_generation else None
+
+            self.refreshing = True
+            cookies = dict(self.cookies)
+
+        auth_info = None
+        try:
+            auth_info = refresh_fn(cookies)
+        except Exception as e:
+            logger.error(f"刷新认证信息时发生错误: {str(e)}")
+        finally:
+            with self.condition:
+                # 先发布再唤醒等待方，等待方醒来时即可看到新代数
+                if auth_info:
+                    self._publish_locked(auth_info)
+                else:
+                    self.failures += 1
+                self.refreshing = False
+                self.refreshes += 1
+                self.condition.notify_all()
+                generation = self.generation
+
+        return generation if generation > seen_generation else None
+
+    def stats(self) -> Dict[str, Any]:
+        """获取协调统计"""
+        with self.condition:
+            return {
+                'generation': self.generation,
+                'refreshing': self.refreshing,
+                'refreshes': self.refreshes,
+                'coalesced': self.coalesced,
+                'failures': self.failures
+            }
@@ -2,18 +2,60 @@
 # -*- coding: utf-8 -*-
 """
 认证信息管理器 - 提供认证信息更新功能
+
+缓存文件在多个工作进程间共享：写入先写临时文件再原子替换，读取时按文件变化自动重新加载，
+刷新令牌通过文件锁保证同一时间只有一个进程登录
 """
 
 import json
 import logging
 import os
+import tempfile
+import threading
 import time
-from typing import Dict, Optional
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
 from datetime import datetime
 
+# 尝试导入 fcntl（文件锁，仅类Unix系统可用）
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+    logging.warning("fcntl不可用，多进程部署时认证缓存不加文件锁")
+
 logger = logging.getLogger(__name__)
 
 
+@contextmanager
+def file_lock(path: str, blocking: bool = True) -> Iterator[bool]:
+    """
+    进程间文件锁（fcntl.flock，关闭文件时自动释放）
+    
+    Args:
+        path: 锁文件路径
+        blocking: 锁被占用时是否等待
+        
+    Yields:
+        是否取得锁（非阻塞模式下锁被其他进程占用时为False）
+    """
+    if not FCNTL_AVAILABLE:
+        yield True
+        return
+    
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+    finally:
+        os.close(fd)
+
+
 class AuthManager:
     """认证信息管理器"""
     
@@ -25,18 +67,49 @@ class AuthManager:
             auth_file: 认证信息缓存文件路径
         """
         self.auth_file = auth_file
-        self.last_update_time = None
+        self.last_update_time = None  # 当前令牌的获取时间
+        self.last_validated_time = None  # 当前令牌最近一次验证有效的时间
         self.cached_auth = None
+        self.file_signature = None  # 已加载文件的 (inode, 修改时间)，用于发现其他进程的写入
+        self.lock = threading.RLock()
+        self.refresh_thread_lock = threading.Lock()
+        # 请求路径发现认证失效时设置，由后台令牌刷新器处理
+        self.refresh_requested = threading.Event()
+        self.failed_tokens = set()  # 请求刷新时已失效的令牌，当前令牌不在其中时说明已刷新过
         self.load_cached_auth()
     
+    def _file_signature(self) -> Optional[tuple]:
+        """缓存文件的 (inode, 修改时间)，文件不存在时返回None"""
+        try:
+            stat = os.stat(self.auth_file)
+            return stat.st_ino, stat.st_mtime_ns
+        except OSError:
+            return None
+    
+    def reload_if_changed(self) -> bool:
+        """
+        缓存文件被其他进程更新时重新加载
+        
+        Returns:
+            是否重新加载
+        """
+        signature = self._file_signature()
+        if signature is None or signature == self.file_signature:
+            return False
+        return self.load_cached_auth() is not None
+    
     def load_cached_auth(self) -> Optional[Dict[str, str]]:
         """加载缓存的认证信息"""
         try:
-            if os.path.exists(self.auth_file):
-                with open(self.auth_file, 'r', encoding='utf-8') as f:
+            signature = self._file_signature()
+            if signature is not None:
+                # 文件只会被整体替换，读到的一定是完整内容
+                with self.lock, open(self.auth_file, 'r', encoding='utf-8') as f:
                     data = json.load(f)
                     self.cached_auth = data.get('auth_info', {})
                     self.last_update_time = data.get('update_time')
+                    self.last_validated_time = data.get('validated_time')
+                    self.file_signature = signature
                     logger.info(f"加载缓存认证信息，更新时间: {self.last_update_time}")
                     return self.cached_auth
         except Exception as e:
@@ -55,16 +128,22 @@ class AuthManager:
             是否保存成功
         """
         try:
-            data = {
-                'auth_info': auth_info,
-                'update_time': datetime.now().isoformat()
-            }
-            
-            with open(self.auth_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            
-            self.cached_auth = auth_info
-            self.last_update_time = data['update_time']
+            with self.lock, file_lock(f"{self.auth_file}.lock"):
+                self.reload_if_changed()
+                
+                # 同一令牌重复保存时保留原获取时间，避免令牌年龄被重置
+                if self.cached_auth and self.cached_auth.get('_ams_token') == auth_info.get('_ams_token'):
+                    update_time = self.last_update_time or datetime.now().isoformat()
+                    validated_time = self.last_validated_time
+                else:
+                    update_time = datetime.now().isoformat()
+                    validated_time = None
+                
+                self._write_cache_file(auth_info, update_time, validated_time)
+                
+                self.cached_auth = auth_info
+                self.last_update_time = update_time
+                self.last_validated_time = validated_time
             logger.info("认证信息已保存到缓存文件")
             return True
             
@@ -72,10 +151,142 @@ class AuthManager:
             logger.error(f"保存认证信息失败: {str(e)}")
             return False
     
+    def _write_cache_file(self, auth_info: Dict[str, str], update_time: str, validated_time: Optional[str]):
+        """写入认证缓存文件（写临时文件后原子替换，其他进程不会读到写了一半的文件）"""
+        data = {
+            'auth_info': auth_info,
+            'update_time': update_time,
+            'validated_time': validated_time
+        }
+        
+        directory = os.path.dirname(os.path.abspath(self.auth_file))
+        fd, tmp_path = tempfile.mkstemp(prefix='.auth_cache.', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.auth_file)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        
+        self.file_signature = self._file_signature()
+    
+    def mark_validated(self, ams_token: Optional[str], checked_at: Optional[float] = None) -> bool:
+        """
+        记录令牌验证有效的时间
+        
+        Args:
+            ams_token: 通过验证的 _ams_token（与缓存中的令牌不一致时不记录）
+            checked_at: 验证时间戳，默认为当前时间
+            
+        Returns:
+            是否已记录
+        """
+        try:
+            with self.lock, file_lock(f"{self.auth_file}.lock"):
+                # 其他进程可能已写入新令牌，先重新加载，避免用旧令牌覆盖
+                self.reload_if_changed()
+                if not self.cached_auth or not ams_token or self.cached_auth.get('_ams_token') != ams_token:
+                    return False
+                
+                validated_time = datetime.fromtimestamp(checked_at or time.time()).isoformat()
+                self._write_cache_file(self.cached_auth, self.last_update_time, validated_time)
+                self.last_validated_time = validated_time
+            return True
+        except Exception as e:
+            logger.warning(f"记录认证验证时间失败: {str(e)}")
+            return False
+    
+    def get_auth_age_hours(self) -> Optional[float]:
+        """当前令牌自获取以来的小时数，获取时间未知时返回None"""
+        self.reload_if_changed()
+        if not self.last_update_time:
+            return None
+        
+        try:
+            update_time = datetime.fromisoformat(self.last_update_time)
+            return (datetime.now() - update_time).total_seconds() / 3600
+        except Exception:
+            return None
+    
+    def needs_refresh(self, max_age_hours: float, refresh_ahead_hours: float) -> bool:
+        """
+        判断是否应提前刷新令牌
+        
+        Args:
+            max_age_hours: 令牌最大有效时间（小时）
+            refresh_ahead_hours: 在过期前多少小时开始刷新
+            
+        Returns:
+            令牌年龄已进入提前刷新窗口时返回True（获取时间未知时返回False，由验证结果决定）
+        """
+        age_hours = self.get_auth_age_hours()
+        return age_hours is not None and age_hours >= max_age_hours - refresh_ahead_hours
+    
+    def request_refresh(self, failed_token: Optional[str] = None):
+        """
+        请求后台刷新令牌（立即返回，不等待登录完成）
+        
+        Args:
+            failed_token: 已失效的令牌，默认为当前令牌；刷新器处理时当前令牌已不是该令牌则不再登录
+        """
+        if failed_token is None:
+            failed_token = (self.get_auth_info() or {}).get('_ams_token')
+        with self.lock:
+            self.failed_tokens.add(failed_token)
+        self.refresh_requested.set()
+    
+    def take_refresh_request(self) -> Optional[set]:
+        """
+        取出待处理的刷新请求
+        
+        Returns:
+            请求刷新的失效令牌集合，没有请求时返回None
+        """
+        with self.lock:
+            if not self.refresh_requested.is_set():
+                return None
+            self.refresh_requested.clear()
+            failed_tokens, self.failed_tokens = self.failed_tokens, set()
+            return failed_tokens
+    
+    def get_token_status(self) -> Dict[str, Any]:
+        """获取当前令牌的生命周期信息"""
+        self.reload_if_changed()
+        token = (self.cached_auth or {}).get('_ams_token')
+        age_hours = self.get_auth_age_hours()
+        return {
+            'token': f"{token[:8]}..." if token else None,
+            'obtained_at': self.last_update_time,
+            'validated_at': self.last_validated_time,
+            'age_hours': round(age_hours, 2) if age_hours is not None else None
+        }
+    
     def get_auth_info(self) -> Optional[Dict[str, str]]:
-        """获取认证信息"""
+        """获取认证信息（其他进程更新过缓存文件时自动重新加载）"""
+        self.reload_if_changed()
         return self.cached_auth
     
+    @contextmanager
+    def refresh_lock(self) -> Iterator[bool]:
+        """
+        令牌刷新锁（进程内与进程间都只允许一个刷新者，不等待）
+        
+        Yields:
+            是否取得刷新权，为False时说明其他线程或进程正在刷新
+        """
+        if not self.refresh_thread_lock.acquire(blocking=False):
+            yield False
+            return
+        try:
+            with file_lock(f"{self.auth_file}.refresh.lock", blocking=False) as acquired:
+                yield acquired
+        finally:
+            self.refresh_thread_lock.release()
+    
     def is_auth_expired(self, max_age_hours: int = 24) -> bool:
         """
         检查认证信息是否过期
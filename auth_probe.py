@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+认证探测模块 - 缓存轻量认证探测结果，在缓存窗口内不重复请求上游
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AuthProbe:
+    """带缓存窗口的认证探测器"""
+
+    def __init__(self, probe: Callable[[], Dict[str, Any]], ttl: float):
+        """
+        初始化认证探测器
+
+        Args:
+            probe: 探测函数，返回包含 valid（True/False/None）的结果字典
+            ttl: 探测结果缓存时间（秒）
+        """
+        self.probe = probe
+        self.ttl = ttl
+        self.result: Optional[Dict[str, Any]] = None
+        self.lock = threading.Lock()
+        self.probe_lock = threading.Lock()
+
+        # 统计
+        self.probes = 0
+        self.cache_hits = 0
+
+    def _is_fresh(self, result: Optional[Dict[str, Any]]) -> bool:
+        """判断缓存结果是否仍在有效期内"""
+        return result is not None and time.time() - result['checked_at'] < self.ttl
+
+    def check(self, force: bool = False) -> Dict[str, Any]:
+        """
+        获取认证状态，缓存过期时发起一次探测（并发调用只探测一次）
+
+        Args:
+            force: 是否忽略缓存强制探测
+
+        Returns:
+            探测结果
+        """
+        with self.lock:
+            result = self.result
+            if not force and self._is_fresh(result):
+                self.cache_hits += 1
+                return result
+
+        with self.probe_lock:
+            # 等待期间其他线程可能已完成探测
+            with self.lock:
+                result = self.result
+                if not force and self._is_fresh(result):
+                    self.cache_hits += 1
+                    return result
+
+            result = self.probe()
+            with self.lock:
+                self.result = result
+                self.probes += 1
+
+        logger.info(f"认证探测完成: valid={result.get('valid')}, 状态码={result.get('status_code')}")
+        return result
+
+    def last_result(self) -> Optional[Dict[str, Any]]:
+        """返回最近一次探测结果，不发起探测"""
+        with self.lock:
+            return self.result
+
+    def invalidate(self):
+        """清除缓存结果（认证信息更新后调用）"""
+        with self.lock:
+            self.result = None
+
+    @staticmethod
+    def auth_status(result: Optional[Dict[str, Any]]) -> str:
+        """探测结果转换为认证状态字符串: valid / invalid / unknown"""
+        if not result or result.get('valid') is None:
+            return 'unknown'
+        return 'valid' if result['valid'] else 'invalid'
+
+    def stats(self) -> Dict[str, Any]:
+        """获取探测统计信息"""
+        with self.lock:
+            result = self.result
+            return {
+                'auth_status': self.auth_status(result),
+                'checked_at': datetime.fromtimestamp(result['checked_at']).isoformat() if result else None,
+                'status_code': result.get('status_code') if result else None,
+                'message': result.get('message') if result else None,
+                'ttl': self.ttl,
+                'probes': self.probes,
+                'cache_hits': self.cache_hits
+            }
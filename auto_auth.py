@@ -2,14 +2,18 @@
 # -*- coding: utf-8 -*-
 """
 自动认证模块 - 自动登录并获取最新认证信息
+
+浏览器按需启动并在多次登录之间复用，登录完成以认证Cookie就绪为准，不做固定等待
 """
 
 import requests
 import json
 import logging
+import queue
+import threading
 import time
 import re
-from typing import Dict, Optional
+from typing import Any, Dict, Optional
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -17,56 +21,289 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from selenium.common.exceptions import TimeoutException, WebDriverException
+from config import Config
 
 logger = logging.getLogger(__name__)
 
+# 需要从浏览器中提取的认证Cookie
+AUTH_COOKIE_NAMES = ('_ams_token', '_common_token', 'HWWAFSESID', 'HWWAFSESTIME')
+# 登录完成的标志：这些Cookie全部写入后即可提取
+REQUIRED_COOKIE_NAMES = ('_ams_token', '_common_token')
+
+
+def create_driver() -> Optional[webdriver.Chrome]:
+    """
+    启动无头Chrome
+
+    Returns:
+        浏览器驱动，失败时返回None
+    """
+    try:
+        chrome_options = Options()
+        chrome_options.add_argument('--headless')  # 无头模式
+        chrome_options.add_argument('--no-sandbox')
+        chrome_options.add_argument('--disable-dev-shm-usage')
+        chrome_options.add_argument('--disable-gpu')
+        chrome_options.add_argument('--window-size=1920,1080')
+        chrome_options.add_argument('--blink-settings=imagesEnabled=false')  # 登录不需要加载图片
+        chrome_options.add_argument('--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36')
+        # DOM就绪即开始操作，不等待全部静态资源加载完成
+        chrome_options.page_load_strategy = 'eager'
+
+        # 尝试使用系统Chrome驱动
+        try:
+            return webdriver.Chrome(options=chrome_options)
+        except WebDriverException:
+            logger.warning("系统Chrome驱动不可用，尝试使用ChromeDriverManager")
+            # 如果系统驱动不可用，尝试使用webdriver-manager
+            try:
+                from webdriver_manager.chrome import ChromeDriverManager
+                service = Service(ChromeDriverManager().install())
+                return webdriver.Chrome(service=service, options=chrome_options)
+            except Exception as e:
+                logger.error(f"无法设置Chrome驱动: {str(e)}")
+                return None
+
+    except Exception as e:
+        logger.error(f"设置驱动失败: {str(e)}")
+        return None
+
+
+class BrowserPool:
+    """
+    无头浏览器池 - 按需启动，登录之间复用，超过使用次数后重建
+
+    空闲超过 idle_timeout 的浏览器由后台线程主动关闭，不在空闲期间常驻内存；
+    令牌定时刷新的间隔远大于空闲时间，定时登录通常需要冷启动浏览器，复用主要覆盖短时间内的连续登录
+    """
+
+    def __init__(self, size: int = 1, max_uses: int = 20, idle_timeout: float = 3600):
+        """
+        初始化浏览器池
+
+        Args:
+            size: 最多同时存在的浏览器数量
+            max_uses: 单个浏览器最多使用次数
+            idle_timeout: 空闲超过该时间（秒）的浏览器由后台线程关闭
+        """
+        self.size = max(1, size)
+        self.max_uses = max_uses
+        self.idle_timeout = idle_timeout
+        self.idle = queue.LifoQueue()  # (driver, 已使用次数, 归还时间)
+        self.uses: Dict[Any, int] = {}  # 所有存活浏览器 -> 已使用次数
+        self.launching = 0  # 正在启动的浏览器数（启动期间占用名额）
+        self.lock = threading.Lock()
+        self.reaper: Optional[threading.Thread] = None
+        self.reaper_stop = threading.Event()
+
+        # 统计
+        self.launches = 0
+        self.reuses = 0
+        self.discards = 0
+        self.reaped = 0
+
+    def acquire(self, timeout: float = 60) -> Optional[webdriver.Chrome]:
+        """
+        取得一个可用的浏览器（优先复用空闲浏览器，池未满时启动新浏览器）
+
+        Args:
+            timeout: 池已满时等待其他使用者归还的时间（秒）
+
+        Returns:
+            浏览器驱动，失败时返回None
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                driver, uses, released_at = self.idle.get_nowait()
+            except queue.Empty:
+                with self.lock:
+                    can_launch = len(self.uses) + self.launching < self.size
+                    if can_launch:
+                        self.launching += 1
+                if can_launch:
+                    return self._launch()
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.error("等待可用浏览器超时")
+                    return None
+                try:
+                    driver, uses, released_at = self.idle.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+
+            if uses >= self.max_uses or time.time() - released_at > self.idle_timeout or not self._is_alive(driver):
+                self._quit(driver)
+                continue
+
+            with self.lock:
+                self.reuses += 1
+            return driver
+
+    def _launch(self) -> Optional[webdriver.Chrome]:
+        """启动新浏览器（调用前已预占名额）"""
+        driver = create_driver()
+        with self.lock:
+            self.launching -= 1
+            if driver is not None:
+                self.uses[driver] = 0
+                self.launches += 1
+        if driver is not None:
+            logger.info("已启动新的无头浏览器")
+        return driver
+
+    @staticmethod
+    def _is_alive(driver: webdriver.Chrome) -> bool:
+        """检查浏览器会话是否仍然可用"""
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def release(self, driver: webdriver.Chrome, reusable: bool = True):
+        """
+        归还浏览器
+
+        Args:
+            driver: 浏览器驱动
+            reusable: 是否可以继续复用（出错的浏览器直接关闭）
+        """
+        with self.lock:
+            uses = self.uses.get(driver, 0) + 1
+            if driver in self.uses:
+                self.uses[driver] = uses
+
+        if reusable:
+            self.idle.put((driver, uses, time.time()))
+            self._start_reaper()
+        else:
+            self._quit(driver)
+
+    def _start_reaper(self):
+        """启动关闭过期空闲浏览器的后台线程（重复调用无副作用）"""
+        with self.lock:
+            if self.reaper and self.reaper.is_alive():
+                return
+            self.reaper_stop.clear()
+            self.reaper = threading.Thread(target=self._reap_loop, name='browser-reaper', daemon=True)
+            self.reaper.start()
+
+    def _reap_loop(self):
+        """定期关闭空闲过久的浏览器"""
+        interval = max(1, min(60, self.idle_timeout))
+        while not self.reaper_stop.wait(interval):
+            try:
+                self.reap()
+            except Exception as e:
+                logger.error(f"清理空闲浏览器失败: {str(e)}")
+
+    def reap(self) -> int:
+        """
+        关闭空闲超过 idle_timeout 的浏览器
+
+        Returns:
+            关闭的浏览器数量
+        """
+        keep = []
+        expired = []
+        now = time.time()
+        while True:
+            try:
+                item = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            (expired if now - item[2] > self.idle_timeout else keep).append(item)
+
+        # 按原顺序放回，保持最近归还的浏览器优先复用
+        for item in reversed(keep):
+            self.idle.put(item)
+
+        for driver, _, _ in expired:
+            self._quit(driver)
+        if expired:
+            with self.lock:
+                self.reaped += len(expired)
+            logger.info(f"已关闭 {len(expired)} 个空闲超过 {self.idle_timeout} 秒的浏览器")
+        return len(expired)
+
+    def _quit(self, driver: webdriver.Chrome):
+        """关闭浏览器并释放名额"""
+        with self.lock:
+            self.uses.pop(driver, None)
+            self.discards += 1
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning(f"关闭浏览器失败: {str(e)}")
+
+    def close(self):
+        """关闭所有空闲浏览器并停止后台清理线程"""
+        self.reaper_stop.set()
+        while True:
+            try:
+                driver, _, _ = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            self._quit(driver)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取浏览器池统计"""
+        with self.lock:
+            return {
+                'size': self.size,
+                'alive': len(self.uses),
+                'idle': self.idle.qsize(),
+                'launches': self.launches,
+                'reuses': self.reuses,
+                'discards': self.discards,
+                'reaped': self.reaped,
+                'idle_timeout': self.idle_timeout
+            }
+
 
 class AutoAuthenticator:
     """自动认证器 - 自动登录并获取认证信息"""
     
-    def __init__(self, username: str = "18871627553", password: str = "zywl1212"):
+    def __init__(self, username: str = "18871627553", password: str = "zywl1212",
+                 pool: Optional[BrowserPool] = None):
         """
         初始化自动认证器
         
         Args:
             username: 登录用户名
             password: 登录密码
+            pool: 浏览器池，默认使用全局浏览器池
         """
         self.username = username
         self.password = password
         self.login_url = "https://platform.inzhiyu.com/"
-        self.driver = None
+        self.pool = pool or browser_pool
+        self.timeout = Config.AUTO_AUTH_LOGIN_TIMEOUT
         
-    def setup_driver(self) -> bool:
-        """设置Chrome驱动"""
-        try:
-            chrome_options = Options()
-            chrome_options.add_argument('--headless')  # 无头模式
-            chrome_options.add_argument('--no-sandbox')
-            chrome_options.add_argument('--disable-dev-shm-usage')
-            chrome_options.add_argument('--disable-gpu')
-            chrome_options.add_argument('--window-size=1920,1080')
-            chrome_options.add_argument('--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36')
-            
-            # 尝试使用系统Chrome驱动
-            try:
-                self.driver = webdriver.Chrome(options=chrome_options)
-                return True
-            except WebDriverException:
-                logger.warning("系统Chrome驱动不可用，尝试使用ChromeDriverManager")
-                # 如果系统驱动不可用，尝试使用webdriver-manager
-                try:
-                    from webdriver_manager.chrome import ChromeDriverManager
-                    service = Service(ChromeDriverManager().install())
-                    self.driver = webdriver.Chrome(service=service, options=chrome_options)
-                    return True
-                except Exception as e:
-                    logger.error(f"无法设置Chrome驱动: {str(e)}")
-                    return False
-                    
-        except Exception as e:
-            logger.error(f"设置驱动失败: {str(e)}")
-            return False
+        # 各阶段耗时（秒）
+        self.last_timings: Dict[str, float] = {}
+        self.logins = 0
+        self.failures = 0
+    
+    @staticmethod
+    def _auth_cookies(driver) -> Optional[Dict[str, str]]:
+        """读取认证Cookie，必需的Cookie尚未全部写入时返回None"""
+        auth_info = {
+            cookie['name']: cookie['value']
+            for cookie in driver.get_cookies()
+            if cookie['name'] in AUTH_COOKIE_NAMES
+        }
+        if all(auth_info.get(name) for name in REQUIRED_COOKIE_NAMES):
+            return auth_info
+        return None
+    
+    @staticmethod
+    def _reset_browser(driver):
+        """清除本次登录留下的Cookie和本地存储，供下次登录复用"""
+        driver.delete_all_cookies()
+        driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
     
     def login_and_get_auth(self) -> Optional[Dict[str, str]]:
         """
@@ -75,23 +312,37 @@ class AutoAuthenticator:
         Returns:
             包含认证信息的字典，失败时返回None
         """
-        if not self.setup_driver():
+        timings = {}
+        phase_started = time.perf_counter()
+        
+        def end_phase(name):
+            nonlocal phase_started
+            now = time.perf_counter()
+            timings[name] = round(now - phase_started, 3)
+            phase_started = now
+        
+        driver = self.pool.acquire()
+        end_phase('browser')
+        if driver is None:
             logger.error("无法设置浏览器驱动")
+            self.failures += 1
             return None
-            
+        
+        reusable = False
         try:
             logger.info("开始自动登录...")
             
             # 访问登录页面
-            self.driver.get(self.login_url)
+            driver.get(self.login_url)
             
             # 等待页面加载
-            wait = WebDriverWait(self.driver, 10)
+            wait = WebDriverWait(driver, self.timeout, poll_frequency=0.1)
             
             # 等待用户名输入框
             username_input = wait.until(
                 EC.presence_of_element_located((By.XPATH, "//input[@placeholder='请输入注册邮箱或手机号']"))
             )
+            end_phase('page_load')
             
             # 输入用户名
             username_input.clear()
@@ -111,42 +362,41 @@ class AutoAuthenticator:
                 EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), '登录')]"))
             )
             login_button.click()
+            end_phase('submit')
             
-            # 等待登录完成（URL变化）
-            wait.until(lambda driver: "login" not in driver.current_url)
-            
-            # 等待一段时间确保认证信息加载完成
-            time.sleep(3)
-            
-            # 获取cookies
-            cookies = self.driver.get_cookies()
+            # 登录表单消失表示登录已提交成功，再等待认证Cookie写入（替代固定等待）
+            wait.until(EC.invisibility_of_element_located((By.XPATH, "//input[@placeholder='请输入密码或首次邀请码']")))
+            auth_info = wait.until(self._auth_cookies)
+            end_phase('cookies')
             
-            # 提取认证信息
-            auth_info = {}
-            for cookie in cookies:
-                name = cookie['name']
-                value = cookie['value']
-                
-                if name in ['_ams_token', '_common_token', 'HWWAFSESID', 'HWWAFSESTIME']:
-                    auth_info[name] = value
-            
-            # 检查是否获取到必要的认证信息
-            if '_ams_token' in auth_info and '_common_token' in auth_info:
-                logger.info("成功获取认证信息")
-                return auth_info
-            else:
-                logger.error("未能获取到完整的认证信息")
-                return None
+            logger.info("成功获取认证信息")
+            reusable = True
+            return auth_info
                 
         except TimeoutException:
             logger.error("登录超时")
+            # 页面仍可用时可继续复用
+            reusable = True
             return None
         except Exception as e:
             logger.error(f"登录过程中发生错误: {str(e)}")
             return None
         finally:
-            if self.driver:
-                self.driver.quit()
+            if reusable:
+                try:
+                    self._reset_browser(driver)
+                except Exception as e:
+                    logger.warning(f"清理浏览器状态失败，将重建浏览器: {str(e)}")
+                    reusable = False
+            self.pool.release(driver, reusable)
+            end_phase('cleanup')
+            
+            self.last_timings = timings
+            if 'cookies' in timings:
+                self.logins += 1
+            else:
+                self.failures += 1
+            logger.info(f"自动登录各阶段耗时: {timings}")
     
     def test_auth_info(self, auth_info: Dict[str, str]) -> bool:
         """
@@ -198,6 +448,17 @@ class AutoAuthenticator:
             return False
 
 
+# 全局浏览器池（进程内所有自动登录共享）
+browser_pool = BrowserPool(
+    size=Config.AUTO_AUTH_BROWSER_POOL_SIZE,
+    max_uses=Config.AUTO_AUTH_BROWSER_MAX_USES,
+    idle_timeout=Config.AUTO_AUTH_BROWSER_IDLE_TIMEOUT
+)
+
+# 全局自动认证器实例
+authenticator = AutoAuthenticator()
+
+
 def get_fresh_auth_info() -> Optional[Dict[str, str]]:
     """
     获取最新的认证信息
@@ -206,40 +467,20 @@ def get_fresh_auth_info() -> Optional[Dict[str, str]]:
         认证信息字典，失败时返回None
     """
     try:
-        # 首先检查是否有可用的Chrome驱动
-        try:
-            from selenium.webdriver.chrome.service import Service
-            from selenium.webdriver.chrome.options import Options
-            from selenium import webdriver
-            
-            # 测试Chrome驱动是否可用
-            chrome_options = Options()
-            chrome_options.add_argument('--headless')
-            chrome_options.add_argument('--no-sandbox')
-            chrome_options.add_argument('--disable-dev-shm-usage')
-            
-            # 快速测试
-            test_driver = webdriver.Chrome(options=chrome_options)
-            test_driver.quit()
-            
-            # 如果测试成功，继续使用自动认证
-            logger.info("Chrome驱动可用，开始自动认证...")
-            
-        except Exception as e:
-            logger.warning(f"Chrome驱动不可用: {str(e)}")
-            logger.info("自动认证功能暂时不可用，请手动更新认证信息")
-            return None
-        
-        # 创建认证器实例
-        authenticator = AutoAuthenticator()
+        started = time.perf_counter()
         
-        # 尝试自动登录获取认证信息
+        # 尝试自动登录获取认证信息（浏览器按需启动，登录之间复用）
         auth_info = authenticator.login_and_get_auth()
         
         if auth_info:
             # 测试认证信息是否有效
-            if authenticator.test_auth_info(auth_info):
-                logger.info("自动认证成功")
+            validate_started = time.perf_counter()
+            valid = authenticator.test_auth_info(auth_info)
+            authenticator.last_timings['validate'] = round(time.perf_counter() - validate_started, 3)
+            authenticator.last_timings['total'] = round(time.perf_counter() - started, 3)
+            
+            if valid:
+                logger.info(f"自动认证成功，总耗时 {authenticator.last_timings['total']} 秒")
                 return auth_info
             else:
                 logger.error("获取的认证信息无效")
@@ -253,6 +494,16 @@ def get_fresh_auth_info() -> Optional[Dict[str, str]]:
         return None
 
 
+def login_stats() -> Dict[str, Any]:
+    """获取自动登录统计（浏览器池与最近一次登录各阶段耗时）"""
+    return {
+        'logins': authenticator.logins,
+        'failures': authenticator.failures,
+        'last_timings': authenticator.last_timings,
+        'browser_pool': browser_pool.stats()
+    }
+
+
 if __name__ == "__main__":
     # 测试自动认证
     logging.basicConfig(level=logging.INFO)
@@ -262,4 +513,6 @@ if __name__ == "__main__":
         print("成功获取认证信息:")
         print(json.dumps(auth_info, indent=2))
     else:
-        print("获取认证信息失败") 
\ No newline at end of file
+        print("获取认证信息失败")
+    print(json.dumps(login_stats(), indent=2, ensure_ascii=False))
+    browser_pool.close() 
\ No newline at end of file
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+紧凑布局基准测试 - 对比房间字典列表与紧凑布局的内存占用、构建耗时和入住统计耗时
+
+内存按快照实际持有的对象统计（从房间列表/紧凑布局可达的全部对象，与上一版共享的记录、
+骨架中的共享空房间记录同样计入）；另列出构建新版本时新增的分配，二者不可混用
+
+用法:
+    python3 benchmarks/bench_compact_layout.py [楼栋数]
+"""
+
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_layout_skeleton import build_spec
+from compact_layout import CompactLayout
+from layout_spec import LayoutSkeleton
+
+TAGS = ['未分类', '研一', '研二', '博士', '教师']
+
+
+def build_rooms(skeleton: LayoutSkeleton, occupancy: float = 0.6, shared_vacant: bool = False):
+    """
+    按同步流程的数据格式生成布局房间列表
+
+    每次调用生成全新的字典和字符串（''.join 复制字符串，模拟从接口或数据库反序列化得到的独立对象）；
+    shared_vacant 为True时空房间直接引用骨架中的共享字典（与 LayoutSkeleton.build_rooms 相同）
+    """
+    random.seed(0)
+    rooms = []
+    student_id = 100000
+    for position, slot in enumerate(skeleton.slots):
+        if random.random() >= occupancy:
+            if shared_vacant:
+                rooms.append(skeleton.vacant_rooms[position])
+            else:
+                # 空房间按每次从数据库读取快照的情况生成独立字典
+                rooms.append(dict(skeleton.vacant_rooms[position], house_id=f"empty_{position}"))
+            continue
+
+        tenants = []
+        for index in range(random.choice([1, 1, 2])):
+            student_id += 1
+            tenants.append({
+                'id': str(student_id),
+                'guests_id': str(student_id),
+                'student_id': str(student_id),
+                'tenant_name': f"张{student_id}",
+                'mobile': f"138{student_id:08d}",
+                'is_main': 1 if index == 0 else 0,
+                'certificate_num': f"4201{student_id:014d}",
+                'emergency_contact': '李四',
+                'emergency_mobile': '13900000000',
+                'sign_status': 1,
+                'occupancy_flag': 1,
+                'tag': ''.join(random.choice(TAGS))
+            })
+        rooms.append({
+            'house_id': str(50000 + position),
+            'house_name': ''.join(slot.house_name),
+            'building': slot.building,
+            'unit': slot.unit,
+            'floor': slot.floor,
+            'room_in_floor': slot.room_in_floor,
+            'room_number': ''.join(slot.room_number),
+            'tenants': tenants,
+            'main_tenant': tenants[0],
+            'co_tenants': tenants[1:],
+            'is_vacant': False
+        })
+    return rooms
+
+
+def measure_memory(factory):
+    """返回 factory 生成对象占用的内存（字节）及对象本身"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = factory()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, value
+
+
+def retained_bytes(value):
+    """
+    统计从 value 可达的全部对象占用（同一对象只计一次，不含类型和模块）
+
+    Returns:
+        (总字节数, 其中字符串对象的字节数)
+    """
+    seen = set()
+    stack = [value]
+    total = strings = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, (type, type(sys))):
+            continue
+        seen.add(id(item))
+        size = sys.getsizeof(item)
+        total += size
+        if isinstance(item, str):
+            strings += size
+        stack.extend(gc.get_referents(item))
+    return total, strings
+
+
+def measure_build(rooms, repeat: int = 5, **kwargs) -> float:
+    """返回由已生成的房间字典构建紧凑布局的平均耗时（毫秒）"""
+    return measure(lambda: CompactLayout(rooms, **kwargs), repeat) / 1000
+
+
+def measure(func, repeat: int) -> float:
+    """返回平均耗时（微秒）"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    buildings = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    skeleton = LayoutSkeleton(build_spec(buildings))
+
+    rooms = build_rooms(skeleton)
+    shared_rooms = build_rooms(skeleton, shared_vacant=True)
+    layout = CompactLayout(build_rooms(skeleton))
+    # 同步流程中空房间是骨架的共享字典，直接使用骨架编译时构建的记录
+    shared_layout = CompactLayout(shared_rooms, None, skeleton.vacant_records)
+    # 下一版本：数据未变化的房间复用上一版记录
+    reused_layout = CompactLayout(build_rooms(skeleton, shared_vacant=True), shared_layout, skeleton.vacant_records)
+
+    assert layout.to_dicts() == rooms
+    assert reused_layout.to_dicts() == shared_rooms
+    assert layout.occupied_count == sum(1 for room in rooms if room.get('tenants'))
+
+    total = len(rooms)
+    print(f"{total} 间房，已入住 {layout.occupied_count} 间，租户 {layout.tenant_count} 人")
+    print(f"\n快照实际持有的内存（可达对象合计）")
+    print(f"{'表示方式':<20} {'总内存(KB)':>12} {'每间(字节)':>12} {'其中字符串(字节)':>18} {'其余结构(字节)':>16}")
+    dict_bytes, _ = retained_bytes(rooms)
+    for name, value in [('房间字典列表', rooms), ('房间字典(共享空房间)', shared_rooms), ('紧凑布局', layout),
+                        ('紧凑布局(共享空房间)', shared_layout), ('紧凑布局(复用上一版)', reused_layout)]:
+        size, strings = retained_bytes(value)
+        print(f"{name:<20} {size / 1024:>12.1f} {size / total:>12.0f} {strings / total:>18.0f} {(size - strings) / total:>16.0f}")
+    live_bytes, _ = retained_bytes(reused_layout)
+    print(f"持有内存: 紧凑布局为房间字典列表的 1/{dict_bytes / live_bytes:.1f}")
+
+    # 构建新版本时新增的分配（生成的房间字典在构建完成后即释放）；复用的记录不再分配，但仍由新快照持有
+    print(f"\n构建新版本新增的分配")
+    fresh_bytes, _ = measure_memory(lambda: CompactLayout(build_rooms(skeleton)))
+    reused_bytes, _ = measure_memory(
+        lambda: CompactLayout(build_rooms(skeleton, shared_vacant=True), shared_layout, skeleton.vacant_records))
+    print(f"全新构建 {fresh_bytes / total:.0f} 字节/间，复用上一版并共享空房间 {reused_bytes / total:.0f} 字节/间")
+
+    # 复用时先与旧记录比较，相同的房间不再构建新记录
+    fresh_ms = measure_build(rooms)
+    reused_ms = measure_build(rooms, previous=layout)
+    shared_ms = measure_build(shared_rooms, previous=shared_layout, shared=skeleton.vacant_records)
+    print(f"构建耗时: 全新 {fresh_ms:.1f} ms，复用上一版 {reused_ms:.1f} ms，共享空房间并复用上一版 {shared_ms:.1f} ms")
+
+    repeat = 200
+    dict_us = measure(lambda: sum(1 for room in rooms if room.get('tenants')), repeat)
+    compact_us = measure(lambda: layout.occupied_count, repeat)
+    print(f"\n入住统计: 遍历字典 {dict_us:.1f} µs，紧凑布局 {compact_us:.3f} µs")
+
+
+if __name__ == '__main__':
+    main()
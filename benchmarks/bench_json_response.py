@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+响应序列化基准测试 - 对比 convert_objectid + jsonify 与按快照版本缓存的预序列化响应
+
+用法:
+    python3 benchmarks/bench_json_response.py [房间数] [重复次数]
+"""
+
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from flask import Flask, jsonify
+
+from layout_cache import LayoutSnapshot
+from response_cache import ORJSON_AVAILABLE, convert_objectid, dumps, snapshot_json
+
+
+def build_layout(room_count: int) -> dict:
+    """生成合成布局数据：约六成房间入住，每间1-2人"""
+    random.seed(0)
+    rooms = []
+    for index in range(room_count):
+        floor = index // 12 + 1
+        room_in_floor = index % 12 + 1
+        room_number = f"{floor}{room_in_floor:02d}"
+        tenants = []
+        if random.random() < 0.6:
+            for offset in range(random.choice([1, 2])):
+                student_id = str(100000 + index * 2 + offset)
+                tenants.append({
+                    'id': student_id,
+                    'guests_id': student_id,
+                    'student_id': student_id,
+                    'tenant_name': f"学生{student_id}",
+                    'mobile': f"138{student_id}",
+                    'is_main': 1 if offset == 0 else 0,
+                    'certificate_num': f"420100{student_id}0000",
+                    'emergency_contact': '联系人',
+                    'emergency_mobile': '13900000000',
+                    'sign_status': 1,
+                    'occupancy_flag': 1,
+                    'tag': '未分类'
+                })
+        rooms.append({
+            'house_id': ObjectId() if tenants else f"empty_{floor}_{room_in_floor}",
+            'house_name': f"之寓·未来-A4栋-1单元-{room_number}",
+            'building': 4,
+            'unit': 1,
+            'floor': floor,
+            'room_in_floor': room_in_floor,
+            'room_number': room_number,
+            'tenants': tenants,
+            'main_tenant': tenants[0] if tenants else None,
+            'co_tenants': tenants[1:]
+        })
+    return {'rooms': rooms, 'timestamp': datetime.now().isoformat(), 'version': 1}
+
+
+def build_payload(snapshot) -> dict:
+    """与 /api/rooms/with-tags 相同的响应结构"""
+    floors = {}
+    for room in snapshot.data['rooms']:
+        floors.setdefault(room['floor'], []).append(room)
+    return {
+        'success': True,
+        'floors': floors,
+        'floor_numbers': sorted(floors.keys()),
+        'timestamp': snapshot.data['timestamp'],
+        'version': snapshot.version
+    }
+
+
+def measure(name: str, func, repeat: int, size: int):
+    """运行并输出平均耗时"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"{name:<32} {elapsed * 1000:>9.3f} ms/次  响应 {size / 1024:>8.1f} KB")
+
+
+def main():
+    room_count = int(sys.argv[1]) if len(sys.argv) > 1 else 238
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    layout = build_layout(room_count)
+    snapshot = LayoutSnapshot(layout, 1)
+    app = Flask(__name__)
+
+    print(f"房间数 {room_count}，重复 {repeat} 次，orjson {'可用' if ORJSON_AVAILABLE else '不可用'}")
+
+    with app.app_context():
+        legacy_size = len(jsonify(convert_objectid(build_payload(snapshot))).get_data())
+        measure('convert_objectid + jsonify',
+                lambda: jsonify(convert_objectid(build_payload(snapshot))).get_data(),
+                repeat, legacy_size)
+
+    fast_size = len(dumps(build_payload(snapshot)))
+    measure('dumps（每次序列化）', lambda: dumps(build_payload(snapshot)), repeat, fast_size)
+
+    snapshot_json(snapshot, 'with_tags', build_payload)
+    measure('snapshot_json（按版本缓存）', lambda: snapshot_json(snapshot, 'with_tags', build_payload), repeat, fast_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+布局骨架基准测试 - 对比每次重建全部空房间的旧实现与覆盖到共享骨架的新实现
+
+固定已入住房间数、增加楼栋规模（空房间数）时，新实现的耗时应基本不变
+
+用法:
+    python3 benchmarks/bench_layout_skeleton.py [已入住房间数] [重复次数]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from layout_spec import LayoutSkeleton
+
+
+def build_spec(buildings: int):
+    """生成合成布局定义：每栋 20 层，1楼10间，2-20楼每层12间"""
+    return {
+        'buildings': [
+            {
+                'building': f"A{number}",
+                'units': [{
+                    'unit': 1,
+                    'floors': [
+                        {'floors': '1', 'rooms': '1-10', 'gaps': {6: 2}},
+                        {'floors': '2-20', 'rooms': '1-12'}
+                    ]
+                }]
+            }
+            for number in range(1, buildings + 1)
+        ]
+    }
+
+
+def build_occupied(skeleton: LayoutSkeleton, count: int):
+    """随机挑选 count 个房间作为已入住房间"""
+    random.seed(0)
+    rooms = []
+    for slot in random.sample(skeleton.slots, min(count, len(skeleton.slots))):
+        rooms.append({
+            'house_id': f"house_{slot.building}_{slot.room_number}",
+            'house_name': slot.house_name,
+            'building': slot.building,
+            'unit': slot.unit,
+            'floor': slot.floor,
+            'room_in_floor': slot.room_in_floor,
+            'room_number': slot.room_number,
+            'tenants': [{'student_id': '1', 'tenant_name': '张三'}]
+        })
+    return rooms
+
+
+def legacy_build(skeleton: LayoutSkeleton, occupied_rooms):
+    """改造前的实现：字符串键映射，逐个新建空房间，最后整体排序"""
+    occupied_rooms_map = {}
+    for room in occupied_rooms:
+        occupied_rooms_map[f"{room['building']}-{room['floor']}-{room['room_number']}"] = room
+
+    all_rooms = []
+    for slot in skeleton.slots:
+        room_key = f"{slot.building}-{slot.floor}-{slot.room_number}"
+        if room_key in occupied_rooms_map:
+            all_rooms.append(occupied_rooms_map[room_key])
+        else:
+            all_rooms.append(skeleton.create_empty_room(slot))
+
+    all_rooms.sort(key=lambda x: (x['building'], x['floor'], x['room_in_floor']))
+    occupied_count = sum(1 for room in all_rooms if room.get('tenants'))
+    return all_rooms, occupied_count
+
+
+def measure(func, repeat: int) -> float:
+    """返回平均耗时（微秒）"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    occupied = int(sys.argv[1]) if len(sys.argv) > 1 else 150
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    print(f"已入住房间固定为 {occupied} 间")
+    print(f"{'楼栋数':>6} {'总房间':>8} {'空房间':>8} {'旧实现(µs)':>12} {'骨架覆盖(µs)':>14} {'其中列表复制(µs)':>18}")
+    for buildings in (1, 10, 100, 400):
+        skeleton = LayoutSkeleton(build_spec(buildings))
+        rooms = build_occupied(skeleton, occupied)
+        assert legacy_build(skeleton, rooms)[1] == skeleton.build_rooms(rooms)[1]
+
+        legacy_us = measure(lambda: legacy_build(skeleton, rooms), max(1, repeat // buildings))
+        overlay_us = measure(lambda: skeleton.build_rooms(rooms), repeat)
+        copy_us = measure(lambda: list(skeleton.vacant_rooms), repeat)
+        total = len(skeleton.slots)
+        print(f"{buildings:>6} {total:>8} {total - len(rooms):>8} {legacy_us:>12.1f} {overlay_us:>14.1f} {copy_us:>18.1f}")
+
+    skeleton = LayoutSkeleton(build_spec(1))
+    print(f"\n单栋 {len(skeleton.slots)} 间房，已入住房间数变化时:")
+    print(f"{'已入住':>6} {'旧实现(µs)':>12} {'骨架覆盖(µs)':>14}")
+    for count in (0, 50, 150, 238):
+        rooms = build_occupied(skeleton, count)
+        legacy_us = measure(lambda: legacy_build(skeleton, rooms), repeat)
+        overlay_us = measure(lambda: skeleton.build_rooms(rooms), repeat)
+        print(f"{count:>6} {legacy_us:>12.1f} {overlay_us:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+学生数据保存基准测试 - 对比逐个 find_one 与 $setOnInsert 单次 bulk_write 的数据库往返次数
+
+需要可连接的MongoDB（连接信息同 Config.MONGODB），测试使用独立数据库
+（BENCH_MONGODB_DATABASE，默认 room_management_bench），结束后删除。
+
+用法:
+    python3 benchmarks/bench_save_students.py [学生数]
+"""
+
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 始终使用独立的基准测试数据库，避免误删业务数据
+os.environ['MONGODB_DATABASE'] = os.getenv('BENCH_MONGODB_DATABASE', 'room_management_bench')
+
+from pymongo import UpdateOne, monitoring
+from pymongo.errors import PyMongoError
+
+
+class CommandCounter(monitoring.CommandListener):
+    """统计发送到MongoDB的命令（每条命令即一次网络往返）"""
+
+    def __init__(self):
+        self.commands = Counter()
+
+    def started(self, event):
+        self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reset(self):
+        self.commands.clear()
+
+    def total(self) -> int:
+        return sum(self.commands.values())
+
+
+# 必须在创建 MongoClient（导入 database_manager）之前注册
+counter = CommandCounter()
+monitoring.register(counter)
+
+try:
+    from database_manager import db_manager  # noqa: E402
+except PyMongoError as e:
+    sys.exit(f"无法连接MongoDB（MONGODB_HOST / MONGODB_PORT），请先启动 mongod: {e}")
+
+
+def build_rooms(student_count: int) -> List[Dict]:
+    """生成合成数据：每间房2人"""
+    rooms = []
+    for index in range(0, student_count, 2):
+        room_number = f"{index // 2 + 101}"
+        tenants = []
+        for offset in range(min(2, student_count - index)):
+            student_id = 100000 + index + offset
+            tenants.append({
+                'student_id': student_id,
+                'name': f"学生{student_id}",
+                'mobile': f"138{student_id:08d}",
+                'is_main': 1 if offset == 0 else 0,
+                'check_in_date': datetime.now().isoformat()
+            })
+        rooms.append({'room_number': room_number, 'building': 4, 'floor': 1, 'tenants': tenants})
+    return rooms
+
+
+def legacy_save_students_data(rooms_data: List[Dict]):
+    """改造前的实现：每个学生先 find_one 查询标签，再批量写入"""
+    operations = []
+    current_time = datetime.now()
+    collection = db_manager.students_collection
+
+    for room in rooms_data:
+        for tenant in room.get('tenants', []):
+            student_id = tenant.get('student_id')
+            existing_student = collection.find_one({'student_id': student_id})
+            student_doc = {
+                'student_id': student_id,
+                'name': tenant.get('name'),
+                'room_number': room.get('room_number'),
+                'mobile': tenant.get('mobile', ''),
+                'is_main': tenant.get('is_main', 0),
+                'updated_at': current_time
+            }
+            if existing_student:
+                operations.append(UpdateOne({'student_id': student_id}, {'$set': student_doc}, upsert=False))
+            else:
+                student_doc['tag'] = '未分类'
+                operations.append(UpdateOne({'student_id': student_id}, {'$set': student_doc}, upsert=True))
+
+    if operations:
+        collection.bulk_write(operations)
+
+
+def run_case(name: str, save_func, rooms_data: List[Dict]):
+    """运行一次保存（首次同步 + 稳态同步），输出往返次数"""
+    db_manager.students_collection.delete_many({})
+
+    for phase in ('首次同步', '稳态同步'):
+        counter.reset()
+        start = time.perf_counter()
+        save_func(rooms_data)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<12} {phase:<8} 往返 {counter.total():>6} 次  {dict(counter.commands)}  耗时 {elapsed:.3f}s")
+
+
+def main():
+    student_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    rooms_data = build_rooms(student_count)
+    print(f"合成数据: {len(rooms_data)} 间房，{student_count} 名学生，数据库 {db_manager.db.name}")
+    print(f"MongoDB: {db_manager.client.address}")
+
+    try:
+        run_case('改造前', legacy_save_students_data, rooms_data)
+        run_case('改造后', db_manager._save_students_data, rooms_data)
+
+        # 验证标签保留：修改一个标签后再次同步
+        db_manager.students_collection.update_one({'student_id': 100000}, {'$set': {'tag': '实习实践'}})
+        db_manager._save_students_data(rooms_data)
+        tag = db_manager.students_collection.find_one({'student_id': 100000})['tag']
+        print(f"标签保留检查: {'通过' if tag == '实习实践' else '失败'}")
+    finally:
+        db_manager.client.drop_database(db_manager.db.name)
+        db_manager.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+搜索索引基准测试 - 对比逐房间子串扫描与按快照构建的搜索索引
+
+用法:
+    python3 benchmarks/bench_search_index.py [租户数] [重复次数]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import PYPINYIN_AVAILABLE, SearchIndex
+
+SURNAMES = '王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈'
+GIVEN_CHARS = '伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华玉兰萍红鹏辉建国宇浩然子涵欣怡梓轩一诺思远雨泽佳琪'
+
+
+def build_rooms(tenant_count: int):
+    """生成合成数据：每间房1-2人，楼层与房间号按A4栋规则编号"""
+    random.seed(0)
+    rooms = []
+    tenant_id = 0
+    room_index = 0
+    while tenant_id < tenant_count:
+        floor = room_index // 12 + 1
+        room_number = f"{floor}{room_index % 12 + 1:02d}"
+        tenants = []
+        for offset in range(min(random.choice([1, 2]), tenant_count - tenant_id)):
+            tenant_id += 1
+            name = random.choice(SURNAMES) + ''.join(random.choice(GIVEN_CHARS) for _ in range(random.choice([1, 2])))
+            tenants.append({
+                'student_id': str(100000 + tenant_id),
+                'tenant_name': name,
+                'mobile': f"1{random.choice('3589')}{random.randrange(10 ** 9):09d}",
+                'is_main': 1 if offset == 0 else 0,
+                'tag': '未分类'
+            })
+        rooms.append({
+            'house_id': f"house_{room_index}",
+            'house_name': f"之寓·未来-A4栋-1单元-{room_number}",
+            'floor': floor,
+            'room_number': room_number,
+            'tenants': tenants
+        })
+        room_index += 1
+    return rooms
+
+
+def legacy_search(rooms, query: str):
+    """改造前的实现：逐房间、逐租户子串匹配"""
+    query_lower = query.lower()
+    return [
+        room for room in rooms
+        if (query_lower in room['room_number'].lower() or
+            query_lower in room['house_name'].lower() or
+            any(query_lower in tenant['tenant_name'].lower() or
+                query_lower in tenant['mobile'] for tenant in room['tenants']))
+    ]
+
+
+def measure(func, repeat: int) -> float:
+    """返回平均耗时（微秒）"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    tenant_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    rooms = build_rooms(tenant_count)
+    print(f"合成数据: {len(rooms)} 间房，{tenant_count} 名租户，pypinyin {'可用' if PYPINYIN_AVAILABLE else '不可用'}")
+
+    start = time.perf_counter()
+    index = SearchIndex(rooms)
+    print(f"索引构建耗时 {time.perf_counter() - start:.2f}s")
+
+    # 只修改标签时搜索字段不变，新快照直接复用索引结构
+    for room in rooms[:100]:
+        for tenant in room['tenants']:
+            tenant['tag'] = '研一'
+    start = time.perf_counter()
+    SearchIndex.build(rooms, index)
+    print(f"标签变更后重建耗时 {time.perf_counter() - start:.2f}s（复用索引结构）")
+
+    sample = rooms[len(rooms) // 2]['tenants'][0]
+    queries = [
+        ('房间号精确', rooms[len(rooms) // 3]['room_number']),
+        ('房间号前缀', '12'),
+        ('姓名精确', sample['tenant_name']),
+        ('姓氏单字', sample['tenant_name'][0]),
+        ('姓名双字', sample['tenant_name'][:2]),
+        ('手机号后4位', sample['mobile'][-4:]),
+        ('手机号完整', sample['mobile']),
+        ('手机号前3位', sample['mobile'][:3]),
+        ('手机号中间', sample['mobile'][3:7]),
+        ('房间号子串', rooms[len(rooms) // 3]['room_number'][1:]),
+        ('拼音', 'zhang'),
+        ('首字母', 'zw'),
+        ('无结果', '不存在的人'),
+    ]
+
+    print(f"{'查询':<10} {'关键词':<14} {'扫描(ms)':>10} {'索引(µs)':>10} {'首页结果':>8}")
+    for label, query in queries:
+        legacy_us = measure(lambda: legacy_search(rooms, query), max(1, repeat // 50))
+        index_us = measure(lambda: index.search(query, 1, 20), repeat)
+        result = index.search(query, 1, 20)
+        print(f"{label:<10} {query:<14} {legacy_us / 1000:>10.2f} {index_us:>10.1f} {len(result['rooms']):>8}")
+
+
+if __name__ == '__main__':
+    main()
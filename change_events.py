@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+变更事件模块 - 对比相邻布局快照得到变更房间，并通过 Server-Sent Events 推送给前端
+"""
+
+import logging
+import queue
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from layout_spec import layout_skeleton
+from response_cache import dumps
+
+logger = logging.getLogger(__name__)
+
+
+def diff_layouts(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, List]:
+    """
+    对比两份布局数据，找出发生变化的房间
+
+    Args:
+        previous: 旧布局数据
+        current: 新布局数据
+
+    Returns:
+        {'rooms': 新增或变化的房间数据列表, 'removed': 已不存在的房间键列表}
+
+    房间按 layout_skeleton.room_key 对应（单楼栋单元时即房间号），不同楼栋的同号房间互不影响
+    """
+    room_key = layout_skeleton.room_key
+    previous_rooms = {room_key(room): room for room in previous.get('rooms', [])}
+
+    changed_rooms = []
+    current_keys = set()
+    for room in current.get('rooms', []):
+        key = room_key(room)
+        current_keys.add(key)
+        if previous_rooms.get(key) != room:
+            changed_rooms.append(room)
+
+    removed = [key for key in previous_rooms if key not in current_keys]
+    return {'rooms': changed_rooms, 'removed': removed}
+
+
+def summarize_layout_changes(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, List]:
+    """
+    汇总两份布局之间受影响的房间和学号（用于变更日志）
+
+    Args:
+        previous: 旧布局数据
+        current: 新布局数据
+
+    Returns:
+        {'rooms': 受影响的房间键列表（见 diff_layouts）, 'students': 受影响的学号列表}
+    """
+    room_key = layout_skeleton.room_key
+    changes = diff_layouts(previous, current)
+    previous_rooms = {room_key(room): room for room in previous.get('rooms', [])}
+
+    changed_rooms = {room_key(room): room for room in changes['rooms']}
+
+    room_keys = list(changed_rooms) + changes['removed']
+    student_ids = set()
+    for key in room_keys:
+        # 新旧房间中的租户都算受影响（入住、退房、换房、标签变更）
+        for room in (previous_rooms.get(key), changed_rooms.get(key)):
+            for tenant in (room or {}).get('tenants', []):
+                student_id = tenant.get('student_id')
+                if student_id is not None:
+                    student_ids.add(str(student_id))
+
+    return {'rooms': sorted(room_keys), 'students': sorted(student_ids)}
+
+
+def format_event(event: str, data: Any, event_id: Optional[int] = None) -> bytes:
+    """
+    编码为SSE消息
+
+    Args:
+        event: 事件类型
+        data: 事件数据（序列化为单行JSON）
+        event_id: 事件ID，客户端重连时通过 Last-Event-ID 回传
+
+    Returns:
+        SSE消息字节
+    """
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}".encode('utf-8'))
+    lines.append(f"event: {event}".encode('utf-8'))
+    lines.append(b'data: ' + dumps(data))
+    return b'\n'.join(lines) + b'\n\n'
+
+
+class ChangeEventBroker:
+    """变更事件分发器 - 每个订阅者一个有界队列，事件只序列化一次"""
+
+    def __init__(self, history_size: int = 100, queue_size: int = 50, max_subscribers: int = 0):
+        """
+        初始化事件分发器
+
+        Args:
+            history_size: 保留的最近事件数，用于客户端断线重连后补发
+            queue_size: 每个订阅者的队列长度，积压超过该长度的订阅者会被断开（客户端重连后全量刷新）
+            max_subscribers: 最大订阅者数，0 表示不限制
+        """
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.history = deque(maxlen=history_size)
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    def publish(self, event: str, data: Any, event_id: int):
+        """
+        发布事件
+
+        Args:
+            event: 事件类型
+            data: 事件数据
+            event_id: 事件ID（单调递增）
+        """
+        message = format_event(event, data, event_id)
+
+        with self.lock:
+            self.history.append((event_id, message))
+            self.published += 1
+            subscribers = list(self.subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # 订阅者消费过慢，断开连接，由客户端重连后重新同步
+                self._drop(subscriber)
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Optional[queue.Queue]:
+        """
+        订阅事件
+
+        Args:
+            last_event_id: 客户端最后收到的事件ID，用于补发断线期间的事件
+
+        Returns:
+            订阅队列，队列中为SSE消息字节，None 表示连接应当关闭；订阅者已达上限时返回None
+        """
+        subscriber = queue.Queue(maxsize=self.queue_size)
+
+        with self.lock:
+            if self.max_subscribers and len(self.subscribers) >= self.max_subscribers:
+                self.rejected += 1
+                logger.warning(f"事件订阅者已达上限 {self.max_subscribers}，拒绝新连接")
+                return None
+
+            if last_event_id is not None:
+                missed = [message for event_id, message in self.history if event_id > last_event_id]
+                oldest = self.history[0][0] if self.history else None
+                latest = self.history[-1][0] if self.history else None
+                if oldest is None or last_event_id < oldest - 1 or last_event_id > latest or len(missed) >= self.queue_size:
+                    # 补发记录不完整（已裁剪或服务端重启），通知客户端全量刷新
+                    subscriber.put_nowait(format_event('reset', {'reason': '变更记录不完整，需要全量刷新'}))
+                else:
+                    for message in missed:
+                        subscriber.put_nowait(message)
+
+            self.subscribers.add(subscriber)
+
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue):
+        """取消订阅"""
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def _drop(self, subscriber: queue.Queue):
+        """断开积压过多的订阅者"""
+        with self.lock:
+            if subscriber not in self.subscribers:
+                return
+            self.subscribers.discard(subscriber)
+            self.dropped += 1
+
+        self._close_queue(subscriber)
+        logger.warning("事件订阅者积压过多，已断开连接")
+
+    @staticmethod
+    def _close_queue(subscriber: queue.Queue):
+        """清空积压消息后放入关闭标记"""
+        try:
+            while True:
+                subscriber.get_nowait()
+        except queue.Empty:
+            pass
+        subscriber.put_nowait(None)
+
+    def close(self):
+        """关闭所有订阅连接"""
+        with self.lock:
+            subscribers = list(self.subscribers)
+            self.subscribers.clear()
+
+        for subscriber in subscribers:
+            self._close_queue(subscriber)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取分发统计"""
+        with self.lock:
+            return {
+                'subscribers': len(self.subscribers),
+                'max_subscribers': self.max_subscribers,
+                'published': self.published,
+                'dropped': self.dropped,
+                'rejected': self.rejected,
+                'history': len(self.history),
+                'latest_event_id': self.history[-1][0] if self.history else None
+            }
@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+紧凑布局模块 - 布局快照在内存中的紧凑表示
+
+- 房间和租户使用 __slots__ 记录，main_tenant / co_tenants 不再重复保存租户数据，
+  只记录它们在 tenants 中的下标，读取或还原为字典时再引用对应租户
+- 楼栋、标签、房间号等重复出现的字符串统一驻留（sys.intern），各版本快照共享同一份；
+  其余纯ASCII字符串字段（学号、手机号、证件号等）合并为一个字符串保存，读取时再拆分，
+  省去每个字符串对象约50字节的固定开销
+- 新快照中与上一版本相同的房间直接复用旧记录（先与旧记录比较，相同时不再构建新记录）；
+  骨架中共享的空房间字典按对象身份对应预先构建好的记录
+- 每个楼层（按 楼栋、单元、楼层 区分）一个入住位图，按 house_id / 房间号 / 学号 建立位置索引，入住统计 O(1)；
+  "<栋号>-<单元>-<房间号>" 不单独建索引，查找时拆分后按房间号的位置核对楼栋和单元
+
+记录支持 get() / [] 读取，可直接用在原先按字典读取房间的代码中
+"""
+
+import sys
+from operator import attrgetter
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+_MISSING = object()
+# 字段值已合并保存在 packed 中
+_PACKED = object()
+# 合并字符串字段时使用的分隔符（含该字符的值不合并）
+_SEPARATOR = '\x1f'
+
+
+class _Record:
+    """
+    紧凑记录基类：字段按 FIELDS 顺序存放，原数据中没有的字段不会在还原时出现
+
+    未驻留的纯ASCII字符串字段按 FIELDS 顺序用分隔符合并保存在 packed 中，对应字段存放 _PACKED
+    """
+
+    __slots__ = ('extra', 'packed')
+
+    FIELDS: Tuple[str, ...] = ()
+    # 需要驻留的字符串字段
+    INTERNED: frozenset = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # 按 FIELDS 顺序一次取出全部存放值
+        cls._stored = attrgetter(*cls.FIELDS)
+
+    def _load(self, data: Dict[str, Any], skip: Tuple[str, ...] = ()):
+        """从字典读取字段，未知字段保存在 extra 中"""
+        # 同一记录内相等的非ASCII字符串只保留一份
+        seen: Dict[str, str] = {}
+        packed = []
+        for field in self.FIELDS:
+            value = data.get(field, _MISSING)
+            if type(value) is str:
+                if field in self.INTERNED:
+                    value = sys.intern(value)
+                elif value.isascii() and _SEPARATOR not in value:
+                    packed.append(value)
+                    value = _PACKED
+                else:
+                    value = seen.setdefault(value, value)
+            setattr(self, field, value)
+        self.packed = _SEPARATOR.join(packed) if packed else None
+
+        known = self.FIELDS + skip
+        extra = {key: value for key, value in data.items() if key not in known}
+        self.extra = extra or None
+
+    def _unpack(self, key: str) -> str:
+        """从 packed 中取出字段值"""
+        index = 0
+        for field in self.FIELDS:
+            if field == key:
+                break
+            if getattr(self, field) is _PACKED:
+                index += 1
+        return self.packed.split(_SEPARATOR)[index]
+
+    def _values(self) -> Sequence[Any]:
+        """按 FIELDS 顺序返回全部字段值（合并保存的字段已拆分）"""
+        values = self._stored(self)
+        if self.packed is None:
+            return values
+        unpacked = iter(self.packed.split(_SEPARATOR))
+        return [next(unpacked) if value is _PACKED else value for value in values]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """按字段名读取，与 dict.get 相同"""
+        if key in self.FIELDS:
+            value = getattr(self, key)
+            if value is _PACKED:
+                return self._unpack(key)
+            return default if value is _MISSING else value
+        if self.extra:
+            return self.extra.get(key, default)
+        return default
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def _fields_dict(self) -> Dict[str, Any]:
+        """还原 FIELDS 中存在的字段"""
+        return {field: value for field, value in zip(self.FIELDS, self._values()) if value is not _MISSING}
+
+    def _matches(self, data: Dict[str, Any], skip: Tuple[str, ...] = ()) -> bool:
+        """FIELDS 及 extra 与字典内容相同"""
+        for field, value in zip(self.FIELDS, self._values()):
+            if data.get(field, _MISSING) != value:
+                return False
+
+        extra_count = len(data) - sum(1 for key in self.FIELDS + skip if key in data)
+        if not self.extra:
+            return extra_count == 0
+        return extra_count == len(self.extra) and all(data.get(key, _MISSING) == value for key, value in self.extra.items())
+
+    def __eq__(self, other: Any) -> bool:
+        if self is other:
+            return True
+        if type(other) is not type(self):
+            return NotImplemented
+        # 相同内容的合并方式相同，逐个比较存放的值即可
+        return (all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+                and self.packed == other.packed and self.extra == other.extra)
+
+    def __ne__(self, other: Any) -> bool:
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+
+class TenantRecord(_Record):
+    """租户记录"""
+
+    FIELDS = ('id', 'guests_id', 'student_id', 'tenant_name', 'mobile', 'is_main', 'certificate_num',
+              'emergency_contact', 'emergency_mobile', 'sign_status', 'occupancy_flag', 'tag')
+    INTERNED = frozenset(('tag',))
+
+    __slots__ = FIELDS
+
+    def __init__(self, data: Dict[str, Any]):
+        self._load(data)
+
+    def matches(self, data: Dict[str, Any]) -> bool:
+        """与租户字典内容相同"""
+        return self._matches(data)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """还原为租户字典"""
+        result = self._fields_dict()
+        if self.extra:
+            result.update(self.extra)
+        return result
+
+
+class RoomRecord(_Record):
+    """房间记录"""
+
+    FIELDS = ('house_id', 'house_name', 'building', 'unit', 'floor', 'room_in_floor', 'room_number', 'is_vacant')
+    INTERNED = frozenset(('house_id', 'house_name', 'building', 'room_number'))
+
+    # main_index: 主租户在 tenants 中的下标（-1 表示没有，None 表示原数据没有该字段）
+    # co_indexes: 合租户下标（按原数据顺序），None 表示原数据没有该字段
+    __slots__ = FIELDS + ('tenants', 'main_index', 'co_indexes')
+
+    def __init__(self, data: Dict[str, Any]):
+        self._load(data, ('tenants', 'main_tenant', 'co_tenants'))
+        tenant_dicts = data.get('tenants') or []
+        self.tenants: Tuple[TenantRecord, ...] = tuple(TenantRecord(tenant) for tenant in tenant_dicts)
+        self.main_index = self._locate(tenant_dicts, [data['main_tenant']] if data.get('main_tenant') else [], -1) \
+            if 'main_tenant' in data else None
+        self.co_indexes = self._locate(tenant_dicts, data['co_tenants'] or [], ()) \
+            if 'co_tenants' in data else None
+
+    @staticmethod
+    def _locate(tenants: Sequence[Dict[str, Any]], targets: Sequence[Dict[str, Any]], empty: Any) -> Any:
+        """找出 targets 中的租户在 tenants 中的下标（主租户返回单个下标，合租户返回元组）"""
+        if not targets:
+            return empty
+
+        indexes = []
+        for target in targets:
+            for index, tenant in enumerate(tenants):
+                if tenant is target or tenant == target:
+                    indexes.append(index)
+                    break
+        if not indexes:
+            return empty
+        return indexes[0] if isinstance(empty, int) else tuple(indexes)
+
+    def matches(self, data: Dict[str, Any]) -> bool:
+        """
+        与房间字典内容相同（不构建新记录，用于判断能否复用）
+
+        Args:
+            data: 房间字典
+
+        Returns:
+            还原后的字典与 data 相等时返回True
+        """
+        if not self._matches(data, ('tenants', 'main_tenant', 'co_tenants')):
+            return False
+
+        tenant_dicts = data.get('tenants') or []
+        if len(tenant_dicts) != len(self.tenants):
+            return False
+        if not all(record.matches(tenant) for record, tenant in zip(self.tenants, tenant_dicts)):
+            return False
+
+        main_index = self._locate(tenant_dicts, [data['main_tenant']] if data.get('main_tenant') else [], -1) \
+            if 'main_tenant' in data else None
+        co_indexes = self._locate(tenant_dicts, data['co_tenants'] or [], ()) \
+            if 'co_tenants' in data else None
+        return main_index == self.main_index and co_indexes == self.co_indexes
+
+    @property
+    def occupied(self) -> bool:
+        """是否有租户"""
+        return bool(self.tenants)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """按字段名读取，tenants / main_tenant / co_tenants 返回租户记录"""
+        if key == 'tenants':
+            return self.tenants
+        if key == 'main_tenant':
+            if self.main_index is None:
+                return default
+            return self.tenants[self.main_index] if self.main_index >= 0 else None
+        if key == 'co_tenants':
+            if self.co_indexes is None:
+                return default
+            return [self.tenants[index] for index in self.co_indexes]
+        return super().get(key, default)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """还原为房间字典（字段顺序与同步生成的布局数据一致，主租户/合租户与 tenants 共用同一租户字典）"""
+        result = self._fields_dict()
+        is_vacant = result.pop('is_vacant', _MISSING)
+
+        tenants = [tenant.to_dict() for tenant in self.tenants]
+        result['tenants'] = tenants
+        if self.main_index is not None:
+            result['main_tenant'] = tenants[self.main_index] if self.main_index >= 0 else None
+        if self.co_indexes is not None:
+            result['co_tenants'] = [tenants[index] for index in self.co_indexes]
+        if is_vacant is not _MISSING:
+            result['is_vacant'] = is_vacant
+        if self.extra:
+            result.update(self.extra)
+        return result
+
+
+class CompactLayout:
+    """紧凑布局：按布局顺序保存的房间记录及其索引"""
+
+    def __init__(self, rooms: List[Dict[str, Any]], previous: Optional['CompactLayout'] = None,
+                 shared: Optional[Dict[int, RoomRecord]] = None):
+        """
+        构建紧凑布局
+
+        Args:
+            rooms: 布局中的房间列表（按布局顺序）
+            previous: 上一版本的紧凑布局，未变化的房间复用其记录
+            shared: 常驻内存的共享房间字典（如骨架中的空房间）的 id -> 对应记录，这些字典直接使用该记录
+        """
+        records = []
+        for room in rooms:
+            record = shared.get(id(room)) if shared else None
+            if record is None and previous is not None:
+                position = previous.house_positions.get(str(room.get('house_id')))
+                if position is not None and previous.records[position].matches(room):
+                    record = previous.records[position]
+            if record is None:
+                record = RoomRecord(room)
+            records.append(record)
+        self.records: Tuple[RoomRecord, ...] = tuple(records)
+
+        # house_id / 学号（均转为字符串）-> 位置（重复时取第一个）
+        self.house_positions: Dict[str, int] = {}
+        self.student_positions: Dict[str, int] = {}
+        # 房间号 -> 位置，不同楼栋/单元有同号房间时为这些房间的位置元组（有歧义，不按房间号查找）
+        self.room_positions: Dict[str, Union[int, Tuple[int, ...]]] = {}
+        # (楼栋, 单元, 楼层) -> 该层房间位置；(楼栋, 单元, 楼层) -> 入住位图（第 i 位对应该层第 i 个房间）
+        # 不同楼栋、单元的同号楼层分开统计
+        self.floor_positions: Dict[Tuple[Any, Any, Any], Tuple[int, ...]] = {}
+        self.floor_bits: Dict[Tuple[Any, Any, Any], int] = {}
+        # 楼层号 -> 该楼层号对应的 (楼栋, 单元, 楼层) 键
+        self.floor_index: Dict[Any, List[Tuple[Any, Any, Any]]] = {}
+
+        floor_positions: Dict[Tuple[Any, Any, Any], List[int]] = {}
+        self.occupied_count = 0
+        self.tenant_count = 0
+
+        for position, record in enumerate(self.records):
+            house_id = record.get('house_id')
+            if house_id is not None:
+                self.house_positions.setdefault(str(house_id), position)
+            room_number = record.get('room_number')
+            if room_number is not None:
+                room_number = str(room_number)
+                existing = self.room_positions.get(room_number)
+                if existing is None:
+                    self.room_positions[room_number] = position
+                else:
+                    self.room_positions[room_number] = (existing if type(existing) is tuple else (existing,)) + (position,)
+
+            floor = record.get('floor')
+            floor_key = (record.get('building'), record.get('unit'), floor)
+            floor_list = floor_positions.get(floor_key)
+            if floor_list is None:
+                floor_list = floor_positions[floor_key] = []
+                self.floor_index.setdefault(floor, []).append(floor_key)
+            if record.tenants:
+                self.floor_bits[floor_key] = self.floor_bits.get(floor_key, 0) | (1 << len(floor_list))
+                self.occupied_count += 1
+                self.tenant_count += len(record.tenants)
+                for tenant in record.tenants:
+                    student_id = tenant.get('student_id')
+                    if student_id is not None:
+                        self.student_positions.setdefault(str(student_id), position)
+            floor_list.append(position)
+
+        self.floor_positions = {floor: tuple(positions) for floor, positions in floor_positions.items()}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self) -> Iterator[RoomRecord]:
+        return iter(self.records)
+
+    @property
+    def total_rooms(self) -> int:
+        """房间总数"""
+        return len(self.records)
+
+    @property
+    def vacant_count(self) -> int:
+        """空房间数"""
+        return len(self.records) - self.occupied_count
+
+    @property
+    def floors(self) -> List[Any]:
+        """布局中出现的楼层号（按布局顺序）"""
+        return list(self.floor_index)
+
+    def floor_keys(self, floor: Any, building: Any = None, unit: Any = None) -> List[Tuple[Any, Any, Any]]:
+        """
+        楼层号对应的 (楼栋, 单元, 楼层) 键
+
+        Args:
+            floor: 楼层号
+            building: 栋号，None 表示所有楼栋
+            unit: 单元号，None 表示所有单元
+
+        Returns:
+            匹配的楼层键（按布局顺序）
+        """
+        return [key for key in self.floor_index.get(floor, ())
+                if (building is None or key[0] == building) and (unit is None or key[1] == unit)]
+
+    def floor_occupied_count(self, floor: Any, building: Any = None, unit: Any = None) -> int:
+        """某层有租户的房间数（未指定楼栋/单元时合计所有楼栋的该层）"""
+        return sum(bin(self.floor_bits.get(key, 0)).count('1') for key in self.floor_keys(floor, building, unit))
+
+    def floor_records(self, floor: Any, building: Any = None, unit: Any = None) -> List[RoomRecord]:
+        """某层的全部房间记录（未指定楼栋/单元时包括所有楼栋的该层）"""
+        return [self.records[position]
+                for key in self.floor_keys(floor, building, unit)
+                for position in self.floor_positions[key]]
+
+    def find(self, room_id: Any) -> Optional[RoomRecord]:
+        """
+        按房间ID查找房间
+
+        依次按 house_id（包括空房间合成ID）、"<栋号>-<单元>-<房间号>"、房间号查找；
+        房间号在多个楼栋/单元中重复时不按房间号查找（见 is_ambiguous），不会返回其他楼栋的房间
+
+        Args:
+            room_id: house_id、"<栋号>-<单元>-<房间号>" 或房间号
+
+        Returns:
+            房间记录，不存在或房间号有歧义时返回None
+        """
+        key = str(room_id)
+        position = self.house_positions.get(key)
+        if position is None:
+            position = self._room_key_position(key)
+        if position is None:
+            position = self.room_positions.get(key)
+            if type(position) is tuple:
+                position = None
+        return self.records[position] if position is not None else None
+
+    def _room_key_position(self, key: str) -> Optional[int]:
+        """按 "<栋号>-<单元>-<房间号>" 查找位置：拆出房间号后核对楼栋和单元（同号房间取第一个）"""
+        parts = key.rsplit('-', 2)
+        if len(parts) != 3:
+            return None
+        building, unit, room_number = parts
+        positions = self.room_positions.get(room_number)
+        if positions is None:
+            return None
+        for position in positions if type(positions) is tuple else (positions,):
+            record = self.records[position]
+            if str(record.get('building')) == building and str(record.get('unit')) == unit:
+                return position
+        return None
+
+    def is_ambiguous(self, room_id: Any) -> bool:
+        """room_id 不是 house_id 或房间键，而是在多个楼栋/单元中重复的房间号"""
+        key = str(room_id)
+        return (key not in self.house_positions and self._room_key_position(key) is None
+                and type(self.room_positions.get(key)) is tuple)
+
+    def find_house(self, house_id: Any) -> Optional[RoomRecord]:
+        """按 house_id 查找房间"""
+        position = self.house_positions.get(str(house_id))
+        return self.records[position] if position is not None else None
+
+    def find_room_number(self, room_number: Any) -> Optional[RoomRecord]:
+        """按房间号查找房间（房间号在多个楼栋/单元中重复时返回None）"""
+        position = self.room_positions.get(str(room_number))
+        return self.records[position] if type(position) is int else None
+
+    def find_student(self, student_id: Any) -> Optional[RoomRecord]:
+        """按学号查找租户所在房间"""
+        position = self.student_positions.get(str(student_id))
+        return self.records[position] if position is not None else None
+
+    def to_dicts(self, records: Optional[Sequence[RoomRecord]] = None) -> List[Dict[str, Any]]:
+        """
+        还原为房间字典列表（每次调用生成新字典，可随意修改）
+
+        Args:
+            records: 需要还原的记录，默认为全部房间
+
+        Returns:
+            房间字典列表
+        """
+        return [record.to_dict() for record in (self.records if records is None else records)]
@@ -16,6 +16,20 @@ class Config:
     API_MAX_RETRIES = 3
     API_RETRY_DELAY = 2
     API_PAGE_SIZE = 50
+    API_CONCURRENCY = 4  # 分页并发请求数（首页之后的页面并行获取）
+    API_RATE_LIMIT = 4.0  # 令牌桶速率：每秒允许的请求数，<=0 表示不限速
+    API_RATE_BURST = 4  # 令牌桶容量：允许的突发请求数
+    AUTH_PROBE_TTL = int(os.getenv('AUTH_PROBE_TTL', 300))  # 认证探测结果缓存时间（秒）
+    AUTH_PROBE_TIMEOUT = 10  # 认证探测请求超时（秒）
+    AUTH_MAX_AGE_HOURS = float(os.getenv('AUTH_MAX_AGE_HOURS', 24))  # 令牌有效时间（小时）
+    AUTH_REFRESH_AHEAD_HOURS = float(os.getenv('AUTH_REFRESH_AHEAD_HOURS', 2))  # 过期前提前刷新的时间（小时）
+    AUTH_REFRESH_CHECK_INTERVAL = int(os.getenv('AUTH_REFRESH_CHECK_INTERVAL', 300))  # 令牌检查间隔（秒）
+    AUTH_REFRESH_WAIT_TIMEOUT = 30  # 401时等待其他线程完成认证刷新的最长时间（秒）
+    AUTO_AUTH_BROWSER_POOL_SIZE = int(os.getenv('AUTO_AUTH_BROWSER_POOL_SIZE', 1))  # 自动登录复用的浏览器数量
+    AUTO_AUTH_BROWSER_MAX_USES = 20  # 单个浏览器最多登录次数，超过后重建
+    # 空闲浏览器由后台线程按该时间关闭；定时刷新约每 (AUTH_MAX_AGE_HOURS - AUTH_REFRESH_AHEAD_HOURS) 小时一次，通常冷启动
+    AUTO_AUTH_BROWSER_IDLE_TIMEOUT = int(os.getenv('AUTO_AUTH_BROWSER_IDLE_TIMEOUT', 3600))  # 浏览器空闲超过该时间后关闭（秒）
+    AUTO_AUTH_LOGIN_TIMEOUT = 15  # 登录各阶段等待超时（秒）
     
     # 请求头配置
     API_HEADERS = {
@@ -52,21 +66,67 @@ class Config:
         "contractId": 1489
     }
     
-    # 房间布局配置
-    BUILDING_CONFIG = {
-        'building': 'A4栋',
-        'unit': 1,
-        'total_floors': 20,
-        'floor_1_rooms': 10,  # 1楼10间房
-        'regular_floor_rooms': 12,  # 2-20楼每层12间
-        'total_rooms': 10 + 19 * 12  # 238间
+    # 房间布局配置（声明式：楼栋 -> 单元 -> 楼层范围 -> 房间列表与通道位置）
+    # rooms 可写 "1-12" 或列表；gaps 为 {房间序号: 其后的通道格数}
+    LAYOUT_SPEC = {
+        'house_name_template': '之寓·未来-{building}栋-{unit}单元-{room_number}',
+        'buildings': [
+            {
+                'building': 'A4',
+                'units': [
+                    {
+                        'unit': 1,
+                        'floors': [
+                            {'floors': '1', 'rooms': '1-10', 'gaps': {6: 2}},  # 1楼10间房，06与07之间为通道
+                            {'floors': '2-20', 'rooms': '1-12'}  # 2-20楼每层12间
+                        ]
+                    }
+                ]
+            }
+        ]
     }
+    LAYOUT_SPEC_FILE = os.getenv('LAYOUT_SPEC_FILE')  # JSON格式的布局定义文件，设置后替代 LAYOUT_SPEC
     
     # Flask应用配置
     DEBUG = os.getenv('DEBUG', 'True').lower() == 'true'
     HOST = os.getenv('HOST', '0.0.0.0')
     PORT = int(os.getenv('PORT', 5001))
     
+    # 布局快照缓存配置
+    LAYOUT_CACHE_TTL = int(os.getenv('LAYOUT_CACHE_TTL', 300))  # 快照有效期（秒），过期后后台刷新
+    
+    # 布局快照（物化读模型）保留数量，用于回滚和差异对比
+    LAYOUT_SNAPSHOT_RETENTION = int(os.getenv('LAYOUT_SNAPSHOT_RETENTION', 20))
+    
+    # 布局变更日志保留数量（每个快照版本一条，只记录变更的房间号和学号），超出后增量查询需全量刷新
+    LAYOUT_CHANGE_LOG_RETENTION = int(os.getenv('LAYOUT_CHANGE_LOG_RETENTION', 1000))
+    
+    # 批量获取房间详情（/api/rooms/batch）单次最多的房间ID数
+    ROOMS_BATCH_MAX_IDS = int(os.getenv('ROOMS_BATCH_MAX_IDS', 200))
+    
+    # 后台同步调度配置
+    SYNC_SCHEDULER_ENABLED = os.getenv('SYNC_SCHEDULER_ENABLED', 'True').lower() == 'true'
+    SYNC_INTERVAL = int(os.getenv('SYNC_INTERVAL', 300))  # 同步间隔（秒）
+    SYNC_JITTER = int(os.getenv('SYNC_JITTER', 30))  # 同步间隔随机抖动（秒）
+    SYNC_MAX_RUNTIME = int(os.getenv('SYNC_MAX_RUNTIME', 600))  # 单次同步最长运行时间（秒）
+    
+    # 健康检查配置
+    HEALTH_CHECK_INTERVAL = int(os.getenv('HEALTH_CHECK_INTERVAL', 15))  # 后台刷新数据库/认证状态的间隔（秒）
+    READY_MAX_SNAPSHOT_AGE = int(os.getenv('READY_MAX_SNAPSHOT_AGE', 1800))  # 快照超过该年龄（秒）时标记为降级
+    
+    # 变更事件推送（SSE）配置
+    # 每个事件流连接在整个连接期间独占一个服务线程（python3 app.py 使用多线程 Werkzeug，每个请求一个线程），
+    # 连接数即常驻线程数，超过 EVENTS_MAX_SUBSCRIBERS 的新连接返回503，前端改为轮询变更接口并稍后重连
+    EVENTS_MAX_SUBSCRIBERS = int(os.getenv('EVENTS_MAX_SUBSCRIBERS', 50))  # 最大事件流连接数，0 表示不限制
+    EVENTS_HEARTBEAT = int(os.getenv('EVENTS_HEARTBEAT', 15))  # 心跳间隔（秒），防止代理断开空闲连接
+    EVENTS_HISTORY_SIZE = int(os.getenv('EVENTS_HISTORY_SIZE', 100))  # 保留的最近事件数，用于断线重连补发
+    EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', 50))  # 每个连接的最大积压事件数
+    
+    # 响应压缩配置（每个快照版本只压缩一次，压缩级别可以取较高值）
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))  # 小于该字节数的响应不压缩
+    GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 9))
+    BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 9))  # 11 压缩率略高但耗时高出约两个数量级
+    
     # 日志配置
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     
@@ -3,19 +3,54 @@
 负责MongoDB数据存储和标签管理
 """
 
+import hashlib
+import json
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional, Any
-from pymongo import MongoClient, ASCENDING, DESCENDING
+from typing import Dict, List, Optional, Any, Tuple
+from pymongo import MongoClient, ASCENDING, DESCENDING, ReturnDocument
 from pymongo.collection import Collection
 from pymongo.database import Database
 from pymongo.errors import ConnectionFailure, DuplicateKeyError
 from config import Config
+from change_events import summarize_layout_changes
 
 # 设置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 不参与内容指纹计算的字段（每次同步都会变化）
+VOLATILE_FIELDS = ('updated_at', 'check_in_date', 'content_hash')
+
+
+def _content_hash(doc: Dict[str, Any]) -> str:
+    """计算文档的内容指纹，忽略易变字段"""
+    def normalize(value):
+        if isinstance(value, dict):
+            return {key: normalize(item) for key, item in value.items() if key not in VOLATILE_FIELDS}
+        if isinstance(value, list):
+            return [normalize(item) for item in value]
+        return value
+    
+    payload = json.dumps(normalize(doc), sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def room_doc_key(doc: Dict[str, Any]) -> Tuple[Any, Any, Any]:
+    """房间在数据库中的键 (栋号, 单元, 房间号)，不同楼栋/单元的同号房间分别保存；早期文档没有单元时按1单元处理"""
+    return (doc.get('building'), doc.get('unit') or 1, doc.get('room_number'))
+
+
+def room_filter(key: Tuple[Any, Any, Any]) -> Dict[str, Any]:
+    """按房间键查询的条件"""
+    building, unit, room_number = key
+    return {'building': building, 'unit': unit, 'room_number': room_number}
+
+
+def format_room_key(key: Tuple[Any, Any, Any]) -> str:
+    """房间键的可读形式（用于同步统计）"""
+    return '-'.join(str(part) for part in key)
+
+
 class DatabaseManager:
     """数据库管理器"""
     
@@ -26,6 +61,10 @@ class DatabaseManager:
         self.rooms_collection: Optional[Collection] = None
         self.students_collection: Optional[Collection] = None
         self.tags_collection: Optional[Collection] = None
+        self.layout_snapshots_collection: Optional[Collection] = None
+        self.layout_changes_collection: Optional[Collection] = None
+        self.counters_collection: Optional[Collection] = None
+        self.last_sync_stats: Dict[str, Any] = {}
         self.connect()
     
     def connect(self):
@@ -58,6 +97,9 @@ class DatabaseManager:
             self.rooms_collection = self.db['rooms']
             self.students_collection = self.db['students']
             self.tags_collection = self.db['tags']
+            self.layout_snapshots_collection = self.db['layout_snapshots']
+            self.layout_changes_collection = self.db['layout_changes']
+            self.counters_collection = self.db['counters']
             
             # 创建索引
             self._create_indexes()
@@ -72,27 +114,63 @@ class DatabaseManager:
     def _create_indexes(self):
         """创建必要的索引"""
         try:
-            # 房间集合索引
-            self.rooms_collection.create_index([("room_number", ASCENDING)], unique=True)
+            self._migrate_room_keys()
+            
+            # 房间集合索引（多楼栋时每栋都有同号房间，按 栋号+单元+房间号 唯一）
+            self.rooms_collection.create_index(
+                [("building", ASCENDING), ("unit", ASCENDING), ("room_number", ASCENDING)], unique=True)
+            self.rooms_collection.create_index([("room_number", ASCENDING)])
             self.rooms_collection.create_index([("building", ASCENDING), ("floor", ASCENDING)])
             self.rooms_collection.create_index([("updated_at", DESCENDING)])
             
             # 学生集合索引
             self.students_collection.create_index([("student_id", ASCENDING)], unique=True)
             self.students_collection.create_index([("room_number", ASCENDING)])
+            self.students_collection.create_index(
+                [("building", ASCENDING), ("unit", ASCENDING), ("room_number", ASCENDING)])
             self.students_collection.create_index([("name", ASCENDING)])
             self.students_collection.create_index([("tag", ASCENDING)])
             
             # 标签集合索引
             self.tags_collection.create_index([("tag_name", ASCENDING)], unique=True)
             
+            # 布局快照集合索引
+            self.layout_snapshots_collection.create_index([("version", DESCENDING)], unique=True)
+            
+            # 布局变更日志索引
+            self.layout_changes_collection.create_index([("version", ASCENDING)], unique=True)
+            
             logger.info("数据库索引创建完成")
             
         except Exception as e:
             logger.error(f"创建索引失败: {e}")
     
-    def save_rooms_data(self, rooms_data: List[Dict]) -> bool:
-        """保存房间数据到数据库"""
+    def _migrate_room_keys(self):
+        """早期房间只按房间号唯一且没有单元字段：补齐单元（按1单元），删除房间号唯一索引"""
+        try:
+            self.rooms_collection.update_many({'unit': {'$exists': False}}, {'$set': {'unit': 1}})
+            self.students_collection.update_many(
+                {'unit': {'$exists': False}, 'room_number': {'$ne': None}}, {'$set': {'unit': 1}})
+            
+            for name, info in self.rooms_collection.index_information().items():
+                if info.get('unique') and [field for field, _ in info.get('key', [])] == ['room_number']:
+                    self.rooms_collection.drop_index(name)
+                    logger.info(f"已删除房间号唯一索引 {name}，改为按楼栋、单元、房间号唯一")
+        except Exception as e:
+            logger.error(f"迁移房间键失败: {e}")
+    
+    def save_rooms_data(self, rooms_data: List[Dict], remove_missing: bool = True) -> bool:
+        """
+        保存房间数据到数据库（增量）
+        
+        每条房间/学生记录计算内容指纹（content_hash）并随文档保存，
+        只对新增或内容变化的记录发出写操作，同步结果记录在 last_sync_stats 中
+        
+        Args:
+            rooms_data: 房间数据列表
+            remove_missing: 是否将本次数据中不存在的房间/学生标记为已退房
+                （仅在上游数据完整获取时启用，避免部分失败导致误删）
+        """
         try:
             if not rooms_data:
                 return False
@@ -100,35 +178,88 @@ class DatabaseManager:
             # 导入MongoDB操作类型
             from pymongo import UpdateOne
             
+            current_time = datetime.now()
+            
+            # 一次查询获取现有房间的指纹（按 栋号+单元+房间号 对应）
+            existing_rooms = {
+                room_doc_key(doc): doc
+                for doc in self.rooms_collection.find(
+                    {}, {'room_number': 1, 'building': 1, 'unit': 1, 'content_hash': 1, 'occupied': 1})
+            }
+            
             # 批量更新房间数据
             operations = []
-            current_time = datetime.now()
+            room_changes = {'added': [], 'changed': [], 'unchanged': 0, 'removed': []}
+            incoming_rooms = set()
             
             for room in rooms_data:
+                key = room_doc_key(room)
+                incoming_rooms.add(key)
+                
                 room_doc = {
                     'room_number': room.get('room_number'),
                     'building': room.get('building'),
+                    'unit': key[1],
                     'floor': room.get('floor'),
                     'room_type': room.get('room_type'),
                     'capacity': room.get('capacity', 0),
                     'occupied': room.get('occupied', False),
-                    'tenants': room.get('tenants', []),
-                    'updated_at': current_time
+                    'tenants': room.get('tenants', [])
                 }
+                room_doc['content_hash'] = _content_hash(room_doc)
+                
+                existing = existing_rooms.get(key)
+                if existing is None:
+                    room_changes['added'].append(format_room_key(key))
+                elif existing.get('content_hash') != room_doc['content_hash']:
+                    room_changes['changed'].append(format_room_key(key))
+                else:
+                    room_changes['unchanged'] += 1
+                    continue
                 
+                room_doc['updated_at'] = current_time
                 operations.append(UpdateOne(
-                    {'room_number': room.get('room_number')},
+                    room_filter(key),
                     {'$set': room_doc},
                     upsert=True
                 ))
             
+            # 上游已不存在的房间：标记为空房
+            if remove_missing:
+                for key, existing in existing_rooms.items():
+                    if key in incoming_rooms or not existing.get('occupied'):
+                        continue
+                    
+                    room_changes['removed'].append(format_room_key(key))
+                    operations.append(UpdateOne(
+                        room_filter(key),
+                        {'$set': {
+                            'occupied': False,
+                            'tenants': [],
+                            'content_hash': None,
+                            'updated_at': current_time
+                        }}
+                    ))
+            
             # 执行批量操作
             if operations:
                 result = self.rooms_collection.bulk_write(operations)
                 logger.info(f"房间数据保存成功: 更新 {result.modified_count} 条，插入 {result.upserted_count} 条")
             
             # 同时保存学生数据
-            self._save_students_data(rooms_data)
+            student_changes = self._save_students_data(rooms_data, remove_missing)
+            
+            self.last_sync_stats = {
+                'rooms': room_changes,
+                'students': student_changes,
+                'timestamp': current_time.isoformat()
+            }
+            logger.info(
+                f"增量同步完成: 房间 新增 {len(room_changes['added'])} / 变更 {len(room_changes['changed'])} / "
+                f"未变 {room_changes['unchanged']} / 移除 {len(room_changes['removed'])}；"
+                f"学生 新增 {len(student_changes['added'])} / 变更 {len(student_changes['changed'])} / "
+                f"未变 {student_changes['unchanged']} / 移除 {len(student_changes['removed'])}"
+            )
             
             return True
             
@@ -136,8 +267,18 @@ class DatabaseManager:
             logger.error(f"保存房间数据失败: {e}")
             return False
     
-    def _save_students_data(self, rooms_data: List[Dict]):
-        """保存学生数据，智能保留现有标签信息"""
+    def _save_students_data(self, rooms_data: List[Dict], remove_missing: bool = True) -> Dict[str, Any]:
+        """
+        保存学生数据，智能保留现有标签信息
+        
+        标签和入住日期通过 $setOnInsert 只在新建学生时写入，已有学生的标签保持不变；
+        现有学生的内容指纹通过一次查询批量获取，只写入新增或变化的学生
+        
+        Returns:
+            学生变更统计 {'added': [...], 'changed': [...], 'unchanged': n, 'removed': [...]}
+        """
+        student_changes = {'added': [], 'changed': [], 'unchanged': 0, 'removed': []}
+        
         try:
             # 导入MongoDB操作类型
             from pymongo import UpdateOne
@@ -145,6 +286,13 @@ class DatabaseManager:
             operations = []
             current_time = datetime.now()
             
+            # 一次查询获取现有学生的指纹
+            existing_students = {
+                doc['student_id']: doc
+                for doc in self.students_collection.find({}, {'student_id': 1, 'content_hash': 1, 'room_number': 1})
+            }
+            incoming_students = set()
+            
             for room in rooms_data:
                 room_number = room.get('room_number')
                 tenants = room.get('tenants', [])
@@ -154,48 +302,65 @@ class DatabaseManager:
                         student_id = tenant.get('student_id')
                         if not student_id:
                             continue
-                            
-                        # 查询是否已存在该学生，获取现有标签
-                        existing_student = self.students_collection.find_one({'student_id': student_id})
                         
-                        # 如果学生已存在且有标签，保留原标签；否则使用默认标签
-                        existing_tag = '未分类'
-                        if existing_student and existing_student.get('tag'):
-                            existing_tag = existing_student.get('tag')
+                        incoming_students.add(student_id)
                         
                         student_doc = {
                             'student_id': student_id,
                             'name': tenant.get('name'),
                             'room_number': room_number,
                             'building': room.get('building'),
+                            'unit': room.get('unit') or 1,
                             'floor': room.get('floor'),
-                            'check_in_date': tenant.get('check_in_date'),
                             'mobile': tenant.get('mobile', ''),
                             'is_main': tenant.get('is_main', 0),
                             'certificate_num': tenant.get('certificate_num', ''),
                             'emergency_contact': tenant.get('emergency_contact', ''),
                             'emergency_mobile': tenant.get('emergency_mobile', ''),
                             'sign_status': tenant.get('sign_status', 0),
-                            'occupancy_flag': tenant.get('occupancy_flag', 0),
-                            'updated_at': current_time
+                            'occupancy_flag': tenant.get('occupancy_flag', 0)
                         }
+                        student_doc['content_hash'] = _content_hash(student_doc)
                         
-                        # 根据是否为新学生决定更新方式
-                        if existing_student:
-                            # 现有学生：保留标签，只更新其他信息
-                            operations.append(UpdateOne(
-                                {'student_id': student_id},
-                                {'$set': student_doc},  # 不更新tag字段
-                                upsert=False
-                            ))
+                        existing = existing_students.get(student_id)
+                        if existing is None:
+                            student_changes['added'].append(student_id)
+                        elif existing.get('content_hash') != student_doc['content_hash']:
+                            student_changes['changed'].append(student_id)
                         else:
-                            # 新学生：设置默认标签
-                            student_doc['tag'] = existing_tag
-                            operations.append(UpdateOne(
-                                {'student_id': student_id},
-                                {'$set': student_doc},
-                                upsert=True
-                            ))
+                            student_changes['unchanged'] += 1
+                            continue
+                        
+                        student_doc['updated_at'] = current_time
+                        
+                        # 现有学生：只更新其他信息，保留标签；新学生：插入时设置默认标签
+                        operations.append(UpdateOne(
+                            {'student_id': student_id},
+                            {
+                                '$set': student_doc,
+                                '$setOnInsert': {
+                                    'tag': '未分类',
+                                    'check_in_date': tenant.get('check_in_date')
+                                }
+                            },
+                            upsert=True
+                        ))
+            
+            # 已退房的学生：解除房间关联，保留标签
+            if remove_missing:
+                for student_id, existing in existing_students.items():
+                    if student_id in incoming_students or existing.get('room_number') is None:
+                        continue
+                    
+                    student_changes['removed'].append(student_id)
+                    operations.append(UpdateOne(
+                        {'student_id': student_id},
+                        {'$set': {
+                            'room_number': None,
+                            'content_hash': None,
+                            'updated_at': current_time
+                        }}
+                    ))
             
             # 执行批量操作
             if operations:
@@ -204,27 +369,45 @@ class DatabaseManager:
                 
         except Exception as e:
             logger.error(f"保存学生数据失败: {e}")
+        
+        return student_changes
     
-    def get_rooms_data(self, filter_dict: Dict = None) -> List[Dict]:
-        """获取房间数据"""
+    def get_rooms_data(self, filter_dict: Dict = None, projection: Dict = None) -> List[Dict]:
+        """获取房间数据（projection 为MongoDB投影，只返回需要的字段）"""
         try:
             filter_dict = filter_dict or {}
-            cursor = self.rooms_collection.find(filter_dict).sort("room_number", ASCENDING)
+            cursor = self.rooms_collection.find(filter_dict, projection).sort("room_number", ASCENDING)
             return list(cursor)
         except Exception as e:
             logger.error(f"获取房间数据失败: {e}")
             return []
     
-    def get_students_data(self, filter_dict: Dict = None) -> List[Dict]:
-        """获取学生数据"""
+    def get_students_data(self, filter_dict: Dict = None, projection: Dict = None) -> List[Dict]:
+        """获取学生数据（projection 为MongoDB投影，只返回需要的字段）"""
         try:
             filter_dict = filter_dict or {}
-            cursor = self.students_collection.find(filter_dict).sort("name", ASCENDING)
+            cursor = self.students_collection.find(filter_dict, projection).sort("name", ASCENDING)
             return list(cursor)
         except Exception as e:
             logger.error(f"获取学生数据失败: {e}")
             return []
     
+    def get_students_grouped_by_room(self, filter_dict: Dict = None, projection: Dict = None) -> Dict[str, List[Dict]]:
+        """
+        一次查询获取学生数据并按房间分组
+        
+        Args:
+            filter_dict: 学生查询条件
+            projection: MongoDB投影（需包含 building、unit、room_number）
+            
+        Returns:
+            {(栋号, 单元, 房间号): [学生, ...]}（见 room_doc_key），每个房间内按姓名排序
+        """
+        students_by_room: Dict[Tuple[Any, Any, Any], List[Dict]] = {}
+        for student in self.get_students_data(filter_dict, projection):
+            students_by_room.setdefault(room_doc_key(student), []).append(student)
+        return students_by_room
+    
     def update_student_tag(self, student_id: str, tag: str) -> bool:
         """更新学生标签"""
         try:
@@ -345,8 +528,12 @@ class DatabaseManager:
     def get_room_detail_from_db(self, house_id: str) -> Optional[Dict]:
         """从数据库获取单个房间详情"""
         try:
-            # 查找房间信息
-            room = self.rooms_collection.find_one({'room_number': house_id})
+            # 查找房间信息："<栋号>-<单元>-<房间号>" 或房间号（多楼栋时房间号可能重复，取第一个）
+            parts = house_id.split('-')
+            if len(parts) == 3 and all(part.isdigit() for part in parts):
+                room = self.rooms_collection.find_one(room_filter((int(parts[0]), int(parts[1]), parts[2])))
+            else:
+                room = self.rooms_collection.find_one({'room_number': house_id})
             if not room:
                 # 尝试其他可能的标识符
                 room = self.rooms_collection.find_one({'$or': [
@@ -358,13 +545,14 @@ class DatabaseManager:
                 return None
             
             # 获取该房间的学生信息
-            students = list(self.students_collection.find({'room_number': room['room_number']}))
+            students = list(self.students_collection.find(room_filter(room_doc_key(room))))
             
             # 组装房间详情
             room_detail = {
                 'house_id': room.get('house_id', house_id),
                 'room_number': room['room_number'],
                 'building': room.get('building', ''),
+                'unit': room.get('unit') or 1,
                 'floor': room.get('floor', 0),
                 'room_type': room.get('room_type', ''),
                 'capacity': room.get('capacity', 0),
@@ -406,6 +594,9 @@ class DatabaseManager:
                 logger.info("数据库中暂无房间数据")
                 return None
             
+            # 一次查询获取所有学生并按房间分组，避免逐个房间查询
+            students_by_room = self.get_students_grouped_by_room()
+            
             # 为每个房间添加租户信息（包含标签）
             rooms_with_tags = []
             for room in rooms:
@@ -413,6 +604,7 @@ class DatabaseManager:
                     'house_id': room.get('house_id', room['room_number']),
                     'room_number': room['room_number'],
                     'building': room.get('building', ''),
+                    'unit': room.get('unit') or 1,
                     'floor': room.get('floor', 0),
                     'room_type': room.get('room_type', ''),
                     'capacity': room.get('capacity', 0),
@@ -421,7 +613,7 @@ class DatabaseManager:
                 }
                 
                 # 获取该房间的学生信息
-                students = list(self.students_collection.find({'room_number': room['room_number']}))
+                students = students_by_room.get(room_doc_key(room), [])
                 
                 for student in students:
                     tenant = {
@@ -463,6 +655,137 @@ class DatabaseManager:
             logger.error(f"从数据库获取房间标签数据失败: {e}")
             return None
 
+    def _next_sequence(self, name: str) -> int:
+        """获取自增序列的下一个值"""
+        counter = self.counters_collection.find_one_and_update(
+            {'_id': name},
+            {'$inc': {'seq': 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return counter['seq']
+    
+    def save_layout_snapshot(self, layout: Dict[str, Any]) -> Optional[int]:
+        """
+        保存完整布局快照（物化读模型），并按配置清理旧快照
+        
+        Args:
+            layout: 完整布局数据（房间、带标签的租户、标签统计）
+            
+        Returns:
+            快照版本号，失败时返回None
+        """
+        try:
+            previous = self.layout_snapshots_collection.find_one(
+                {}, {'version': 1, 'layout.rooms': 1}, sort=[('version', DESCENDING)]
+            )
+            
+            version = self._next_sequence('layout_snapshot')
+            created_at = datetime.now()
+            self.layout_snapshots_collection.insert_one({
+                'version': version,
+                'created_at': created_at,
+                'layout': layout
+            })
+            
+            # 只保留最近的若干个快照
+            retention = max(1, Config.LAYOUT_SNAPSHOT_RETENTION)
+            self.layout_snapshots_collection.delete_many({'version': {'$lte': version - retention}})
+            
+            if previous:
+                self._save_layout_changes(previous, version, layout, created_at)
+            
+            logger.info(f"布局快照已保存，版本 {version}")
+            return version
+            
+        except Exception as e:
+            logger.error(f"保存布局快照失败: {e}")
+            return None
+    
+    def _save_layout_changes(self, previous: Dict, version: int, layout: Dict[str, Any], created_at: datetime):
+        """
+        记录相对上一版本受影响的房间号和学号，并按配置裁剪变更日志
+        
+        记录失败只会使日志出现断档，增量查询跨过断档时要求客户端全量刷新
+        """
+        try:
+            changes = summarize_layout_changes(previous.get('layout', {}), layout)
+            self.layout_changes_collection.insert_one({
+                'version': version,
+                'previous_version': previous['version'],
+                'created_at': created_at,
+                'rooms': changes['rooms'],
+                'students': changes['students']
+            })
+            
+            retention = max(1, Config.LAYOUT_CHANGE_LOG_RETENTION)
+            self.layout_changes_collection.delete_many({'version': {'$lte': version - retention}})
+            
+            logger.info(f"布局变更已记录，版本 {version}: 房间 {len(changes['rooms'])} 间，学生 {len(changes['students'])} 人")
+            
+        except Exception as e:
+            logger.error(f"记录布局变更失败: {e}")
+    
+    def get_layout_changes(self, since_version: int, until_version: int) -> Optional[List[Dict]]:
+        """
+        获取指定版本区间内的变更日志
+        
+        Args:
+            since_version: 起始版本（不含）
+            until_version: 结束版本（含）
+            
+        Returns:
+            按版本升序排列的变更记录，失败时返回None
+        """
+        try:
+            cursor = self.layout_changes_collection.find(
+                {'version': {'$gt': since_version, '$lte': until_version}},
+                {'_id': 0, 'version': 1, 'previous_version': 1, 'rooms': 1, 'students': 1}
+            ).sort('version', ASCENDING)
+            return list(cursor)
+        except Exception as e:
+            logger.error(f"获取布局变更日志失败: {e}")
+            return None
+    
+    def get_latest_layout_snapshot(self) -> Optional[Dict]:
+        """获取最新的布局快照"""
+        try:
+            return self.layout_snapshots_collection.find_one({}, sort=[('version', DESCENDING)])
+        except Exception as e:
+            logger.error(f"获取最新布局快照失败: {e}")
+            return None
+    
+    def get_layout_snapshot(self, version: int) -> Optional[Dict]:
+        """获取指定版本的布局快照"""
+        try:
+            return self.layout_snapshots_collection.find_one({'version': version})
+        except Exception as e:
+            logger.error(f"获取布局快照 {version} 失败: {e}")
+            return None
+    
+    def list_layout_snapshots(self) -> List[Dict]:
+        """列出保留的布局快照（仅元数据）"""
+        try:
+            cursor = self.layout_snapshots_collection.find(
+                {},
+                {'version': 1, 'created_at': 1, 'layout.occupied_count': 1, 'layout.total_rooms': 1}
+            ).sort('version', DESCENDING)
+            return list(cursor)
+        except Exception as e:
+            logger.error(f"列出布局快照失败: {e}")
+            return []
+    
+    def ping(self) -> bool:
+        """检查数据库连接是否可用"""
+        try:
+            if not self.client:
+                return False
+            self.client.admin.command('ping')
+            return True
+        except Exception as e:
+            logger.warning(f"数据库ping失败: {e}")
+            return False
+    
     def close(self):
         """关闭数据库连接"""
         if self.client:
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+健康检查模块 - 在后台线程定期执行耗时检查（数据库ping、认证探测），请求路径只读取缓存结果
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """后台刷新的健康状态缓存"""
+
+    def __init__(self, checks: Dict[str, Callable[[], Any]], interval: float):
+        """
+        初始化健康监控
+
+        Args:
+            checks: 检查项名称 -> 检查函数（返回检查结果，抛出异常视为失败）
+            interval: 刷新间隔（秒）
+        """
+        self.checks = checks
+        self.interval = interval
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.last_run_at: Optional[float] = None
+        self.thread: Optional[threading.Thread] = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+    def start(self):
+        """启动后台刷新线程（重复调用无副作用）"""
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._loop, name='health-monitor', daemon=True)
+            self.thread.start()
+        logger.info(f"健康检查已启动，间隔 {self.interval} 秒")
+
+    def stop(self, timeout: float = 5):
+        """停止后台刷新线程"""
+        self.stop_event.set()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout)
+
+    def _loop(self):
+        """刷新主循环"""
+        while not self.stop_event.is_set():
+            self.run_checks()
+            self.stop_event.wait(self.interval)
+
+    def run_checks(self):
+        """执行一轮全部检查"""
+        for name, check in self.checks.items():
+            started = time.perf_counter()
+            try:
+                result = {'ok': True, 'value': check(), 'error': None}
+            except Exception as e:
+                result = {'ok': False, 'value': None, 'error': str(e)}
+                logger.warning(f"健康检查 {name} 失败: {str(e)}")
+            result['duration_ms'] = round((time.perf_counter() - started) * 1000, 3)
+            result['checked_at'] = time.time()
+
+            with self.lock:
+                self.results[name] = result
+
+        with self.lock:
+            self.last_run_at = time.time()
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """获取某项检查的缓存结果，尚未执行时返回None"""
+        with self.lock:
+            return self.results.get(name)
+
+    def state(self) -> Dict[str, Any]:
+        """获取全部缓存结果"""
+        with self.lock:
+            return {
+                'running': bool(self.thread and self.thread.is_alive()),
+                'interval': self.interval,
+                'last_run_at': datetime.fromtimestamp(self.last_run_at).isoformat() if self.last_run_at else None,
+                'checks': {
+                    name: {
+                        'ok': result['ok'],
+                        'value': result['value'],
+                        'error': result['error'],
+                        'duration_ms': result['duration_ms'],
+                        'age': round(time.time() - result['checked_at'], 3)
+                    }
+                    for name, result in self.results.items()
+                }
+            }
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+布局快照缓存模块 - 进程内缓存完整布局数据，过期后先返回旧快照再后台刷新
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from compact_layout import CompactLayout
+from layout_spec import layout_skeleton
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_timestamp(value: Any) -> Optional[float]:
+    """解析布局数据中的ISO时间字符串"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class LayoutSnapshot:
+    """布局快照 - 一份完整布局数据及其生成时间（房间列表以紧凑布局保存）"""
+
+    __slots__ = ('data', 'layout', 'version', 'created_at', 'derived', 'derive_lock')
+
+    def __init__(self, data: Dict[str, Any], version: int, created_at: Optional[float] = None,
+                 previous: Optional['LayoutSnapshot'] = None):
+        """
+        初始化布局快照
+
+        Args:
+            data: generate_complete_layout 返回的完整布局数据
+            version: 快照版本号（数据库物化快照的版本，数据库不可用时为进程内计数）
+            created_at: 快照生成时间（Unix时间戳），默认为当前时间
+            previous: 上一个快照，未变化的房间复用其记录
+        """
+        # 骨架中的共享空房间直接使用预先构建的记录
+        self.layout = CompactLayout(data.get('rooms', []), previous.layout if previous else None,
+                                    layout_skeleton.vacant_records)
+        # 除房间列表外的布局字段（统计、时间戳、版本等）
+        self.data = {key: value for key, value in data.items() if key != 'rooms'}
+        self.version = version
+        self.created_at = created_at if created_at is not None else time.time()
+        self.derived: Dict[Any, Any] = {}
+        self.derive_lock = threading.Lock()
+
+    def rooms(self) -> List[Dict[str, Any]]:
+        """还原完整房间列表（每次调用生成新列表，需要重复使用时请通过 derive 缓存）"""
+        return self.layout.to_dicts()
+
+    def age(self) -> float:
+        """快照年龄（秒）"""
+        return max(0.0, time.time() - self.created_at)
+
+    def derive(self, key: Any, factory: Callable[[], Any]) -> Any:
+        """
+        获取基于本快照计算的派生数据（如序列化后的响应），每个版本只计算一次
+
+        Args:
+            key: 派生数据键
+            factory: 计算派生数据的函数
+
+        Returns:
+            派生数据
+        """
+        try:
+            return self.derived[key]
+        except KeyError:
+            pass
+
+        with self.derive_lock:
+            if key not in self.derived:
+                self.derived[key] = factory()
+            return self.derived[key]
+
+
+class LayoutSnapshotCache:
+    """布局快照缓存 - TTL 过期后返回旧快照并在后台重新验证（stale-while-revalidate）"""
+
+    def __init__(self, loader: Callable[[], Optional[Dict[str, Any]]], ttl: float):
+        """
+        初始化快照缓存
+
+        Args:
+            loader: 加载完整布局数据的函数
+            ttl: 快照有效期（秒）
+        """
+        self.loader = loader
+        self.ttl = ttl
+        self.snapshot: Optional[LayoutSnapshot] = None
+        self.version = 0
+        self.stale = False
+        self.revalidating = False
+        # 由后台同步调度器负责刷新时关闭，读取路径只返回现有快照
+        self.auto_revalidate = True
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()
+        # 快照更新监听器，参数为 (旧快照, 新快照)
+        self.listeners: List[Callable[[Optional[LayoutSnapshot], LayoutSnapshot], None]] = []
+
+        # 命中统计
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.errors = 0
+
+    def _is_fresh(self, snapshot: LayoutSnapshot) -> bool:
+        """判断快照是否仍在有效期内"""
+        return not self.stale and snapshot.age() < self.ttl
+
+    def get(self) -> Optional[LayoutSnapshot]:
+        """
+        获取布局快照
+
+        - 快照新鲜：直接返回（命中）
+        - 快照过期：立即返回旧快照，并启动后台刷新
+        - 没有快照：同步加载（未命中）
+
+        Returns:
+            布局快照，加载失败时返回None
+        """
+        start_revalidate = False
+
+        with self.lock:
+            snapshot = self.snapshot
+            if snapshot is None:
+                self.misses += 1
+            elif self._is_fresh(snapshot):
+                self.hits += 1
+                return snapshot
+            else:
+                self.stale_hits += 1
+                if self.auto_revalidate and not self.revalidating:
+                    self.revalidating = True
+                    start_revalidate = True
+
+        if snapshot is None:
+            return self._load(force=False)
+
+        if start_revalidate:
+            threading.Thread(target=self._revalidate, name='layout-revalidate', daemon=True).start()
+
+        return snapshot
+
+    def add_listener(self, listener: Callable[[Optional[LayoutSnapshot], LayoutSnapshot], None]):
+        """
+        注册快照更新监听器（每次写入新快照后调用）
+
+        Args:
+            listener: 回调函数，参数为 (旧快照, 新快照)
+        """
+        self.listeners.append(listener)
+
+    def peek(self) -> Optional[LayoutSnapshot]:
+        """返回当前快照，不触发加载也不计入命中统计"""
+        return self.snapshot
+
+    def refresh(self) -> Optional[LayoutSnapshot]:
+        """
+        强制重新加载快照
+
+        Returns:
+            新快照，加载器未返回数据时返回None
+        """
+        return self._load(force=True)
+
+    def warm_up(self):
+        """尚无快照时在后台加载一次，立即返回（已有快照或正在加载时不重复启动）"""
+        with self.lock:
+            if self.snapshot is not None or self.revalidating:
+                return
+            self.revalidating = True
+        threading.Thread(target=self._revalidate, name='layout-warm-up', daemon=True).start()
+
+    def put(self, data: Dict[str, Any], created_at: Optional[float] = None) -> LayoutSnapshot:
+        """
+        写入新快照
+
+        Args:
+            data: 完整布局数据，带 version 时沿用该版本号
+            created_at: 快照生成时间，默认取布局数据的 timestamp
+
+        Returns:
+            当前快照（传入数据版本比现有快照旧时保持不变）
+        """
+        if created_at is None:
+            created_at = _parse_timestamp(data.get('timestamp'))
+
+        version = data.get('version')
+        with self.lock:
+            current = self.snapshot
+        if version is not None and current is not None and version < current.version:
+            logger.info(f"忽略旧版本布局快照 {version}（当前版本 {current.version}）")
+            return current
+
+        # 在锁外构建快照（房间多时需要较长时间），构建期间读取方照常拿到当前快照
+        snapshot = LayoutSnapshot(data, version if version is not None else 0, created_at, current)
+
+        with self.lock:
+            # 构建期间可能已写入更新的快照，重新检查版本后再替换
+            previous = self.snapshot
+            if version is None:
+                snapshot.version = self.version + 1
+            elif previous is not None and version < previous.version:
+                logger.info(f"忽略旧版本布局快照 {version}（当前版本 {previous.version}）")
+                return previous
+
+            self.version = max(self.version, snapshot.version)
+            self.snapshot = snapshot
+            self.stale = False
+
+        for listener in self.listeners:
+            try:
+                listener(previous, snapshot)
+            except Exception as e:
+                logger.error(f"快照更新监听器执行失败: {str(e)}")
+
+        return snapshot
+
+    def invalidate(self):
+        """将当前快照标记为过期，下次读取时触发后台刷新"""
+        with self.lock:
+            self.stale = True
+
+    def _load(self, force: bool) -> Optional[LayoutSnapshot]:
+        """加载快照，同一时间只允许一个加载过程"""
+        requested_at = time.time()
+
+        with self.load_lock:
+            # 等待锁期间其他线程可能已完成加载
+            with self.lock:
+                snapshot = self.snapshot
+                if snapshot is not None and snapshot.created_at >= requested_at:
+                    return snapshot
+                if not force and snapshot is not None and self._is_fresh(snapshot):
+                    return snapshot
+
+            data = self.loader()
+            if not data:
+                logger.warning("布局加载器未返回数据，保留现有快照")
+                return None
+
+            snapshot = self.put(data)
+            logger.info(f"布局快照已更新，版本 {snapshot.version}")
+            return snapshot
+
+    def _revalidate(self):
+        """后台刷新过期快照"""
+        try:
+            if self._load(force=True):
+                with self.lock:
+                    self.revalidations += 1
+        except Exception as e:
+            with self.lock:
+                self.errors += 1
+            logger.error(f"后台刷新布局快照失败: {str(e)}")
+        finally:
+            with self.lock:
+                self.revalidating = False
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self.lock:
+            snapshot = self.snapshot
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'hit_ratio': round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+                'revalidations': self.revalidations,
+                'errors': self.errors,
+                'ttl': self.ttl,
+                'version': snapshot.version if snapshot else None,
+                'snapshot_age': round(snapshot.age(), 3) if snapshot else None,
+                'stale': self.stale,
+                'auto_revalidate': self.auto_revalidate,
+                'revalidating': self.revalidating
+            }
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+布局定义模块 - 将声明式的楼栋布局定义编译为带索引的房间骨架
+
+布局定义示例（见 Config.LAYOUT_SPEC）:
+    {
+        'house_name_template': '之寓·未来-{building}栋-{unit}单元-{room_number}',
+        'buildings': [{
+            'building': 'A4',
+            'units': [{
+                'unit': 1,
+                'floors': [
+                    {'floors': '1', 'rooms': '1-10', 'gaps': {6: 2}},
+                    {'floors': '2-20', 'rooms': '1-12'}
+                ]
+            }]
+        }]
+    }
+
+骨架只编译一次：房间按 (楼栋, 单元, 楼层, 房间序号) 预先排好序，并按房间名称各部分建立索引。
+空房间数据也在编译时生成并在所有布局之间共享（只读，不得修改），
+生成布局时只把已入住房间覆盖到对应位置，耗时与已入住房间数成正比
+"""
+
+import json
+import logging
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from compact_layout import RoomRecord
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOUSE_NAME_TEMPLATE = '之寓·未来-{building}栋-{unit}单元-{room_number}'
+DEFAULT_ROOM_NUMBER_FORMAT = '{floor}{room:02d}'
+
+
+class RoomSlot(NamedTuple):
+    """骨架中的一个房间位置"""
+    building_code: str  # 房间名称中的栋号写法，如 "A4"
+    building: int  # 栋号数字（布局数据中的 building 字段）
+    unit: int
+    floor: int
+    room_in_floor: int
+    room_number: str
+    house_name: str
+    gap_after: int  # 该房间之后的通道格数
+
+
+def parse_range(value: Union[str, int, List[int]]) -> List[int]:
+    """
+    解析编号范围
+
+    Args:
+        value: "1-12"、"1,3,5-7"、单个整数或整数列表
+
+    Returns:
+        编号列表（保持书写顺序）
+    """
+    if isinstance(value, int):
+        return [value]
+    if isinstance(value, (list, tuple)):
+        return [int(item) for item in value]
+
+    numbers = []
+    for part in str(value).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = (int(item) for item in part.split('-', 1))
+            if end < start:
+                raise ValueError(f"编号范围无效: {part}")
+            numbers.extend(range(start, end + 1))
+        else:
+            numbers.append(int(part))
+    return numbers
+
+
+def building_number(code: str) -> Optional[int]:
+    """从栋号写法中提取数字（"A4" -> 4），没有数字时返回None"""
+    digits = re.search(r'\d+', code)
+    return int(digits.group()) if digits else None
+
+
+class LayoutSkeleton:
+    """编译后的布局骨架"""
+
+    def __init__(self, spec: Dict[str, Any]):
+        """
+        编译布局定义
+
+        Args:
+            spec: 布局定义
+
+        Raises:
+            ValueError: 布局定义无效（缺少楼栋、房间重复等）
+        """
+        self.house_name_template = spec.get('house_name_template', DEFAULT_HOUSE_NAME_TEMPLATE)
+        self.slots: Tuple[RoomSlot, ...] = ()
+        slots: List[RoomSlot] = []
+        # (栋号数字, 单元, 房间号) -> 骨架位置
+        self.index: Dict[Tuple[int, int, str], int] = {}
+        # (栋号数字, 房间号) -> 骨架位置，同一楼栋不同单元房间号重复时不建立
+        self.building_index: Dict[Tuple[int, str], Optional[int]] = {}
+        # 栋号写法 -> 栋号数字
+        self.building_codes: Dict[str, int] = {}
+        self.buildings: List[Dict[str, Any]] = []
+
+        buildings = spec.get('buildings') or []
+        if not buildings:
+            raise ValueError("布局定义中没有楼栋")
+
+        for building_spec in buildings:
+            self._compile_building(building_spec, slots)
+        self.slots = tuple(slots)
+        # 单楼栋单元时房间号、楼层号本身即可区分房间和楼层
+        self.single_unit = len(self.buildings) == 1 and len(self.buildings[0]['units']) == 1
+
+        # 预先生成的空房间（按骨架顺序，所有布局共享同一份）
+        self.vacant_rooms: Tuple[Dict[str, Any], ...] = tuple(self.create_empty_room(slot) for slot in self.slots)
+        # 空房间字典 id -> 紧凑记录，各版本快照中的空房间共用同一记录（字典常驻内存，id 不会被复用）
+        self.vacant_records: Dict[int, RoomRecord] = {id(room): RoomRecord(room) for room in self.vacant_rooms}
+        self.info = self._build_layout_info()
+
+        # 定义之外的楼栋（如 "A5"）也能解析，便于照常保存到数据库，只是不出现在布局中
+        codes = '|'.join(re.escape(code) for code in sorted(self.building_codes, key=len, reverse=True))
+        self.house_name_pattern = re.compile(
+            re.escape(self.house_name_template)
+            .replace(re.escape('{building}'), f'({codes}|[A-Za-z]*\\d+)')
+            .replace(re.escape('{unit}'), r'(\d+)')
+            .replace(re.escape('{room_number}'), r'(\d+)')
+        )
+
+        logger.info(f"布局骨架编译完成: {len(self.buildings)} 栋，{len(self.slots)} 个房间")
+
+    def _compile_building(self, building_spec: Dict[str, Any], slots: List[RoomSlot]):
+        """编译一栋楼"""
+        code = str(building_spec['building'])
+        number = building_spec.get('number', building_number(code))
+        if number is None:
+            raise ValueError(f"楼栋 {code} 缺少栋号数字（number）")
+        if code in self.building_codes:
+            raise ValueError(f"楼栋 {code} 重复定义")
+        self.building_codes[code] = number
+
+        room_number_format = building_spec.get('room_number_format', DEFAULT_ROOM_NUMBER_FORMAT)
+        summary = {'building': code, 'number': number, 'units': []}
+
+        for unit_spec in building_spec.get('units') or [{'unit': 1, 'floors': building_spec.get('floors', [])}]:
+            unit = int(unit_spec.get('unit', 1))
+            floors: Dict[int, Dict[str, Any]] = {}
+
+            for floor_spec in unit_spec.get('floors', []):
+                room_numbers = parse_range(floor_spec['rooms'])
+                gaps = {int(room): int(width) for room, width in (floor_spec.get('gaps') or {}).items()}
+                for floor in parse_range(floor_spec['floors']):
+                    if floor in floors:
+                        raise ValueError(f"楼栋 {code} {unit}单元 {floor}楼重复定义")
+                    floors[floor] = {'rooms': room_numbers, 'gaps': gaps}
+
+            for floor in sorted(floors):
+                rooms = floors[floor]['rooms']
+                gaps = floors[floor]['gaps']
+                for room_in_floor in sorted(rooms):
+                    room_number = room_number_format.format(floor=floor, room=room_in_floor)
+                    self._add_slot(slots, RoomSlot(
+                        building_code=code,
+                        building=number,
+                        unit=unit,
+                        floor=floor,
+                        room_in_floor=room_in_floor,
+                        room_number=room_number,
+                        house_name=self.house_name_template.format(building=code, unit=unit, room_number=room_number),
+                        gap_after=gaps.get(room_in_floor, 0)
+                    ))
+
+            summary['units'].append({
+                'unit': unit,
+                'floors': [
+                    {
+                        'floor': floor,
+                        'rooms': len(floors[floor]['rooms']),
+                        'gaps': [{'after': room, 'width': width} for room, width in sorted(floors[floor]['gaps'].items())]
+                    }
+                    for floor in sorted(floors)
+                ]
+            })
+
+        self.buildings.append(summary)
+
+    def _add_slot(self, slots: List[RoomSlot], slot: RoomSlot):
+        """登记一个房间位置"""
+        key = (slot.building, slot.unit, slot.room_number)
+        if key in self.index:
+            raise ValueError(f"房间重复定义: {slot.house_name}")
+
+        position = len(slots)
+        slots.append(slot)
+        self.index[key] = position
+
+        building_key = (slot.building, slot.room_number)
+        self.building_index[building_key] = None if building_key in self.building_index else position
+
+    def find(self, building: Any, room_number: Any, unit: Any = None) -> Optional[int]:
+        """
+        查找房间在骨架中的位置
+
+        Args:
+            building: 栋号数字
+            room_number: 房间号
+            unit: 单元号，未知时按楼栋内唯一的房间号查找
+
+        Returns:
+            骨架位置，不在布局定义中时返回None
+        """
+        try:
+            if unit is not None:
+                return self.index.get((int(building), int(unit), str(room_number)))
+            return self.building_index.get((int(building), str(room_number)))
+        except (TypeError, ValueError):
+            return None
+
+    def parse_house_name(self, house_name: str) -> Optional[Dict[str, Any]]:
+        """
+        按布局定义中的楼栋解析房间名称
+
+        Args:
+            house_name: 房间名称，如 "之寓·未来-A4栋-1单元-107"
+
+        Returns:
+            解析后的房间信息（包括定义之外楼栋的房间），无法解析或栋号与已定义楼栋冲突时返回None
+        """
+        match = self.house_name_pattern.match(house_name)
+        if not match:
+            return None
+
+        code, unit, room_number = match.group(1), int(match.group(2)), match.group(3)
+        number = self.building_codes.get(code)
+        if number is None:
+            number = building_number(code)
+            # 布局和数据库只按栋号数字区分楼栋，"B4" 会与已定义的 "A4" 混在一起
+            if number in self.building_codes.values():
+                logger.warning(f"楼栋 {code} 不在布局定义中且栋号与已定义楼栋冲突，已忽略: {house_name}")
+                return None
+        position = self.index.get((number, unit, room_number))
+        if position is not None:
+            slot = self.slots[position]
+            floor, room_in_floor = slot.floor, slot.room_in_floor
+        else:
+            # 定义之外的房间号按默认编号规则推断楼层
+            floor = int(room_number[:-2]) if len(room_number) >= 3 and room_number[:-2] else 1
+            room_in_floor = int(room_number[-2:])
+
+        return {
+            'building': number,
+            'unit': unit,
+            'floor': floor,
+            'room_number': room_number,
+            'room_in_floor': room_in_floor
+        }
+
+    def house_name(self, building: Any, unit: Any, room_number: Any) -> str:
+        """按名称模板生成房间名称（building 为栋号数字，定义之外的楼栋直接使用数字作栋号）"""
+        code = next((code for code, number in self.building_codes.items() if number == building), building)
+        return self.house_name_template.format(building=code, unit=unit, room_number=room_number)
+
+    def empty_room_id(self, slot: RoomSlot) -> str:
+        """空房间的合成ID（单楼栋单元时保持 empty_<楼层>_<序号> 格式）"""
+        if self.single_unit:
+            return f"empty_{slot.floor}_{slot.room_in_floor}"
+        return f"empty_{slot.building}_{slot.unit}_{slot.floor}_{slot.room_in_floor}"
+
+    def floor_key(self, room: Any) -> Any:
+        """
+        楼层分组键
+
+        Args:
+            room: 房间数据（字典或紧凑布局记录，需包含 building / unit / floor）
+
+        Returns:
+            单楼栋单元时为楼层号，否则为 "<栋号>-<单元>-<楼层>"（不同楼栋的同号楼层分开）
+        """
+        if self.single_unit:
+            return room.get('floor')
+        return f"{room.get('building')}-{room.get('unit')}-{room.get('floor')}"
+
+    def room_key(self, room: Any) -> Any:
+        """
+        房间键（变更对比、变更日志使用）
+
+        Args:
+            room: 房间数据（字典或紧凑布局记录，需包含 building / unit / room_number）
+
+        Returns:
+            单楼栋单元时为房间号，否则为 "<栋号>-<单元>-<房间号>"
+        """
+        if self.single_unit:
+            return room.get('room_number')
+        return f"{room.get('building')}-{room.get('unit')}-{room.get('room_number')}"
+
+    def build_rooms(self, occupied_rooms: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        将已入住房间覆盖到骨架上（空房间直接引用共享数据，不复制；结果已按骨架顺序排好）
+
+        Args:
+            occupied_rooms: 已入住房间列表
+
+        Returns:
+            (骨架中全部房间, 有租户的房间数)
+        """
+        rooms = list(self.vacant_rooms)
+        occupied_count = 0
+        unplaced = 0
+        for room in occupied_rooms:
+            position = self.find(room.get('building'), room.get('room_number'), room.get('unit'))
+            if position is None:
+                unplaced += 1
+                continue
+
+            # 同一房间出现多次时以最后一次为准
+            previous = rooms[position]
+            if previous is not self.vacant_rooms[position] and previous.get('tenants'):
+                occupied_count -= 1
+            rooms[position] = room
+            if room.get('tenants'):
+                occupied_count += 1
+
+        if unplaced:
+            logger.warning(f"{unplaced} 个已入住房间不在布局定义中，未显示")
+
+        return rooms, occupied_count
+
+    def create_empty_room(self, slot: RoomSlot) -> Dict[str, Any]:
+        """创建空房间数据"""
+        return {
+            'house_id': self.empty_room_id(slot),
+            'house_name': slot.house_name,
+            'building': slot.building,
+            'unit': slot.unit,
+            'floor': slot.floor,
+            'room_in_floor': slot.room_in_floor,
+            'room_number': slot.room_number,
+            'tenants': [],
+            'main_tenant': None,
+            'co_tenants': [],
+            'is_vacant': True
+        }
+
+    def layout_info(self) -> Dict[str, Any]:
+        """布局概要（编译时生成，只读）"""
+        return self.info
+
+    def _build_layout_info(self) -> Dict[str, Any]:
+        """生成布局概要（首栋楼保留原有字段，buildings 为全部楼栋的楼层与通道定义）"""
+        first = self.buildings[0]
+        first_floors = first['units'][0]['floors'] if first['units'] else []
+        return {
+            'building': f"{first['building']}栋",
+            'floors': len(first_floors),
+            'floor_1_rooms': first_floors[0]['rooms'] if first_floors else 0,
+            'regular_floor_rooms': max((floor['rooms'] for floor in first_floors), default=0),
+            'total_designed_rooms': len(self.slots),
+            'buildings': self.buildings
+        }
+
+
+def load_layout_spec() -> Dict[str, Any]:
+    """读取布局定义：设置了 LAYOUT_SPEC_FILE 时从文件读取，否则使用 Config.LAYOUT_SPEC"""
+    if Config.LAYOUT_SPEC_FILE:
+        try:
+            with open(Config.LAYOUT_SPEC_FILE, 'r', encoding='utf-8') as f:
+                spec = json.load(f)
+            logger.info(f"已加载布局定义文件: {Config.LAYOUT_SPEC_FILE}")
+            return spec
+        except Exception as e:
+            logger.error(f"加载布局定义文件失败，使用默认布局: {str(e)}")
+    return Config.LAYOUT_SPEC
+
+
+# 全局布局骨架（进程启动时编译一次）
+layout_skeleton = LayoutSkeleton(load_layout_spec())
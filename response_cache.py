@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+响应序列化模块 - 快速序列化布局数据，并按快照版本缓存序列化及压缩后的响应字节
+"""
+
+import gzip
+import json
+import logging
+import uuid
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 尝试导入 orjson（原生支持 datetime，比标准库快一个数量级）
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    logging.warning("orjson不可用，将使用标准库json序列化响应")
+
+# 尝试导入 brotli（压缩率优于gzip，不可用时只提供gzip）
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+    logging.warning("brotli不可用，响应压缩仅支持gzip")
+
+# 支持的压缩编码，按优先级排列
+SUPPORTED_ENCODINGS = ('br', 'gzip') if BROTLI_AVAILABLE else ('gzip',)
+
+# 字段投影中始终保留的房间字段（前端按楼栋、单元、房间号定位卡片，按楼层分组）
+ALWAYS_INCLUDED_FIELDS = ('room_number', 'floor', 'building', 'unit')
+
+# 单次投影允许的最大字段数
+MAX_PROJECTION_FIELDS = 50
+
+
+# 进程启动标识：快照版本不来自数据库时，用于区分不同进程生成的同号版本
+BOOT_ID = uuid.uuid4().hex[:8]
+
+
+def convert_objectid(obj):
+    """递归转换ObjectId为字符串"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    elif isinstance(obj, dict):
+        return {key: convert_objectid(value) for key, value in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_objectid(item) for item in obj]
+    else:
+        return obj
+
+
+def _default(obj: Any) -> Any:
+    """序列化 JSON 不支持的类型"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"无法序列化类型: {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    序列化为UTF-8编码的JSON字节
+
+    直接处理 ObjectId 和 datetime，无需预先递归转换
+
+    Args:
+        obj: 待序列化对象
+
+    Returns:
+        JSON字节
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def snapshot_json(snapshot, key: str, build_payload) -> bytes:
+    """
+    获取快照对应的预序列化响应字节，每个快照版本只序列化一次
+
+    Args:
+        snapshot: 布局快照
+        key: 响应键（通常为接口名）
+        build_payload: 根据快照构建响应内容的函数
+
+    Returns:
+        JSON字节
+    """
+    return snapshot.derive(('json', key), lambda: dumps(build_payload(snapshot)))
+
+
+def parse_fields(value: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    解析 fields 查询参数为投影规则（语义与MongoDB包含式投影一致）
+
+    例如 "house_name,tenants.tenant_name,tenants.tag" 解析为
+    {'house_name': True, 'tenants': {'tenant_name': True, 'tag': True}, 'room_number': True, 'floor': True,
+     'building': True, 'unit': True}
+
+    Args:
+        value: 逗号分隔的字段列表，嵌套字段用点号连接
+
+    Returns:
+        投影规则，未指定字段时返回None（返回完整数据）
+    """
+    if not value:
+        return None
+
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    if not names:
+        return None
+    if len(names) > MAX_PROJECTION_FIELDS:
+        raise ValueError(f"字段数不能超过 {MAX_PROJECTION_FIELDS} 个")
+
+    spec: Dict[str, Any] = {}
+    for name in names + list(ALWAYS_INCLUDED_FIELDS):
+        node = spec
+        parts = name.split('.')
+        for part in parts[:-1]:
+            child = node.get(part)
+            if child is True:
+                break
+            node = node.setdefault(part, {})
+        else:
+            # 整个字段优先于其子字段
+            node[parts[-1]] = True
+    return spec
+
+
+def fields_key(spec: Optional[Dict[str, Any]]) -> str:
+    """投影规则的规范化字符串，用作缓存键"""
+    if not spec:
+        return ''
+    parts = []
+    for key in sorted(spec):
+        value = spec[key]
+        parts.append(key if value is True else f"{key}({fields_key(value)})")
+    return ','.join(parts)
+
+
+def project(doc: Dict[str, Any], spec: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    按投影规则裁剪文档，嵌套字段对列表中的每个元素生效
+
+    Args:
+        doc: 原始文档（不会被修改）
+        spec: parse_fields 返回的投影规则，None表示不裁剪
+
+    Returns:
+        裁剪后的文档
+    """
+    if spec is None:
+        return doc
+
+    result = {}
+    for key, sub_spec in spec.items():
+        if key not in doc:
+            continue
+        value = doc[key]
+        if sub_spec is True or value is None:
+            result[key] = value
+        elif isinstance(value, list):
+            result[key] = [project(item, sub_spec) for item in value if isinstance(item, dict)]
+        elif isinstance(value, dict):
+            result[key] = project(value, sub_spec)
+    return result
+
+
+def project_rooms(rooms: List[Dict[str, Any]], spec: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """按投影规则裁剪房间列表"""
+    if spec is None:
+        return rooms
+    return [project(room, spec) for room in rooms]
+
+
+def negotiate_encoding(accept_encodings) -> Optional[str]:
+    """
+    根据 Accept-Encoding 选择压缩编码
+
+    Args:
+        accept_encodings: 请求的 Accept-Encoding（werkzeug Accept 对象）
+
+    Returns:
+        压缩编码（br/gzip），客户端不支持压缩时返回None
+    """
+    best_encoding = None
+    best_quality = 0
+    for encoding in SUPPORTED_ENCODINGS:
+        quality = accept_encodings.quality(encoding)
+        if quality > best_quality:
+            best_encoding = encoding
+            best_quality = quality
+    return best_encoding
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """
+    按指定编码压缩数据
+
+    Args:
+        data: 原始字节
+        encoding: 压缩编码（br/gzip）
+
+    Returns:
+        压缩后的字节
+    """
+    if encoding == 'br':
+        return brotli.compress(data, quality=Config.BROTLI_QUALITY)
+    if encoding == 'gzip':
+        # 固定mtime，保证同一快照多次压缩结果一致
+        return gzip.compress(data, compresslevel=Config.GZIP_LEVEL, mtime=0)
+    raise ValueError(f"不支持的压缩编码: {encoding}")
+
+
+def snapshot_body(snapshot, key: str, build_payload, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """
+    获取快照对应的响应字节，按需返回预压缩版本（每个快照版本每种编码只压缩一次）
+
+    Args:
+        snapshot: 布局快照
+        key: 响应键（通常为接口名）
+        build_payload: 根据快照构建响应内容的函数
+        encoding: 协商得到的压缩编码，None表示不压缩
+
+    Returns:
+        (响应字节, 实际使用的压缩编码)，响应过小时不压缩，编码为None
+    """
+    body = snapshot_json(snapshot, key, build_payload)
+    if encoding is None or len(body) < Config.COMPRESSION_MIN_SIZE:
+        return body, None
+    return snapshot.derive((encoding, key), lambda: compress(body, encoding)), encoding
+
+
+def snapshot_etag(snapshot, key: str, encoding: Optional[str] = None) -> str:
+    """
+    生成快照响应的强ETag（不含引号）
+
+    Args:
+        snapshot: 布局快照
+        key: 响应键，同一版本下不同接口/资源的ETag互不相同
+        encoding: 响应的压缩编码，不同编码的响应字节不同，ETag也不同
+
+    Returns:
+        ETag值
+    """
+    if 'version' in snapshot.data:
+        etag = f"v{snapshot.version}-{key}"
+    else:
+        etag = f"v{BOOT_ID}.{snapshot.version}-{key}"
+    return f"{etag}-{encoding}" if encoding else etag
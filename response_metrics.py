@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+响应统计模块 - 按接口记录响应大小（压缩前/后）与处理耗时
+"""
+
+import threading
+from collections import Counter, deque
+from typing import Any, Dict, Optional
+
+
+def _percentile(sorted_values, percent: float) -> float:
+    """计算已排序序列的百分位数"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(percent / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class EndpointMetrics:
+    """单个接口的响应统计"""
+
+    def __init__(self, window: int):
+        self.requests = 0
+        self.not_modified = 0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.sent_bytes = 0
+        self.raw_bytes = 0
+        self.encodings = Counter()
+        # 最近的耗时样本，用于计算百分位数
+        self.durations = deque(maxlen=window)
+
+    def report(self) -> Dict[str, Any]:
+        """生成统计报告"""
+        durations = sorted(self.durations)
+        requests = self.requests or 1
+        return {
+            'requests': self.requests,
+            'not_modified': self.not_modified,
+            'avg_ms': round(self.total_duration / requests * 1000, 3),
+            'p50_ms': round(_percentile(durations, 50) * 1000, 3),
+            'p95_ms': round(_percentile(durations, 95) * 1000, 3),
+            'max_ms': round(self.max_duration * 1000, 3),
+            'avg_raw_bytes': round(self.raw_bytes / requests),
+            'avg_sent_bytes': round(self.sent_bytes / requests),
+            'compression_ratio': round(self.sent_bytes / self.raw_bytes, 4) if self.raw_bytes else None,
+            'encodings': dict(self.encodings)
+        }
+
+
+class ResponseMetrics:
+    """按接口汇总的响应统计"""
+
+    def __init__(self, window: int = 500):
+        """
+        初始化响应统计
+
+        Args:
+            window: 每个接口保留的耗时样本数
+        """
+        self.window = window
+        self.endpoints: Dict[str, EndpointMetrics] = {}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint: str, duration: float, status: int, sent_bytes: int,
+               raw_bytes: Optional[int] = None, encoding: Optional[str] = None):
+        """
+        记录一次响应
+
+        Args:
+            endpoint: 接口名
+            duration: 处理耗时（秒）
+            status: HTTP状态码
+            sent_bytes: 实际发送的响应体字节数
+            raw_bytes: 压缩前的响应体字节数，默认与发送字节数相同
+            encoding: 响应的压缩编码，None表示未压缩
+        """
+        with self.lock:
+            metrics = self.endpoints.get(endpoint)
+            if metrics is None:
+                metrics = self.endpoints[endpoint] = EndpointMetrics(self.window)
+
+            metrics.requests += 1
+            if status == 304:
+                metrics.not_modified += 1
+            metrics.total_duration += duration
+            metrics.max_duration = max(metrics.max_duration, duration)
+            metrics.durations.append(duration)
+            metrics.sent_bytes += sent_bytes
+            metrics.raw_bytes += raw_bytes if raw_bytes is not None else sent_bytes
+            metrics.encodings[encoding or 'identity'] += 1
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """获取各接口的统计报告"""
+        with self.lock:
+            return {endpoint: metrics.report() for endpoint, metrics in sorted(self.endpoints.items())}
+
+    def reset(self):
+        """清空统计"""
+        with self.lock:
+            self.endpoints.clear()
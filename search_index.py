@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+搜索索引模块 - 每个布局快照构建一次的内存搜索索引
+
+- 房间号：前缀树
+- 租户姓名：精确/前缀（有序数组二分查找）+ 单字/双字 n-gram 子串匹配
+- 姓名拼音：全拼和首字母前缀（需要 pypinyin，可选）
+- 手机号：后缀索引（反转后的有序数组二分查找）
+- 房间号、手机号任意位置子串：三字 n-gram 倒排列表
+
+结果按匹配类型打分排序，逐级惰性取出，只处理当前页需要的结果。
+索引由 SearchIndexBuilder 在快照更新后于后台线程构建，搜索字段未变化（如只修改了标签）时复用上一版本的索引结构
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 尝试导入 pypinyin（支持按拼音和首字母搜索姓名）
+try:
+    from pypinyin import lazy_pinyin
+    PYPINYIN_AVAILABLE = True
+except ImportError:
+    PYPINYIN_AVAILABLE = False
+    logging.warning("pypinyin不可用，搜索将不支持拼音和首字母")
+
+# 匹配类型得分，按得分从高到低依次取结果
+SCORE_ROOM_EXACT = 100
+SCORE_MOBILE_EXACT = 95
+SCORE_NAME_EXACT = 90
+SCORE_ROOM_PREFIX = 80
+SCORE_NAME_PREFIX = 70
+SCORE_MOBILE_SUFFIX = 65
+SCORE_PINYIN_PREFIX = 60
+SCORE_INITIALS_PREFIX = 55
+SCORE_NAME_SUBSTRING = 50
+SCORE_ROOM_SUBSTRING = 48
+SCORE_MOBILE_SUBSTRING = 45
+
+# 有序数组前缀查找的上界哨兵
+_MAX_CHAR = '\U0010ffff'
+
+
+@lru_cache(maxsize=200000)
+def name_pinyin(name: str) -> Tuple[str, str]:
+    """
+    获取姓名的全拼和首字母（跨快照缓存，姓名不变时无需重复转换）
+
+    Args:
+        name: 姓名
+
+    Returns:
+        (全拼, 首字母)，pypinyin不可用时均为空字符串
+    """
+    if not PYPINYIN_AVAILABLE or not name:
+        return '', ''
+    syllables = [syllable.lower() for syllable in lazy_pinyin(name) if syllable.strip()]
+    return ''.join(syllables), ''.join(syllable[0] for syllable in syllables)
+
+
+class PrefixTrie:
+    """前缀树 - 每个节点保存子树内的全部条目（按插入顺序），查询耗时只与前缀长度有关"""
+
+    __slots__ = ('root',)
+
+    def __init__(self):
+        # 节点结构: (子节点字典, 条目列表)
+        self.root: Tuple[Dict[str, Any], List[int]] = ({}, [])
+
+    def insert(self, key: str, item: int):
+        """插入键及其条目"""
+        node = self.root
+        for char in key:
+            node = node[0].setdefault(char, ({}, []))
+            node[1].append(item)
+
+    def lookup(self, prefix: str) -> List[int]:
+        """返回以 prefix 开头的全部条目"""
+        node = self.root
+        for char in prefix:
+            node = node[0].get(char)
+            if node is None:
+                return []
+        return node[1]
+
+
+class SortedPrefixIndex:
+    """有序数组前缀索引 - 二分查找定位以某前缀开头的键区间"""
+
+    __slots__ = ('keys', 'items')
+
+    def __init__(self, pairs: List[Tuple[str, int]]):
+        pairs = sorted(pair for pair in pairs if pair[0])
+        self.keys = [key for key, _ in pairs]
+        self.items = [item for _, item in pairs]
+
+    def exact(self, key: str) -> Iterator[int]:
+        """键完全相等的条目"""
+        index = bisect_left(self.keys, key)
+        while index < len(self.keys) and self.keys[index] == key:
+            yield self.items[index]
+            index += 1
+
+    def prefix(self, prefix: str) -> Iterator[int]:
+        """以 prefix 开头的条目（按键排序）"""
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + _MAX_CHAR, start)
+        for index in range(start, end):
+            yield self.items[index]
+
+
+class SubstringIndex:
+    """子串索引 - 三字 n-gram 倒排列表；不足三个字符的查询按顺序扫描（短查询命中多，取满一页即停止）"""
+
+    __slots__ = ('texts', 'grams')
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.grams: Dict[str, List[int]] = {}
+        for item, text in enumerate(texts):
+            for gram in {text[i:i + 3] for i in range(len(text) - 2)}:
+                self.grams.setdefault(gram, []).append(item)
+
+    def search(self, query: str) -> Iterator[int]:
+        """包含 query 的条目（按插入顺序）"""
+        if len(query) < 3:
+            for item, text in enumerate(self.texts):
+                if query in text:
+                    yield item
+            return
+
+        postings = [self.grams.get(query[i:i + 3]) for i in range(len(query) - 2)]
+        if not all(postings):
+            return
+        for item in min(postings, key=len):
+            if query in self.texts[item]:
+                yield item
+
+
+def _sort_rooms(rooms) -> List[Any]:
+    """按房间号排序（索引中的房间下标以此顺序为准）"""
+    return sorted(rooms, key=lambda room: room.get('room_number', ''))
+
+
+def _search_signature(rooms: List[Any]) -> bytes:
+    """搜索字段（房间号、租户姓名、手机号）的摘要，摘要相同的两份房间列表可共用索引结构"""
+    digest = hashlib.blake2b(digest_size=16)
+    for room in rooms:
+        digest.update(str(room.get('room_number', '')).encode('utf-8') + b'\x00')
+        for tenant in room.get('tenants', []):
+            digest.update(f"{tenant.get('tenant_name') or ''}\x01{tenant.get('mobile') or ''}\x02".encode('utf-8'))
+        digest.update(b'\x03')
+    return digest.digest()
+
+
+class SearchIndex:
+    """布局快照的搜索索引"""
+
+    def __init__(self, rooms: List[Dict[str, Any]], signature: Optional[bytes] = None):
+        """
+        构建搜索索引
+
+        Args:
+            rooms: 布局中的房间（房间字典或紧凑布局记录，只按 get() 读取）
+            signature: 已按房间号排好序时传入的搜索字段摘要，默认重新排序并计算
+        """
+        if signature is None:
+            rooms = _sort_rooms(rooms)
+            signature = _search_signature(rooms)
+        self.rooms = rooms
+        self.signature = signature
+        # 房间号 -> 房间下标（多楼栋/单元时同号房间都在列表中）
+        self.room_by_number: Dict[str, List[int]] = {}
+        self.room_trie = PrefixTrie()
+        room_numbers: List[str] = []
+
+        # 租户 -> 所在房间
+        self.tenant_rooms: List[int] = []
+        self.tenant_names: List[str] = []
+        names: List[Tuple[str, int]] = []
+        mobiles: List[Tuple[str, int]] = []
+        mobile_texts: List[str] = []
+        pinyins: List[Tuple[str, int]] = []
+        initials: List[Tuple[str, int]] = []
+        self.name_grams: Dict[str, List[int]] = {}
+
+        for room_index, room in enumerate(self.rooms):
+            room_number = str(room.get('room_number', '')).lower()
+            self.room_by_number.setdefault(room_number, []).append(room_index)
+            self.room_trie.insert(room_number, room_index)
+            room_numbers.append(room_number)
+
+            for tenant in room.get('tenants', []):
+                tenant_index = len(self.tenant_rooms)
+                self.tenant_rooms.append(room_index)
+
+                name = (tenant.get('tenant_name') or '').strip().lower()
+                self.tenant_names.append(name)
+                names.append((name, tenant_index))
+                for gram in self._grams(name):
+                    self.name_grams.setdefault(gram, []).append(tenant_index)
+
+                mobile = str(tenant.get('mobile') or '').strip()
+                mobiles.append((mobile[::-1], tenant_index))
+                mobile_texts.append(mobile)
+
+                full, first_letters = name_pinyin(name)
+                pinyins.append((full, tenant_index))
+                initials.append((first_letters, tenant_index))
+
+        self.names = SortedPrefixIndex(names)
+        self.mobile_suffixes = SortedPrefixIndex(mobiles)
+        self.pinyins = SortedPrefixIndex(pinyins)
+        self.initials = SortedPrefixIndex(initials)
+        self.room_substrings = SubstringIndex(room_numbers)
+        self.mobile_substrings = SubstringIndex(mobile_texts)
+
+    @classmethod
+    def build(cls, rooms: List[Any], previous: Optional['SearchIndex'] = None) -> 'SearchIndex':
+        """
+        构建搜索索引，搜索字段与上一版本完全相同时复用其索引结构，只替换房间数据
+
+        Args:
+            rooms: 布局中的房间
+            previous: 上一版本的索引
+
+        Returns:
+            搜索索引
+        """
+        rooms = _sort_rooms(rooms)
+        signature = _search_signature(rooms)
+        if previous is not None and previous.signature == signature:
+            index = cls.__new__(cls)
+            index.__dict__.update(previous.__dict__)
+            index.rooms = rooms
+            return index
+        return cls(rooms, signature)
+
+    @staticmethod
+    def _grams(text: str) -> set:
+        """单字和双字 n-gram"""
+        grams = set(text)
+        grams.update(text[i:i + 2] for i in range(len(text) - 1))
+        return grams
+
+    @property
+    def tenant_count(self) -> int:
+        """索引中的租户数"""
+        return len(self.tenant_rooms)
+
+    def _name_substring(self, query: str) -> Iterator[int]:
+        """姓名子串匹配：取最短的 n-gram 倒排列表逐个校验"""
+        if len(query) == 1:
+            yield from self.name_grams.get(query, [])
+            return
+
+        postings = [self.name_grams.get(query[i:i + 2]) for i in range(len(query) - 1)]
+        if not all(postings):
+            return
+        for tenant_index in min(postings, key=len):
+            if query in self.tenant_names[tenant_index]:
+                yield tenant_index
+
+    def _tiers(self, query: str) -> Iterator[Tuple[int, Iterator[int], bool]]:
+        """按得分从高到低生成 (得分, 候选迭代器, 候选是否为租户)"""
+        is_digits = query.isdigit()
+        is_ascii_letters = query.isascii() and query.isalpha()
+
+        room_indexes = self.room_by_number.get(query)
+        if room_indexes:
+            yield SCORE_ROOM_EXACT, iter(room_indexes), False
+        if is_digits:
+            yield SCORE_MOBILE_EXACT, self.mobile_suffixes.exact(query[::-1]), True
+        yield SCORE_NAME_EXACT, self.names.exact(query), True
+        yield SCORE_ROOM_PREFIX, iter(self.room_trie.lookup(query)), False
+        yield SCORE_NAME_PREFIX, self.names.prefix(query), True
+        if is_digits:
+            yield SCORE_MOBILE_SUFFIX, self.mobile_suffixes.prefix(query[::-1]), True
+        if is_ascii_letters and PYPINYIN_AVAILABLE:
+            yield SCORE_PINYIN_PREFIX, self.pinyins.prefix(query), True
+            yield SCORE_INITIALS_PREFIX, self.initials.prefix(query), True
+        yield SCORE_NAME_SUBSTRING, self._name_substring(query), True
+        if query.isascii():
+            yield SCORE_ROOM_SUBSTRING, self.room_substrings.search(query), False
+        if is_digits:
+            yield SCORE_MOBILE_SUBSTRING, self.mobile_substrings.search(query), True
+
+    def search(self, query: str, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+        """
+        搜索房间
+
+        Args:
+            query: 搜索词（房间号、姓名、拼音/首字母、手机号）
+            page: 页码（从1开始）
+            page_size: 每页结果数
+
+        Returns:
+            {'rooms': 当前页房间, 'scores': 对应得分, 'has_more': 是否还有下一页}
+        """
+        query = query.strip().lower()
+        if not query:
+            return {'rooms': [], 'scores': [], 'has_more': False}
+
+        # 多取一个结果用于判断是否还有下一页
+        offset = (page - 1) * page_size
+        wanted = offset + page_size + 1
+
+        seen = set()
+        ranked: List[Tuple[int, int]] = []
+        for score, candidates, is_tenant in self._tiers(query):
+            for candidate in candidates:
+                room_index = self.tenant_rooms[candidate] if is_tenant else candidate
+                if room_index in seen:
+                    continue
+                seen.add(room_index)
+                ranked.append((room_index, score))
+                if len(ranked) >= wanted:
+                    break
+            if len(ranked) >= wanted:
+                break
+
+        page_results = ranked[offset:offset + page_size]
+        return {
+            'rooms': [self.rooms[room_index] for room_index, _ in page_results],
+            'scores': [score for _, score in page_results],
+            'has_more': len(ranked) > offset + page_size
+        }
+
+
+class SearchIndexBuilder:
+    """后台搜索索引构建器 - 快照更新后在后台线程构建索引，连续更新时只构建最新的快照"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = None
+        self.thread: Optional[threading.Thread] = None
+        # 最近构建完成的 (快照, 索引)
+        self.latest: Optional[Tuple[Any, SearchIndex]] = None
+
+        # 统计
+        self.builds = 0
+        self.reused = 0
+        self.last_build_seconds: Optional[float] = None
+
+    def submit(self, snapshot):
+        """提交新快照，由后台线程构建索引（不阻塞调用方）"""
+        with self.lock:
+            self.pending = snapshot
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='search-index', daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        """构建主循环：处理完最新提交的快照后退出"""
+        while True:
+            with self.lock:
+                snapshot = self.pending
+                self.pending = None
+                if snapshot is None:
+                    self.thread = None
+                    return
+            try:
+                self.build(snapshot)
+            except Exception as e:
+                logger.error(f"构建搜索索引失败: {str(e)}")
+
+    def build(self, snapshot) -> SearchIndex:
+        """
+        为快照构建搜索索引（每个快照只构建一次）
+
+        Args:
+            snapshot: 布局快照
+
+        Returns:
+            搜索索引
+        """
+        with self.lock:
+            previous = self.latest[1] if self.latest else None
+
+        started = time.perf_counter()
+        index = snapshot.derive('search_index', lambda: SearchIndex.build(snapshot.layout.records, previous))
+        elapsed = time.perf_counter() - started
+
+        with self.lock:
+            if self.latest is None or snapshot.version >= self.latest[0].version:
+                if self.latest is None or self.latest[1] is not index:
+                    if previous is not None and index.signature == previous.signature:
+                        self.reused += 1
+                    else:
+                        self.builds += 1
+                    self.last_build_seconds = round(elapsed, 3)
+                self.latest = (snapshot, index)
+        return index
+
+    def get(self, snapshot) -> Tuple[Any, SearchIndex]:
+        """
+        获取可用的搜索索引
+
+        Args:
+            snapshot: 当前布局快照
+
+        Returns:
+            (索引对应的快照, 索引)：优先返回后台已构建的最新索引（新快照的索引构建完成前可能落后一个版本），
+            尚无任何索引时同步构建
+        """
+        with self.lock:
+            latest = self.latest
+        if latest is not None:
+            return latest
+        return snapshot, self.build(snapshot)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取构建统计"""
+        with self.lock:
+            return {
+                'version': self.latest[0].version if self.latest else None,
+                'tenants': self.latest[1].tenant_count if self.latest else 0,
+                'building': self.thread is not None,
+                'builds': self.builds,
+                'reused': self.reused,
+                'last_build_seconds': self.last_build_seconds
+            }
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+请求合并模块 - 同一时刻相同键的调用只执行一次，其余调用方等待并共享结果
+"""
+
+import logging
+import threading
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """一次正在进行中的调用"""
+
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """单飞调用器 - 合并并发的相同请求"""
+
+    def __init__(self):
+        """初始化单飞调用器"""
+        self.lock = threading.Lock()
+        self.calls: Dict[str, _Call] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        执行调用，如果相同键的调用正在进行，则等待其完成并返回相同结果
+
+        Args:
+            key: 调用键
+            fn: 实际执行的函数
+
+        Returns:
+            函数返回值（异常同样会传递给所有等待方）
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self.calls[key] = call
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            logger.info(f"请求 {key} 正在进行中，等待其结果")
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            if call.waiters:
+                logger.info(f"请求 {key} 完成，结果共享给 {call.waiters} 个等待方")
+            call.event.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取调用统计"""
+        with self.lock:
+            return {
+                'executions': self.executions,
+                'coalesced': self.coalesced,
+                'in_flight': list(self.calls.keys())
+            }
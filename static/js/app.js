@@ -1,5 +1,15 @@
 // 房间分配可视化系统 JavaScript
 
+// 总览和楼层视图渲染房间卡片所需的字段，其余租户信息由详情接口按需获取
+const ROOM_CARD_FIELDS = 'house_id,house_name,tenants.tenant_name,tenants.is_main,tenants.tag';
+
+// 搜索结果每页数量
+const SEARCH_PAGE_SIZE = 100;
+
+// 事件流被拒绝（连接数已满）时轮询变更接口的间隔，以及重新尝试连接事件流的间隔（毫秒）
+const CHANGES_POLL_INTERVAL = 30000;
+const EVENTS_RETRY_INTERVAL = 60000;
+
 class RoomVisualization {
     constructor() {
         this.roomsData = null;
@@ -14,13 +24,178 @@ class RoomVisualization {
         this.tagsData = null; // 新增：标签数据
         this.tagStatistics = null; // 新增：标签统计
         this.currentEditingStudent = null; // 新增：当前编辑的学生
+        this.validatorCache = new Map(); // 按URL保存 ETag / Last-Modified 及对应数据
+        this.eventSource = null; // 变更事件流（SSE）
+        this.eventsConnected = false;
+        this.pollTimer = null; // 事件流不可用时轮询变更的定时器
 
         this.init();
     }
 
     init() {
         this.bindEvents();
-        this.loadRoomsData();
+        // 实时推送可用时由后台同步保持数据最新，首次加载不再触发同步
+        const liveUpdates = this.connectEvents();
+        this.loadRoomsData(liveUpdates);
+    }
+
+    connectEvents() {
+        if (!window.EventSource) {
+            return false;
+        }
+
+        // 重新建立连接时带上已持有的版本，服务端补发期间的变更（新建的 EventSource 不会发送 Last-Event-ID）
+        const basePath = window.location.pathname.includes('/rooms/') ? '/rooms' : '';
+        const version = this.roomsData ? this.roomsData.version : null;
+        const query = version !== null && version !== undefined ? `?last_event_id=${version}` : '';
+        this.eventSource = new EventSource(`${basePath}/api/events${query}`);
+
+        this.eventSource.addEventListener('open', () => {
+            this.eventsConnected = true;
+            this.stopPollingChanges();
+        });
+
+        // 连接断开后浏览器会自动重连，并通过 Last-Event-ID 补发期间的变更
+        this.eventSource.addEventListener('error', () => {
+            this.eventsConnected = false;
+            // 服务端拒绝连接（如连接数已满返回503）时浏览器不再重连：改为轮询变更接口，稍后再尝试连接事件流
+            if (this.eventSource.readyState === EventSource.CLOSED) {
+                this.startPollingChanges();
+                setTimeout(() => this.connectEvents(), EVENTS_RETRY_INTERVAL);
+            }
+        });
+
+        this.eventSource.addEventListener('rooms', (e) => {
+            this.applyRoomChanges(JSON.parse(e.data));
+        });
+
+        // 服务端无法补发断线期间的变更，全量刷新（带验证器，数据未变时只返回304）
+        this.eventSource.addEventListener('reset', () => {
+            this.loadRoomsData(true);
+        });
+
+        return true;
+    }
+
+    startPollingChanges() {
+        if (this.pollTimer) return;
+        this.pollTimer = setInterval(() => this.pollChanges(), CHANGES_POLL_INTERVAL);
+    }
+
+    stopPollingChanges() {
+        if (!this.pollTimer) return;
+        clearInterval(this.pollTimer);
+        this.pollTimer = null;
+    }
+
+    async pollChanges() {
+        // 按持有的版本获取之后的变更（服务端按版本缓存，数据未变化时开销很小）
+        if (!this.roomsData) return;
+
+        try {
+            const basePath = window.location.pathname.includes('/rooms/') ? '/rooms' : '';
+            const response = await fetch(`${basePath}/api/rooms/changes?since=${this.roomsData.version}`);
+            if (!response.ok) return;
+
+            const change = await response.json();
+            if (change.full_reload_required) {
+                this.loadRoomsData(true);
+            } else if (change.version > this.roomsData.version) {
+                this.applyRoomChanges({ ...change, previous_version: change.since });
+            }
+        } catch (error) {
+            console.error('轮询变更失败:', error);
+        }
+    }
+
+    applyRoomChanges(change) {
+        if (!this.roomsData) return;
+
+        const currentVersion = this.roomsData.version;
+        if (change.version <= currentVersion) return;
+
+        // 中间有遗漏的版本或房间被移除，无法增量更新，全量刷新
+        if (change.previous_version !== currentVersion || (change.removed && change.removed.length > 0)) {
+            this.loadRoomsData(true);
+            return;
+        }
+
+        const affectedFloors = new Set();
+        change.rooms.forEach(room => {
+            const floor = this.floorKey(room);
+            const floorRooms = this.roomsData.floors[floor] || (this.roomsData.floors[floor] = []);
+            const index = floorRooms.findIndex(r => this.roomKey(r) === this.roomKey(room));
+            if (index >= 0) {
+                floorRooms[index] = room;
+            } else {
+                floorRooms.push(room);
+            }
+            affectedFloors.add(floor);
+        });
+
+        Object.assign(this.roomsData, {
+            version: change.version,
+            total_rooms: change.total_rooms,
+            occupied_count: change.occupied_count,
+            vacant_count: change.vacant_count,
+            tag_statistics: change.tag_statistics,
+            timestamp: change.timestamp
+        });
+        this.tagStatistics = change.tag_statistics;
+
+        this.updateHeaderInfo();
+        this.updateTagLegend();
+
+        if (change.rooms.length > 0) {
+            console.log(`收到布局变更: 版本 ${change.version}，${change.rooms.length} 间房间`);
+            this.patchRoomElements(change.rooms, affectedFloors);
+        }
+    }
+
+    patchRoomElements(rooms, affectedFloors) {
+        // 只替换受影响的房间卡片，以及所在楼层和楼栋的统计
+        let missing = false;
+
+        rooms.forEach(room => {
+            const miniRooms = document.querySelectorAll(`#overviewView .mini-room[data-room-key="${this.roomKey(room)}"]`);
+            if (document.querySelector('#overviewView .building-overview') && miniRooms.length === 0) {
+                missing = true;
+            }
+            miniRooms.forEach(el => {
+                el.outerHTML = this.createMiniRoom(room);
+            });
+
+            document.querySelectorAll(`.room-card[data-room-key="${this.roomKey(room)}"]`).forEach(el => {
+                el.outerHTML = this.createRoomCard(room);
+            });
+        });
+
+        if (missing) {
+            this.renderOverview();
+        } else {
+            const buildingHeader = document.querySelector('#overviewView .building-header');
+            if (buildingHeader) {
+                buildingHeader.outerHTML = this.createBuildingHeader(this.getAllRooms());
+            }
+        }
+
+        affectedFloors.forEach(floor => {
+            const floorRooms = this.roomsData.floors[floor] || [];
+
+            const floorStats = document.querySelector(`#overviewView .floor-row[data-floor="${floor}"] .floor-stats`);
+            if (floorStats) {
+                floorStats.innerHTML = this.createFloorRowStats(floorRooms);
+            }
+
+            const floorInfo = document.querySelector(`#floorViews .floor-view[data-floor="${floor}"] .floor-info`);
+            if (floorInfo) {
+                floorInfo.innerHTML = this.createFloorInfo(floorRooms);
+            }
+        });
+
+        if (this.filterStatus || this.filterTag) {
+            this.applyStatusFilter();
+        }
     }
 
     bindEvents() {
@@ -121,6 +296,31 @@ class RoomVisualization {
         });
     }
 
+    async fetchWithValidators(url) {
+        // 带上已持有的验证器发起条件请求，304 时直接复用本地数据
+        const cached = this.validatorCache.get(url);
+        const headers = {};
+        if (cached) {
+            if (cached.etag) headers['If-None-Match'] = cached.etag;
+            if (cached.lastModified) headers['If-Modified-Since'] = cached.lastModified;
+        }
+
+        const response = await fetch(url, { headers });
+
+        if (response.status === 304 && cached) {
+            return { ok: true, status: 304, statusText: response.statusText, data: cached.data };
+        }
+
+        const data = await response.json();
+        const etag = response.headers.get('ETag');
+        const lastModified = response.headers.get('Last-Modified');
+        if (response.ok && (etag || lastModified)) {
+            this.validatorCache.set(url, { etag, lastModified, data });
+        }
+
+        return { ok: response.ok, status: response.status, statusText: response.statusText, data };
+    }
+
     async loadRoomsData(skipSync = false) {
         try {
             this.showLoading();
@@ -152,12 +352,12 @@ class RoomVisualization {
             console.log('开始从数据库加载房间数据...');
 
             const [basicResponse, tagsResponse] = await Promise.all([
-                fetch(`${basePath}/api/rooms/with-tags`), // 从数据库读取
-                fetch(`${basePath}/api/tags`)
+                this.fetchWithValidators(`${basePath}/api/rooms/with-tags?fields=${ROOM_CARD_FIELDS}`), // 从数据库读取
+                this.fetchWithValidators(`${basePath}/api/tags`)
             ]);
 
-            const basicData = await basicResponse.json();
-            const tagsData = await tagsResponse.json();
+            const basicData = basicResponse.data;
+            const tagsData = tagsResponse.data;
 
             // 检查基本数据是否成功获取
             if (basicData.error || !basicData.success) {
@@ -273,12 +473,12 @@ class RoomVisualization {
         floorButtons.appendChild(allBtn);
 
         // 添加各楼层按钮
-        this.roomsData.floor_numbers.forEach(floor => {
+        this.getFloorPlans().forEach(plan => {
             const btn = document.createElement('button');
             btn.className = 'floor-btn';
-            btn.textContent = `${floor}楼`;
-            btn.dataset.floor = floor;
-            btn.addEventListener('click', () => this.showFloor(floor));
+            btn.textContent = plan.label;
+            btn.dataset.floor = plan.key;
+            btn.addEventListener('click', () => this.showFloor(plan.key));
             floorButtons.appendChild(btn);
         });
     }
@@ -287,10 +487,10 @@ class RoomVisualization {
         const floorFilter = document.getElementById('floorFilter');
         floorFilter.innerHTML = '<option value="">所有楼层</option>';
 
-        this.roomsData.floor_numbers.forEach(floor => {
+        this.getFloorPlans().forEach(plan => {
             const option = document.createElement('option');
-            option.value = floor;
-            option.textContent = `${floor}楼`;
+            option.value = plan.key;
+            option.textContent = plan.label;
             floorFilter.appendChild(option);
         });
     }
@@ -336,12 +536,77 @@ class RoomVisualization {
         overviewView.style.display = 'block';
         floorViews.style.display = 'none';
 
-        // 建筑信息头部 - 从floors对象中获取所有房间
+        // 生成全景视图HTML
+        let html = '<div class="building-overview">';
+
+        // 添加建筑信息头部
+        html += this.createBuildingHeader(this.getAllRooms());
+
+        // 添加图例
+        const legendHtml = `
+            <div class="room-type-legend">
+                <div class="legend-item-inline">
+                    <div class="mini-room vacant">01</div>
+                    <span>空闲房间</span>
+                </div>
+                <div class="legend-item-inline">
+                    <div class="mini-room occupied">02</div>
+                    <span>已入住</span>
+                </div>
+                <div class="legend-item-inline">
+                    <div class="mini-room multi-tenant">03</div>
+                    <span>多人合租</span>
+                </div>
+                <div class="legend-item-inline">
+                    <span style="color: #64748b; font-size: 13px; font-weight: 500;">竖直虚线左侧为50㎡房间，右侧为35㎡房间</span>
+                </div>
+            </div>
+        `;
+
+        html += legendHtml;
+
+        // 按布局定义从顶层到底层显示
+        [...this.getFloorPlans()].reverse().forEach(plan => {
+            const rooms = this.roomsData.floors[plan.key] || [];
+
+            html += `
+                <div class="floor-row" data-floor="${plan.key}">
+                    <div class="floor-label">${plan.label}</div>
+                    <div class="floor-rooms">
+                        ${this.createFloorRoomsOverview(rooms, plan)}
+                    </div>
+                    <div class="floor-stats">
+                        ${this.createFloorRowStats(rooms)}
+                    </div>
+                </div>
+            `;
+        });
+
+        html += '</div>';
+        overviewView.innerHTML = html;
+    }
+
+    getAllRooms() {
+        // 从floors对象中获取所有房间
         const allRooms = [];
         Object.values(this.roomsData.floors).forEach(floorRooms => {
             allRooms.push(...floorRooms);
         });
+        return allRooms;
+    }
+
+    createFloorRowStats(rooms) {
+        const occupiedCount = rooms.filter(room => room.tenants.length > 0).length;
+        const vacantCount = rooms.length - occupiedCount;
 
+        return `
+            <span class="stat-line">入住: <span class="occupied-count">${occupiedCount}</span></span>
+            <span class="stat-line">空闲: <span class="vacant-count">${vacantCount}</span></span>
+            <span class="stat-line">率: <span class="occupancy-rate">${rooms.length > 0 ? Math.round(occupiedCount/rooms.length*100) : 0}%</span></span>
+        `;
+    }
+
+    createBuildingHeader(allRooms) {
         const totalRooms = allRooms.length;
         const occupiedRooms = allRooms.filter(room => room.tenants.length > 0).length;
         const vacantRooms = totalRooms - occupiedRooms;
@@ -378,11 +643,7 @@ class RoomVisualization {
         const smallRoomsRate = smallRooms > 0 ? ((smallRoomsOccupied / smallRooms) * 100).toFixed(1) : 0;
         const highFloorRate = highFloorRooms > 0 ? ((highFloorRoomsOccupied / highFloorRooms) * 100).toFixed(1) : 0;
 
-        // 生成全景视图HTML
-        let html = '<div class="building-overview">';
-
-        // 添加建筑信息头部
-        html += `
+        return `
             <div class="building-header">
                 <div class="building-title">A4栋学生公寓</div>
                 <div class="building-stats">
@@ -401,53 +662,6 @@ class RoomVisualization {
                 </div>
             </div>
         `;
-
-        // 添加图例
-        const legendHtml = `
-            <div class="room-type-legend">
-                <div class="legend-item-inline">
-                    <div class="mini-room vacant">01</div>
-                    <span>空闲房间</span>
-                </div>
-                <div class="legend-item-inline">
-                    <div class="mini-room occupied">02</div>
-                    <span>已入住</span>
-                </div>
-                <div class="legend-item-inline">
-                    <div class="mini-room multi-tenant">03</div>
-                    <span>多人合租</span>
-                </div>
-                <div class="legend-item-inline">
-                    <span style="color: #64748b; font-size: 13px; font-weight: 500;">竖直虚线左侧为50㎡房间，右侧为35㎡房间</span>
-                </div>
-            </div>
-        `;
-
-        html += legendHtml;
-
-        // 从20楼到1楼显示（顶层到底层）
-        for (let floor = 20; floor >= 1; floor--) {
-            const rooms = this.roomsData.floors[floor] || [];
-            const occupiedCount = rooms.filter(room => room.tenants.length > 0).length;
-            const vacantCount = rooms.length - occupiedCount;
-
-            html += `
-                <div class="floor-row">
-                    <div class="floor-label">${floor}楼</div>
-                    <div class="floor-rooms">
-                        ${this.createFloorRoomsOverview(rooms, floor)}
-                    </div>
-                    <div class="floor-stats">
-                        <span class="stat-line">入住: <span class="occupied-count">${occupiedCount}</span></span>
-                        <span class="stat-line">空闲: <span class="vacant-count">${vacantCount}</span></span>
-                        <span class="stat-line">率: <span class="occupancy-rate">${rooms.length > 0 ? Math.round(occupiedCount/rooms.length*100) : 0}%</span></span>
-                    </div>
-                </div>
-            `;
-        }
-
-        html += '</div>';
-        overviewView.innerHTML = html;
     }
 
     // 判断是否为50平米房间 (1、2、3和11、12号房间)
@@ -462,138 +676,104 @@ class RoomVisualization {
         return [1, 2, 3, 11, 12].includes(roomInFloor);
     }
 
-    createFloorRoomsOverview(rooms, floor) {
-        // 确保房间按房间号排序，并添加room_in_floor字段
-        const sortedRooms = [...rooms].map(room => ({
-            ...room,
-            room_in_floor: parseInt(room.room_number.slice(-2))
-        })).sort((a, b) => a.room_in_floor - b.room_in_floor);
-        const roomsHtml = [];
+    createFloorRoomsOverview(rooms, plan) {
+        // 按房间序号排列，通道位置和宽度取自布局定义中该层的 gaps（房间之后留出的通道格数）
+        const roomInFloor = room => room.room_in_floor || parseInt(room.room_number.slice(-2));
+        const sortedRooms = [...rooms].sort((a, b) => roomInFloor(a) - roomInFloor(b));
+        const gapWidths = {};
+        plan.gaps.forEach(gap => {
+            gapWidths[gap.after] = gap.width;
+        });
 
-        if (floor === 1) {
-            // 1楼特殊布局: 01-06, 通道, 通道, 07-10
-            const floor1Layout = [
-                { type: 'room', number: '01' }, { type: 'room', number: '02' }, { type: 'room', number: '03' },
-                { type: 'room', number: '04' }, { type: 'room', number: '05' }, { type: 'room', number: '06' },
-                { type: 'passage', label: '通道' }, { type: 'passage', label: '通道' },
-                { type: 'room', number: '07' }, { type: 'room', number: '08' }, { type: 'room', number: '09' },
-                { type: 'room', number: '10' }
-            ];
-
-            floor1Layout.forEach(item => {
-                if (item.type === 'passage') {
-                    roomsHtml.push(`
-                        <div class="mini-room passage" title="${item.label}">
-                            ${item.label}
-                        </div>
-                    `);
-                } else {
-                    const roomNumber = `1${item.number}`;
-                    const room = sortedRooms.find(r => r.room_number === roomNumber);
-
-                    if (room) {
-                        const tenantCount = room.tenants.length;
-                        let roomClass = 'mini-room';
-
-                        // 检查是否为50平米房间
-                        if (this.isLargeRoom(room.room_in_floor)) {
-                            roomClass += ' large-room';
-                        }
+        const roomsHtml = [];
+        sortedRooms.forEach(room => {
+            roomsHtml.push(this.createMiniRoom(room));
+            for (let i = 0; i < (gapWidths[roomInFloor(room)] || 0); i++) {
+                roomsHtml.push(`
+                    <div class="mini-room passage" title="通道">
+                        通道
+                    </div>
+                `);
+            }
+        });
 
-                        // 添加房间分隔虚线（3号和10号房间后面）
-                        if (room.room_in_floor === 3 || room.room_in_floor === 10) {
-                            roomClass += ' room-divider-after';
-                        }
+        return roomsHtml.join('');
+    }
 
-                        if (tenantCount === 0) {
-                            roomClass += ' vacant';
-                        } else if (tenantCount === 1) {
-                            roomClass += ' occupied';
-                        } else {
-                            roomClass += ' multi-tenant';
-                        }
+    // 单楼栋单元时直接用楼层号、房间号区分（与服务端 layout_skeleton.floor_key / room_key 一致）
+    isSingleUnit() {
+        const layoutInfo = (this.roomsData && this.roomsData.layout_info) || {};
+        const buildings = layoutInfo.buildings || [];
+        return buildings.length === 0 || (buildings.length === 1 && buildings[0].units.length <= 1);
+    }
 
-                        const roomTitle = `${room.house_name}${room.tenants.length > 0 ? ' - ' + room.tenants.map(t => t.tenant_name).join(', ') : ' - 空闲'}`;
+    floorKey(room) {
+        return this.isSingleUnit() ? room.floor : `${room.building}-${room.unit}-${room.floor}`;
+    }
 
-                        roomsHtml.push(`
-                            <div class="${roomClass}" onclick="app.showRoomDetail('${room.house_id}')" title="${roomTitle}">
-                                ${room.room_number}
-                            </div>
-                        `);
-                    } else {
-                        // 空房间占位
-                        const roomInFloor = parseInt(item.number);
-                        const isLarge = this.isLargeRoom(roomInFloor);
-                        let emptyRoomClass = `mini-room vacant${isLarge ? ' large-room' : ''}`;
-
-                        // 添加房间分隔虚线（3号和10号房间后面）
-                        if (roomInFloor === 3 || roomInFloor === 10) {
-                            emptyRoomClass += ' room-divider-after';
-                        }
+    roomKey(room) {
+        return this.isSingleUnit() ? room.room_number : `${room.building}-${room.unit}-${room.room_number}`;
+    }
 
-                        roomsHtml.push(`
-                            <div class="${emptyRoomClass}" title="房间${roomNumber} - 空闲">
-                                ${roomNumber}
-                            </div>
-                        `);
-                    }
-                }
+    getFloorPlans() {
+        // 楼层及其通道取自布局定义（layout_info.buildings），按布局顺序（楼栋、单元、楼层）排列
+        const buildings = (this.roomsData.layout_info && this.roomsData.layout_info.buildings) || [];
+        const singleUnit = this.isSingleUnit();
+        const plans = [];
+        buildings.forEach(building => {
+            building.units.forEach(unit => {
+                unit.floors.forEach(floor => {
+                    plans.push({
+                        key: singleUnit ? floor.floor : `${building.number}-${unit.unit}-${floor.floor}`,
+                        label: singleUnit ? `${floor.floor}楼` : `${building.building}栋${unit.unit}单元${floor.floor}楼`,
+                        gaps: floor.gaps || []
+                    });
+                });
             });
-        } else {
-            // 2-20楼正常布局，每层12间房
-            for (let i = 1; i <= 12; i++) {
-                const room = sortedRooms.find(r => r.room_in_floor === i);
-
-                if (room) {
-                    const tenantCount = room.tenants.length;
-                    let roomClass = 'mini-room';
-                    let roomText = room.room_number; // 显示完整房间号
-
-                    // 检查是否为50平米房间
-                    if (this.isLargeRoom(room.room_in_floor)) {
-                        roomClass += ' large-room';
-                    }
+        });
 
-                    // 添加房间分隔虚线（3号和10号房间后面）
-                    if (room.room_in_floor === 3 || room.room_in_floor === 10) {
-                        roomClass += ' room-divider-after';
-                    }
+        // 早期快照没有楼栋定义，按楼层号显示（无通道）
+        if (plans.length === 0) {
+            return this.roomsData.floor_numbers.map(floor => ({ key: floor, label: `${floor}楼`, gaps: [] }));
+        }
+        return plans;
+    }
 
-                    if (tenantCount === 0) {
-                        roomClass += ' vacant';
-                    } else if (tenantCount === 1) {
-                        roomClass += ' occupied';
-                    } else {
-                        roomClass += ' multi-tenant';
-                    }
+    getFloorPlan(floor) {
+        return this.getFloorPlans().find(plan => String(plan.key) === String(floor)) ||
+            { key: floor, label: `${floor}楼`, gaps: [] };
+    }
 
-                    const roomTitle = `${room.house_name}${room.tenants.length > 0 ? ' - ' + room.tenants.map(t => t.tenant_name).join(', ') : ' - 空闲'}`;
+    createMiniRoom(room) {
+        const roomInFloor = parseInt(room.room_number.slice(-2));
+        const tenantCount = room.tenants.length;
+        let roomClass = 'mini-room';
 
-                    roomsHtml.push(`
-                        <div class="${roomClass}" onclick="app.showRoomDetail('${room.house_id}')" title="${roomTitle}">
-                            ${roomText}
-                        </div>
-                    `);
-                } else {
-                    // 空房间占位
-                    const isLarge = this.isLargeRoom(i);
-                    let emptyRoomClass = `mini-room vacant${isLarge ? ' large-room' : ''}`;
-
-                    // 添加房间分隔虚线（3号和10号房间后面）
-                    if (i === 3 || i === 10) {
-                        emptyRoomClass += ' room-divider-after';
-                    }
+        // 检查是否为50平米房间
+        if (this.isLargeRoom(roomInFloor)) {
+            roomClass += ' large-room';
+        }
 
-                    roomsHtml.push(`
-                        <div class="${emptyRoomClass}" title="房间${floor}${i.toString().padStart(2, '0')} - 空闲">
-                            ${floor}${i.toString().padStart(2, '0')}
-                        </div>
-                    `);
-                }
-            }
+        // 添加房间分隔虚线（3号和10号房间后面）
+        if (roomInFloor === 3 || roomInFloor === 10) {
+            roomClass += ' room-divider-after';
         }
 
-        return roomsHtml.join('');
+        if (tenantCount === 0) {
+            roomClass += ' vacant';
+        } else if (tenantCount === 1) {
+            roomClass += ' occupied';
+        } else {
+            roomClass += ' multi-tenant';
+        }
+
+        const roomTitle = `${room.house_name}${room.tenants.length > 0 ? ' - ' + room.tenants.map(t => t.tenant_name).join(', ') : ' - 空闲'}`;
+
+        return `
+            <div class="${roomClass}" data-room-number="${room.room_number}" data-room-key="${this.roomKey(room)}" onclick="app.showRoomDetail('${room.house_id}')" title="${roomTitle}">
+                ${room.room_number}
+            </div>
+        `;
     }
 
     showAllFloors() {
@@ -645,17 +825,11 @@ class RoomVisualization {
         floorDiv.className = 'floor-view';
         floorDiv.dataset.floor = floor;
 
-        // 统计房间状态
-        const occupiedCount = rooms.filter(room => room.tenants.length > 0).length;
-        const vacantCount = rooms.length - occupiedCount;
-
         floorDiv.innerHTML = `
             <div class="floor-header">
-                <h2 class="floor-title"><i class="fas fa-layer-group"></i> ${floor}楼</h2>
+                <h2 class="floor-title"><i class="fas fa-layer-group"></i> ${this.getFloorPlan(floor).label}</h2>
                 <div class="floor-info">
-                    <span>总计 ${rooms.length} 间</span>
-                    <span>已入住 ${occupiedCount} 间</span>
-                    <span>空闲 ${vacantCount} 间</span>
+                    ${this.createFloorInfo(rooms)}
                 </div>
             </div>
             <div class="rooms-grid">
@@ -666,6 +840,18 @@ class RoomVisualization {
         return floorDiv;
     }
 
+    createFloorInfo(rooms) {
+        // 统计房间状态
+        const occupiedCount = rooms.filter(room => room.tenants.length > 0).length;
+        const vacantCount = rooms.length - occupiedCount;
+
+        return `
+            <span>总计 ${rooms.length} 间</span>
+            <span>已入住 ${occupiedCount} 间</span>
+            <span>空闲 ${vacantCount} 间</span>
+        `;
+    }
+
     createRoomCard(room) {
         const tenantCount = room.tenants.length;
         let cardClass = 'room-card';
@@ -737,7 +923,7 @@ class RoomVisualization {
         const roomTitle = `${room.room_number}${this.isLargeRoom(room.room_number) ? ' (50㎡)' : ''}`;
 
         return `
-            <div class="${cardClass}" onclick="app.showRoomDetail('${room.house_id || room.room_number}')">
+            <div class="${cardClass}" data-room-number="${room.room_number}" data-room-key="${this.roomKey(room)}" data-house-id="${room.house_id || room.room_number}" onclick="app.showRoomDetail('${room.house_id || room.room_number}')">
                 <div class="room-number">${roomTitle}</div>
                 ${tenantInfo}
             </div>
@@ -760,14 +946,14 @@ class RoomVisualization {
             const apiUrl = `${basePath}/api/room/${houseIdStr}`;
             console.log(`API请求地址: ${apiUrl}`);
 
-            const response = await fetch(apiUrl);
+            const response = await this.fetchWithValidators(apiUrl);
             console.log(`API响应状态: ${response.status}`);
 
             if (!response.ok) {
                 throw new Error(`HTTP错误: ${response.status} ${response.statusText}`);
             }
 
-            const room = await response.json();
+            const room = response.data;
             console.log(`API返回数据:`, room);
 
             if (room.error) {
@@ -1125,8 +1311,10 @@ class RoomVisualization {
                 
                 this.closeStudentTagModal();
                 
-                // 刷新数据，但跳过API同步，直接从数据库读取
-                this.loadRoomsData(true);
+                // 已连接事件流时由服务端推送变更房间，否则跳过API同步直接从数据库读取
+                if (!this.eventsConnected) {
+                    this.loadRoomsData(true);
+                }
                 
                 // 如果房间详情模态框是打开的，重新获取并显示最新数据
                 const roomModal = document.getElementById('roomModal');
@@ -1180,21 +1368,21 @@ class RoomVisualization {
         try {
             // 自动检测API基础路径
         const basePath = window.location.pathname.includes('/rooms/') ? '/rooms' : '';
-        const response = await fetch(`${basePath}/api/search?q=${encodeURIComponent(this.searchTerm)}`);
+        const response = await fetch(`${basePath}/api/search?q=${encodeURIComponent(this.searchTerm)}&page_size=${SEARCH_PAGE_SIZE}`);
             const data = await response.json();
 
             if (data.error) {
                 throw new Error(data.error);
             }
 
-            this.displaySearchResults(data.rooms);
+            this.displaySearchResults(data.rooms, data.has_more);
 
         } catch (error) {
             console.error('搜索失败:', error);
         }
     }
 
-    displaySearchResults(rooms) {
+    displaySearchResults(rooms, hasMore = false) {
         const searchResults = document.getElementById('searchResults');
         const searchResultsContent = document.getElementById('searchResultsContent');
 
@@ -1204,18 +1392,20 @@ class RoomVisualization {
             // 按楼层分组显示搜索结果
             const floorGroups = {};
             rooms.forEach(room => {
-                if (!floorGroups[room.floor]) {
-                    floorGroups[room.floor] = [];
+                const floor = this.floorKey(room);
+                if (!floorGroups[floor]) {
+                    floorGroups[floor] = [];
                 }
-                floorGroups[room.floor].push(room);
+                floorGroups[floor].push(room);
             });
 
             let html = '';
-            Object.keys(floorGroups).sort((a, b) => parseInt(a) - parseInt(b)).forEach(floor => {
+            this.getFloorPlans().filter(plan => floorGroups[plan.key]).forEach(plan => {
+                const floor = plan.key;
                 html += `
                     <div class="floor-view">
                         <div class="floor-header">
-                            <h3 class="floor-title">${floor}楼 - ${floorGroups[floor].length}间匹配</h3>
+                            <h3 class="floor-title">${plan.label} - ${floorGroups[floor].length}间匹配</h3>
                         </div>
                         <div class="rooms-grid">
                             ${floorGroups[floor].map(room => this.createRoomCard(room)).join('')}
@@ -1224,6 +1414,11 @@ class RoomVisualization {
                 `;
             });
 
+            // 结果按匹配程度排序，只显示最相关的一页
+            if (hasMore) {
+                html += `<p style="text-align: center; color: #666;">仅显示最相关的 ${rooms.length} 个房间，请输入更精确的关键词</p>`;
+            }
+
             searchResultsContent.innerHTML = html;
         }
 
@@ -1246,7 +1441,7 @@ class RoomVisualization {
 
         // 应用楼层筛选
         if (this.filterFloor) {
-            this.showFloor(parseInt(this.filterFloor));
+            this.showFloor(this.filterFloor);
         } else {
             this.showAllFloors();
         }
@@ -1420,6 +1615,7 @@ class RoomVisualization {
         if (confirm('确定要清除所有缓存并重新加载页面吗？这将刷新所有数据。')) {
             // 清除应用状态
             this.cacheLoaded = false;
+            this.validatorCache.clear();
             
             // 清除浏览器缓存
             if ('caches' in window) {
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+同步调度模块 - 在后台线程中定期执行数据同步，使请求路径不再依赖上游延迟
+"""
+
+import logging
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    """时间戳转ISO格式字符串"""
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+
+class SyncScheduler:
+    """后台同步调度器"""
+
+    def __init__(self, job: Callable[[], int], interval: float, jitter: float = 0, max_runtime: float = 600):
+        """
+        初始化同步调度器
+
+        Args:
+            job: 同步任务，返回本次同步的记录数，失败时抛出异常
+            interval: 同步间隔（秒）
+            jitter: 随机抖动范围（秒），避免多个实例同时请求上游
+            max_runtime: 单次同步最长运行时间（秒），超时后记录错误且不再叠加新任务
+        """
+        self.job = job
+        self.interval = interval
+        self.jitter = jitter
+        self.max_runtime = max_runtime
+
+        self.thread: Optional[threading.Thread] = None
+        self.worker: Optional[threading.Thread] = None
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()
+        self.lock = threading.Lock()
+
+        # 运行状态
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.last_started_at: Optional[float] = None
+        self.last_finished_at: Optional[float] = None
+        self.last_success_at: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self.last_record_count: Optional[int] = None
+        self.last_error: Optional[str] = None
+        self.next_run_at: Optional[float] = None
+
+    def start(self):
+        """启动调度线程（重复调用无副作用）"""
+        if self.thread and self.thread.is_alive():
+            return
+
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._loop, name='sync-scheduler', daemon=True)
+        self.thread.start()
+        logger.info(f"同步调度器已启动，间隔 {self.interval} 秒，抖动 ±{self.jitter} 秒")
+
+    def stop(self, timeout: float = 5):
+        """停止调度线程"""
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout)
+        logger.info("同步调度器已停止")
+
+    def is_alive(self) -> bool:
+        """调度线程是否在运行"""
+        return bool(self.thread and self.thread.is_alive())
+
+    def trigger(self):
+        """立即触发一次同步（不等待完成）"""
+        self.wake_event.set()
+
+    def _next_delay(self) -> float:
+        """计算下一次同步的等待时间"""
+        delay = self.interval + random.uniform(-self.jitter, self.jitter)
+        return max(1.0, delay)
+
+    def _loop(self):
+        """调度主循环"""
+        while not self.stop_event.is_set():
+            self.run_once()
+
+            delay = self._next_delay()
+            with self.lock:
+                self.next_run_at = time.time() + delay
+
+            self.wake_event.wait(delay)
+            self.wake_event.clear()
+
+    def run_once(self):
+        """执行一次同步，超过最长运行时间则放弃等待"""
+        with self.lock:
+            if self.worker and self.worker.is_alive():
+                logger.warning("上一次同步仍在运行，跳过本次调度")
+                return
+
+            self.running = True
+            self.last_started_at = time.time()
+
+        result: Dict[str, Any] = {}
+
+        def run_job():
+            try:
+                result['record_count'] = self.job()
+            except Exception as e:
+                result['error'] = str(e)
+
+        worker = threading.Thread(target=run_job, name='sync-job', daemon=True)
+        with self.lock:
+            self.worker = worker
+        worker.start()
+        worker.join(self.max_runtime)
+
+        finished_at = time.time()
+        with self.lock:
+            self.runs += 1
+            self.running = False
+            self.last_finished_at = finished_at
+            self.last_duration = round(finished_at - self.last_started_at, 3)
+
+            if worker.is_alive():
+                self.failures += 1
+                self.last_error = f"同步超过最长运行时间 {self.max_runtime} 秒"
+                self.last_record_count = None
+                logger.error(self.last_error)
+            elif 'error' in result:
+                self.failures += 1
+                self.last_error = result['error']
+                self.last_record_count = None
+                logger.error(f"后台同步失败: {self.last_error}")
+            else:
+                self.last_error = None
+                self.last_record_count = result.get('record_count')
+                self.last_success_at = finished_at
+                logger.info(f"后台同步完成，耗时 {self.last_duration} 秒，记录数 {self.last_record_count}")
+
+    def status(self) -> Dict[str, Any]:
+        """获取调度器状态"""
+        with self.lock:
+            return {
+                'enabled': self.is_alive(),
+                'running': self.running,
+                'interval': self.interval,
+                'jitter': self.jitter,
+                'max_runtime': self.max_runtime,
+                'runs': self.runs,
+                'failures': self.failures,
+                'last_started_at': _isoformat(self.last_started_at),
+                'last_finished_at': _isoformat(self.last_finished_at),
+                'last_success_at': _isoformat(self.last_success_at),
+                'last_duration': self.last_duration,
+                'last_record_count': self.last_record_count,
+                'last_error': self.last_error,
+                'next_run_at': _isoformat(self.next_run_at)
+            }
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+令牌刷新模块 - 在后台跟踪令牌年龄与验证状态，在过期前主动重新登录，请求路径不等待登录
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from auth_manager import AuthManager
+
+logger = logging.getLogger(__name__)
+
+
+class TokenRefresher:
+    """后台令牌刷新器"""
+
+    def __init__(self, auth_manager: AuthManager,
+                 login: Optional[Callable[[], Optional[Dict[str, str]]]],
+                 validate: Callable[[], Dict[str, Any]],
+                 max_age_hours: float, refresh_ahead_hours: float, check_interval: float):
+        """
+        初始化令牌刷新器
+
+        Args:
+            auth_manager: 认证信息管理器（保存令牌及其获取、验证时间）
+            login: 登录函数，返回新的认证信息，None 表示自动登录不可用
+            validate: 验证函数，返回包含 valid、checked_at、token 的探测结果
+            max_age_hours: 令牌最大有效时间（小时）
+            refresh_ahead_hours: 在过期前多少小时开始刷新
+            check_interval: 检查间隔（秒）
+        """
+        self.auth_manager = auth_manager
+        self.login = login
+        self.validate = validate
+        self.max_age_hours = max_age_hours
+        self.refresh_ahead_hours = refresh_ahead_hours
+        self.check_interval = check_interval
+        self.listeners: List[Callable[[Dict[str, str]], None]] = []
+        self.thread: Optional[threading.Thread] = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        # 已通知监听器的令牌，其他进程刷新后据此发现新令牌
+        self.applied_token = self._current_token()
+
+        # 统计
+        self.refreshes = 0
+        self.failures = 0
+        self.last_refresh_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def _current_token(self) -> Optional[str]:
+        """缓存中的当前令牌（其他进程更新过缓存文件时自动重新加载）"""
+        return (self.auth_manager.get_auth_info() or {}).get('_ams_token')
+
+    def add_listener(self, listener: Callable[[Dict[str, str]], None]):
+        """
+        注册令牌刷新监听器
+
+        Args:
+            listener: 回调函数，参数为新的认证信息（在刷新线程中调用）
+        """
+        self.listeners.append(listener)
+
+    def start(self):
+        """启动后台刷新线程（重复调用无副作用）"""
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._loop, name='token-refresher', daemon=True)
+            self.thread.start()
+        logger.info(f"令牌刷新器已启动，有效期 {self.max_age_hours} 小时，提前 {self.refresh_ahead_hours} 小时刷新")
+
+    def stop(self, timeout: float = 5):
+        """停止后台刷新线程"""
+        self.stop_event.set()
+        self.auth_manager.refresh_requested.set()  # 唤醒等待中的线程
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout)
+        self.auth_manager.take_refresh_request()
+
+    def _loop(self):
+        """刷新主循环：定期检查，或在请求路径发现认证失效时立即处理"""
+        while not self.stop_event.is_set():
+            self.run_once()
+            self.auth_manager.refresh_requested.wait(self.check_interval)
+
+    def run_once(self):
+        """执行一次检查：令牌临近过期、被请求刷新或验证失效时重新登录，否则记录验证时间"""
+        failed_tokens = self.auth_manager.take_refresh_request()
+        if self.stop_event.is_set():
+            return
+
+        try:
+            # 其他进程已刷新令牌时直接使用
+            stale_token = self._current_token()
+            if stale_token and stale_token != self.applied_token:
+                logger.info("发现其他进程刷新的令牌")
+                self._notify(self.auth_manager.get_auth_info())
+                return
+
+            # 请求针对的令牌已被替换（如登录期间的401、页面访问）时不再重复登录
+            requested = failed_tokens is not None and stale_token in failed_tokens
+            if failed_tokens is not None and not requested:
+                logger.info("刷新请求针对的令牌已被替换，跳过重新登录")
+            if requested:
+                logger.info("收到认证刷新请求")
+            elif self.auth_manager.needs_refresh(self.max_age_hours, self.refresh_ahead_hours):
+                logger.info(f"令牌已使用 {self.auth_manager.get_auth_age_hours():.1f} 小时，提前刷新")
+            else:
+                result = self.validate()
+                if result.get('valid') is True:
+                    self.auth_manager.mark_validated(result.get('token'), result.get('checked_at'))
+                    return
+                if result.get('valid') is None:
+                    # 网络错误等无法判断的情况，等待下次检查
+                    return
+                logger.warning(f"令牌验证失效（{result.get('message')}），重新登录")
+
+            self.refresh(stale_token)
+
+        except Exception as e:
+            logger.error(f"令牌检查失败: {str(e)}")
+
+    def refresh(self, stale_token: Optional[str] = None) -> bool:
+        """
+        重新登录并保存新令牌（同一时间只有一个进程登录）
+
+        Args:
+            stale_token: 需要替换的旧令牌，取得刷新锁后缓存中已不是该令牌时说明其他进程刚完成刷新，直接使用
+
+        Returns:
+            是否刷新成功
+        """
+        if not self.login:
+            self._record_failure("自动登录不可用，请手动更新认证信息")
+            return False
+
+        with self.auth_manager.refresh_lock() as acquired:
+            if not acquired:
+                # 其他进程刷新完成后会写入缓存文件，下次检查时发现并使用
+                logger.info("其他进程正在刷新令牌，跳过本次刷新")
+                return False
+
+            current = self.auth_manager.get_auth_info()
+            if current and current.get('_ams_token') not in (None, stale_token):
+                logger.info("令牌已被其他进程刷新")
+                self._notify(current)
+                return True
+
+            started = time.time()
+            auth_info = self.login()
+            if not auth_info:
+                self._record_failure("自动登录未获取到认证信息")
+                return False
+
+            if not self.auth_manager.save_auth_info(auth_info):
+                self._record_failure("新令牌保存失败")
+                return False
+
+        with self.lock:
+            self.refreshes += 1
+            self.last_refresh_at = time.time()
+            self.last_error = None
+        logger.info(f"令牌刷新成功，耗时 {time.time() - started:.1f} 秒")
+
+        self._notify(auth_info)
+        return True
+
+    def _notify(self, auth_info: Dict[str, str]):
+        """通知监听器应用新令牌"""
+        self.applied_token = auth_info.get('_ams_token')
+        for listener in self.listeners:
+            try:
+                listener(auth_info)
+            except Exception as e:
+                logger.error(f"令牌刷新监听器执行失败: {str(e)}")
+
+    def _record_failure(self, message: str):
+        """记录刷新失败"""
+        with self.lock:
+            self.failures += 1
+            self.last_error = message
+        logger.warning(message)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取刷新状态"""
+        with self.lock:
+            return {
+                'running': bool(self.thread and self.thread.is_alive()),
+                'login_available': self.login is not None,
+                'max_age_hours': self.max_age_hours,
+                'refresh_ahead_hours': self.refresh_ahead_hours,
+                'refreshes': self.refreshes,
+                'failures': self.failures,
+                'last_refresh_at': datetime.fromtimestamp(self.last_refresh_at).isoformat() if self.last_refresh_at else None,
+                'last_error': self.last_error,
+                'token': self.auth_manager.get_token_status()
+            }